@@ -1,6 +1,7 @@
 import time
 import json
 import logging
+import click
 from flask import Flask, request
 from flask_cors import CORS
 from flask_restx import Api
@@ -29,8 +30,10 @@ with app.app_context():
     # register all namespaces for the API
     from andes.routes.document import ns as document_ns
     from andes.routes.webpage import ns as webpage_ns
+    from andes.routes.corpus import ns as corpus_ns
     api.add_namespace(document_ns)
     api.add_namespace(webpage_ns)
+    api.add_namespace(corpus_ns)
 
     database.init_app(app)
     database.create_all()
@@ -57,3 +60,11 @@ def log_request_info(response):
     logging.info(json.dumps(message))
 
     return response
+
+
+@app.cli.command('revoke-api-key')
+@click.argument('api_key')
+def revoke_api_key(api_key):
+    """revoke an api key in every running server"""
+    from andes.services import auth
+    auth.revoke_api_key(api_key)
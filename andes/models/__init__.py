@@ -1,2 +1,3 @@
 from .document import *
-from .webpage import *
\ No newline at end of file
+from .webpage import *
+from .tag import *
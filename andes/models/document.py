@@ -21,6 +21,7 @@ class Document(db.Model):
     page_count = db.Column(db.Integer, nullable=True)
     info = db.Column(db.JSON, default={})
     chats: Mapped[List["DocumentChatHistory"]] = relationship()
+    tags: Mapped[List["Tag"]] = relationship()
 
     # add validation to extension   
     @db.validates('extension')
@@ -48,7 +49,8 @@ class Document(db.Model):
             'extension': self.extension,
             'filename': self.filename,
             'page_count': self.page_count,
-            'info': self.info
+            'info': self.info,
+            'tags': [tag.name for tag in self.tags]
         }
     
     # get chat history for a document
@@ -87,3 +89,24 @@ class DocumentChatHistory(db.Model):
             'created_at': str(self.created_at)
         }
     
+
+
+# content-addressed artifacts (file, extracted text, index) shared by all
+# documents uploaded with the same bytes
+class DocumentContent(db.Model):
+    __tablename__ = 'document_content'
+
+    content_hash = db.Column(db.String(), primary_key=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
+
+    def __repr__(self):
+        return f'<DocumentContent {self.content_hash}: {self.ref_count} refs>'
+
+    def save(self):
+        db.session.add(self)
+        db.session.commit()
+
+    def delete(self):
+        db.session.delete(self)
+        db.session.commit()
@@ -0,0 +1,23 @@
+from andes import database as db
+
+
+# a tag on a document or a webpage, grouping them into a corpus that can
+# be queried at once
+class Tag(db.Model):
+    __tablename__ = 'tag'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(), nullable=False, index=True)
+    document_id = db.Column(db.String(), db.ForeignKey('document.id'), nullable=True, index=True)
+    webpage_id = db.Column(db.String(), db.ForeignKey('webpage.id'), nullable=True, index=True)
+
+    def __repr__(self):
+        return f'<Tag {self.name}: {self.document_id or self.webpage_id}>'
+
+    def save(self):
+        db.session.add(self)
+        db.session.commit()
+
+    def delete(self):
+        db.session.delete(self)
+        db.session.commit()
@@ -20,6 +20,7 @@ class WebPage(db.Model):
     title = db.Column(db.String(), default='')
     info = db.Column(db.JSON, default={})
     chats: Mapped[List["WebPageChatHistory"]] = relationship()
+    tags: Mapped[List["Tag"]] = relationship()
 
     def __repr__(self):
         # include id and filename in the string representation
@@ -40,6 +41,7 @@ class WebPage(db.Model):
             'url': self.url,
             'title': self.title,
             'info': self.info,
+            'tags': [tag.name for tag in self.tags],
             'chats': [chat.to_dict() for chat in self.chats]
         }
     
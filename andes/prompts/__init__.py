@@ -1,7 +1,21 @@
 # Contains all prompts used in the project.
 import os
+from functools import lru_cache
 
 # get current directory
 CURRENT_DIR = os.path.dirname(__file__)
 
-FIN_QA_PROMPT = open(os.path.join(CURRENT_DIR, 'FIN_QA_PROMPT.txt')).read()
\ No newline at end of file
+FIN_QA_PROMPT = open(os.path.join(CURRENT_DIR, 'FIN_QA_PROMPT.txt')).read()
+
+
+@lru_cache(maxsize=None)
+def fin_qa_prompt():
+    """
+    FIN_QA_PROMPT as a langchain prompt template, built on first use
+    """
+    from langchain.prompts import PromptTemplate
+    return PromptTemplate(
+        template=FIN_QA_PROMPT, 
+        input_variables=["context", 'question'],
+        template_format='jinja2'
+    )
@@ -0,0 +1,56 @@
+from flask import request
+from flask_restx import Resource, Namespace
+from andes.services import corpus_service
+from andes.services.auth import auth
+from andes.utils.wrappers import track_requests
+from andes.utils.slack import send_message
+from andes.utils.config import CORPUS_TOP_K
+
+ns = Namespace(
+    'corpus',
+    path='/corpus',
+    description='Queries across documents and webpages'
+)
+
+# maximum chunks a client can ask to pass to the LLM
+MAX_TOP_K = 20
+
+
+@ns.route('/query')
+class CorpusQuery(Resource):
+    @auth.login_required
+    @track_requests
+    def post(self):
+        # get question and corpus from request
+        question = request.json.get('question')
+        if not question:
+            return 'question is required', 400
+
+        try:
+            k = request.json.get('k', CORPUS_TOP_K)
+            if not isinstance(k, int) or isinstance(k, bool) or k < 1:
+                raise ValueError('k must be a positive integer')
+            k = min(k, MAX_TOP_K)
+            scopes = corpus_service.resolve_shards(
+                document_ids=request.json.get('document_ids'),
+                webpage_ids=request.json.get('webpage_ids'),
+                tag=request.json.get('tag')
+            )
+            response = corpus_service.query(scopes, question, k=k)
+        except LookupError as e:
+            return str(e), 404
+        except ValueError as e:
+            return str(e), 400
+
+        # send message to slack
+        send_message(
+            message={
+                'action': 'corpus_query',
+                'shards': len(scopes),
+                'question': question,
+                'answer': response['answer']
+            },
+            channel='#api-notifs'
+        )
+
+        return response
@@ -1,13 +1,20 @@
 from flask import request, jsonify, Response
 from flask_restx import Resource, Namespace
 from werkzeug.utils import secure_filename
-from andes.services import document_service
+from andes.services import document_service, corpus_service
 from andes.services.auth import auth
 from andes.utils.wrappers import track_requests
 from andes.utils.slack import send_message
 from andes.utils.config import SERVER_URL
+from andes.utils.sse import sse_response
+from andes.utils.etag import etag_version, conditional_response, wait_seconds
 from andes.schemas.extraction_config import ExtractionConfigSchema
 
+# maximum seconds a client can long-poll an extraction job
+MAX_EXTRACT_WAIT = 30
+# maximum seconds a client can long-poll a document status
+MAX_STATUS_WAIT = 30
+
 ns = Namespace(
     'document', 
     path='/document',
@@ -38,6 +45,11 @@ class Document(Resource):
         # save the file to the uploads folder
         document_service.save_file(doc, file)
 
+        # tag the document into corpora, e.g. tags=10-K,2023
+        tags = [tag.strip() for tag in request.form.get('tags', '').split(',') if tag.strip()]
+        if tags:
+            corpus_service.set_tags(doc, tags)
+
         # create a langchain index for the document
         document_service.enqueue_index_gen(doc)
 
@@ -59,9 +71,49 @@ class GetDocument(Resource):
     @track_requests
     def get(self, id):
         doc = document_service.get_document(id)
-        return doc.to_dict()
+        if not doc:
+            return 'Invalid document id: {}'.format(id), 404
+
+        # with If-None-Match, long-poll for up to `wait` seconds for the
+        # index status to change
+        wait = wait_seconds(MAX_STATUS_WAIT)
+        if wait is None:
+            return 'Invalid wait: {}'.format(request.args.get('wait')), 400
+        status = document_service.get_index_status(doc, since_version=etag_version(), wait=wait)
+
+        # no status when it expired or the document was never indexed
+        response = doc.to_dict()
+        response['status'] = status
+        return conditional_response(response, status['version'] if status else 0)
+
+    @auth.login_required
+    @track_requests
+    def delete(self, id):
+        doc = document_service.get_document(id)
+        if not doc:
+            return 'Invalid document id: {}'.format(id), 400
+        document_service.delete_document(doc)
+        return {'message': 'Document has been deleted', 'id': id}
     
 
+@ns.route('/<string:id>/tags')
+class DocumentTags(Resource):
+    @auth.login_required
+    @track_requests
+    def put(self, id):
+        try:
+            tags = corpus_service.validate_tags(request.json.get('tags'))
+        except ValueError as e:
+            return Response(status=400, response=str(e))
+
+        doc = document_service.get_document(id)
+        if not doc:
+            return 'Invalid document id: {}'.format(id), 400
+
+        corpus_service.set_tags(doc, tags)
+        return {'id': doc.id, 'tags': [tag.name for tag in doc.tags]}
+
+
 @ns.route('/<string:id>/chat')
 class DocumentChat(Resource):
     @auth.login_required
@@ -79,20 +131,64 @@ class DocumentChat(Resource):
         # get message from request
         message = request.json['message']
         doc = document_service.get_document(id)
+
+        def notify(answer):
+            # send message to slack
+            send_message(
+                message={
+                    'action': 'chat',
+                    'url': f'{SERVER_URL}/document/{doc.id}',
+                    'question': message,
+                    'answer': answer
+                }, 
+                channel='#api-notifs'
+            )
+
+        # stream tokens as server-sent events if requested
+        if request.json.get('stream', False):
+            return sse_response(document_service.chat_stream(doc, message), on_complete=notify)
+
         answer = document_service.chat(doc, message)
+        notify(answer)
+
+        return answer
+
+
+@ns.route('/<string:id>/chat/batch')
+class DocumentChatBatch(Resource):
+    @auth.login_required
+    @track_requests
+    def post(self, id):
+        # get questions from request
+        questions = request.json.get('questions')
+        if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+            return Response(status=400, response='questions must be a list of strings')
+
+        doc = document_service.get_document(id)
+        if not doc:
+            return 'Invalid document id: {}'.format(id), 400
+
+        try:
+            answers = document_service.chat_batch(doc, questions)
+        except ValueError as e:
+            return Response(status=400, response=str(e))
+
+        response = [
+            {'question': question, 'answer': answer}
+            for question, answer in zip(questions, answers)
+        ]
 
         # send message to slack
         send_message(
             message={
-                'action': 'chat',
+                'action': 'chat_batch',
                 'url': f'{SERVER_URL}/document/{doc.id}',
-                'question': message,
-                'answer': answer
-            }, 
+                'questions': len(questions)
+            },
             channel='#api-notifs'
         )
 
-        return answer
+        return response
 
 
 @ns.route('/<string:id>/extract')
@@ -105,7 +201,36 @@ class DocumentExtract(Resource):
             ExtractionConfigSchema.validate(request.json)
             config = request.json
             doc = document_service.get_document(id)
+
+            # run the extraction in a worker and return the job id right away
+            if request.args.get('async', 'false').lower() == 'true':
+                job = document_service.enqueue_extract(doc, config)
+                return {
+                    'id': job.id,
+                    'status': job.get_status().value,
+                    'url': f'{SERVER_URL}/document/{doc.id}/extract/{job.id}'
+                }, 202
+
             response = document_service.extract(doc, config)
             return response
         except Exception as e:
             return Response(status=400, response=str(e))
+
+
+@ns.route('/<string:id>/extract/<string:job_id>')
+class DocumentExtractJob(Resource):
+    @auth.login_required
+    @track_requests
+    def get(self, id, job_id):
+        doc = document_service.get_document(id)
+        if not doc:
+            return 'Invalid document id: {}'.format(id), 400
+
+        # long-poll for up to `wait` seconds
+        wait = wait_seconds(MAX_EXTRACT_WAIT)
+        if wait is None:
+            return 'Invalid wait: {}'.format(request.args.get('wait')), 400
+        job = document_service.get_extract_job(doc, job_id, wait=wait)
+        if job is None:
+            return 'Invalid job id: {}'.format(job_id), 404
+        return job
@@ -1,10 +1,15 @@
 from flask import request
 from flask_restx import Resource, Namespace
-from andes.services import webpage_service
+from andes.services import webpage_service, corpus_service
 from andes.services.auth import auth
 from andes.utils.wrappers import track_requests
 from andes.utils.slack import send_message
-from andes.utils.config import SERVER_URL
+from andes.utils.config import SERVER_URL, SITE_CRAWL_MAX_DEPTH, SITE_CRAWL_MAX_PAGES
+from andes.utils.sse import sse_response
+from andes.utils.etag import etag_version, conditional_response, wait_seconds
+
+# maximum seconds a client can long-poll a webpage status
+MAX_STATUS_WAIT = 30
 
 ns = Namespace(
     'webpage', 
@@ -12,6 +17,22 @@ ns = Namespace(
     description='Webpage related operations'
 )
 
+def _crawl_limit(name: str, maximum: int) -> int:
+    """
+    positive integer crawl limit of the request, capped at maximum
+    """
+    value = request.json.get(name, maximum)
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f'{name} must be a positive integer')
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a positive integer')
+    if value < 1:
+        raise ValueError(f'{name} must be a positive integer')
+    return min(value, maximum)
+
+
 @ns.route('')
 class WebPage(Resource):
     @auth.login_required
@@ -19,8 +40,32 @@ class WebPage(Resource):
     def post(self):
         url = request.json['url']
 
+        # crawl the whole site from url with mode 'site', within the
+        # configured maximum depth and pages
+        crawl_config = None
+        if request.json.get('mode') == 'site':
+            try:
+                crawl_config = {
+                    'mode': 'site',
+                    'max_depth': _crawl_limit('max_depth', SITE_CRAWL_MAX_DEPTH),
+                    'max_pages': _crawl_limit('max_pages', SITE_CRAWL_MAX_PAGES),
+                }
+            except ValueError as e:
+                return str(e), 400
+
+        tags = request.json.get('tags')
+        if tags is not None:
+            try:
+                corpus_service.validate_tags(tags)
+            except ValueError as e:
+                return str(e), 400
+
         # create an empty webpage object in DB
-        page = webpage_service.create_webpage(url)
+        page = webpage_service.create_webpage(url, crawl_config)
+
+        # tag the webpage into corpora
+        if tags:
+            corpus_service.set_tags(page, tags)
 
         # enqueue the webpage for crawling
         webpage_service.enqueue_crawl(page)
@@ -43,9 +88,59 @@ class GetWebPage(Resource):
     @track_requests
     def get(self, id):
         page = webpage_service.get_webpage(id)
-        return page.to_dict()
+        if not page:
+            return 'Invalid webpage id: {}'.format(id), 404
+
+        # with If-None-Match, long-poll for up to `wait` seconds for the
+        # crawl and index status to change
+        wait = wait_seconds(MAX_STATUS_WAIT)
+        if wait is None:
+            return 'Invalid wait: {}'.format(request.args.get('wait')), 400
+        status = webpage_service.get_index_status(page, since_version=etag_version(), wait=wait)
+
+        # no status when it expired or the webpage was never indexed
+        response = page.to_dict()
+        response['status'] = status
+        return conditional_response(response, status['version'] if status else 0)
     
 
+@ns.route('/<string:id>/tags')
+class WebPageTags(Resource):
+    @auth.login_required
+    @track_requests
+    def put(self, id):
+        try:
+            tags = corpus_service.validate_tags(request.json.get('tags'))
+        except ValueError as e:
+            return str(e), 400
+
+        page = webpage_service.get_webpage(id)
+        if not page:
+            return 'Invalid webpage id: {}'.format(id), 400
+
+        corpus_service.set_tags(page, tags)
+        return {'id': page.id, 'tags': [tag.name for tag in page.tags]}
+
+
+@ns.route('/<string:id>/refresh')
+class WebPageRefresh(Resource):
+    @auth.login_required
+    @track_requests
+    def post(self, id):
+        page = webpage_service.get_webpage(id)
+        if not page:
+            return 'Invalid webpage id: {}'.format(id), 400
+
+        # re-crawl only if the page changed, then update its index
+        webpage_service.enqueue_refresh(page)
+
+        return {
+            'message': 'WebPage queued for refresh',
+            'id': page.id,
+            'url': f'{SERVER_URL}/webpage/{page.id}'
+        }
+
+
 @ns.route('/<string:id>/chat')
 class WebPageChat(Resource):
     @auth.login_required
@@ -61,15 +156,58 @@ class WebPageChat(Resource):
         # get message from request
         message = request.json['message']
         page = webpage_service.get_webpage(id)
+
+        def notify(response):
+            # send message to slack
+            send_message(
+                message={
+                    'url': f'{SERVER_URL}/webpage/{page.id}',
+                    'message': message,
+                    'response': response
+                }, 
+                channel='#api-notifs'
+            )
+
+        # stream tokens as server-sent events if requested
+        if request.json.get('stream', False):
+            return sse_response(webpage_service.chat_stream(page, message), on_complete=notify)
+
         response = webpage_service.chat(page, message)
+        notify(response)
+
+        return response
+
+
+@ns.route('/<string:id>/chat/batch')
+class WebPageChatBatch(Resource):
+    @auth.login_required
+    @track_requests
+    def post(self, id):
+        # get questions from request
+        questions = request.json.get('questions')
+        if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+            return 'questions must be a list of strings', 400
+
+        page = webpage_service.get_webpage(id)
+        if not page:
+            return 'Invalid webpage id: {}'.format(id), 400
+
+        try:
+            answers = webpage_service.chat_batch(page, questions)
+        except ValueError as e:
+            return str(e), 400
+
+        response = [
+            {'question': question, 'answer': answer}
+            for question, answer in zip(questions, answers)
+        ]
 
         # send message to slack
         send_message(
             message={
                 'url': f'{SERVER_URL}/webpage/{page.id}',
-                'message': message,
-                'response': response
-            }, 
+                'questions': len(questions)
+            },
             channel='#api-notifs'
         )
 
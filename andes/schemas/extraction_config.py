@@ -1,4 +1,4 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 
 
@@ -6,6 +6,8 @@ from pydantic import BaseModel
 class ExtractionConfigSchema(BaseModel):
     extraction_type: str
     entities: List[Dict[str, Any]]
+    # only send the top k most relevant chunks per entity to the model
+    prefilter_top_k: Optional[int] = None
 
     # validate the extraction config
     @classmethod
@@ -18,3 +20,8 @@ class ExtractionConfigSchema(BaseModel):
         for entity in config['entities']:
             if 'name' not in entity or 'label' not in entity:
                 return False
+
+        # the prefilter must keep at least one chunk per entity
+        top_k = config.get('prefilter_top_k')
+        if top_k is not None and (not isinstance(top_k, int) or isinstance(top_k, bool) or top_k < 1):
+            raise ValueError('prefilter_top_k must be a positive integer')
@@ -0,0 +1,145 @@
+import re
+import logging
+import threading
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, List, Optional
+
+from prometheus_client import Counter
+
+from andes.utils.cache import TTLCache
+from andes.utils.config import (
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_SIMILARITY_THRESHOLD,
+)
+from andes.services.embeddings import get_embeddings
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+ANSWER_CACHE_HITS = Counter('answer_cache_hits_total', 'Answer cache hits.', ['mode'])
+ANSWER_CACHE_MISSES = Counter('answer_cache_misses_total', 'Answer cache misses.')
+
+
+def normalize_question(question: str) -> str:
+    """
+    lowercase, collapse whitespace and drop trailing punctuation
+    """
+    question = re.sub(r'\s+', ' ', question.strip().lower())
+    return question.rstrip('?.! ')
+
+
+class AnswerCache:
+    """
+    Cache of chat answers keyed by (scope, index version, normalized
+    question), where scope is e.g. 'document:<id>'. Answers cached for an
+    older index version are dropped as soon as a newer version is seen.
+
+    With a similarity threshold > 0, a miss on the exact key falls back
+    to the cached question of the same scope and version whose embedding
+    has the highest cosine similarity, if it is above the threshold.
+    """
+
+    def __init__(
+            self,
+            max_entries: int,
+            ttl: float,
+            similarity_threshold: float = 0,
+            embed_query: Optional[Callable[[str], List[float]]] = None
+        ):
+        self.similarity_threshold = similarity_threshold
+        # (scope, version, question) -> (answer, normalized embedding or None)
+        self._answers = TTLCache(max_entries, ttl)
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._embed = lru_cache(maxsize=1024)(embed_query) if embed_query else None
+
+    @property
+    def semantic(self) -> bool:
+        return self.similarity_threshold > 0 and self._embed is not None
+
+    def get(self, scope: str, version: str, question: str,
+            vector: Optional[List[float]] = None) -> Optional[str]:
+        """
+        cached answer of the question, if any. The semantic lookup uses
+        vector as the question's embedding when given, instead of
+        embedding the question itself.
+        """
+        self._check_version(scope, version)
+        question = normalize_question(question)
+
+        entry = self._answers.get((scope, version, question))
+        if entry is not None:
+            ANSWER_CACHE_HITS.labels(mode='exact').inc()
+            return entry[0]
+
+        if self.semantic:
+            answer = self._semantic_get(scope, version, question, vector)
+            if answer is not None:
+                ANSWER_CACHE_HITS.labels(mode='semantic').inc()
+                return answer
+
+        ANSWER_CACHE_MISSES.inc()
+        return None
+
+    def peek(self, scope: str, version: str, question: str) -> Optional[str]:
+        """
+        answer cached for exactly this question, without semantic lookup
+        or hit and miss counting
+        """
+        entry = self._answers.get((scope, version, normalize_question(question)))
+        return entry[0] if entry is not None else None
+
+    def set(self, scope: str, version: str, question: str, answer: str,
+            vector: Optional[List[float]] = None):
+        self._check_version(scope, version)
+        question = normalize_question(question)
+        embedding = self._embedding(question, vector) if self.semantic else None
+        self._answers.set((scope, version, question), (answer, embedding))
+
+    def invalidate(self, scope: str):
+        """
+        drop every cached answer of scope
+        """
+        self._answers.remove_if(lambda key: key[0] == scope)
+
+    def _check_version(self, scope: str, version: str):
+        # a rebuilt index invalidates the answers cached for the old one
+        with self._lock:
+            previous = self._versions.get(scope)
+            self._versions[scope] = version
+
+        if previous is not None and previous != version:
+            logging.info(f"Index of {scope} changed, dropping cached answers")
+            self._answers.remove_if(lambda key: key[0] == scope and key[1] != version)
+
+    def _semantic_get(self, scope: str, version: str, question: str,
+                      vector: Optional[List[float]] = None) -> Optional[str]:
+        candidates = [
+            value for key, value in self._answers.items()
+            if key[0] == scope and key[1] == version and value[1] is not None
+        ]
+        if not candidates:
+            return None
+
+        import numpy as np
+        query = self._embedding(question, vector)
+        similarities = np.stack([embedding for _, embedding in candidates]) @ query
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.similarity_threshold:
+            return candidates[best][0]
+        return None
+
+    def _embedding(self, question: str, vector: Optional[List[float]] = None) -> 'np.ndarray':
+        import numpy as np
+        vector = np.asarray(self._embed(question) if vector is None else vector, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+
+ANSWER_CACHE = AnswerCache(
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    embed_query=lambda question: get_embeddings().embed_query(question)
+)
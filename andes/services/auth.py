@@ -1,15 +1,52 @@
+import hashlib
+from functools import lru_cache
 from flask_httpauth import HTTPTokenAuth
-import boto3
 
-# Create a DynamoDB client
-dynamodb = boto3.client('dynamodb', region_name='us-west-1')
+from andes.utils.cache import TTLCache
+from andes.services.rq import get_connection
+from andes.utils.config import (
+    AUTH_CACHE_VALID_TTL,
+    AUTH_CACHE_INVALID_TTL,
+    AUTH_CACHE_MAX_ENTRIES,
+    DYNAMODB_ENDPOINT_URL,
+)
+
+@lru_cache(maxsize=None)
+def _dynamodb():
+    # Create a DynamoDB client on first use
+    import boto3
+    return boto3.client('dynamodb', region_name='us-west-1', endpoint_url=DYNAMODB_ENDPOINT_URL)
+
 
 auth = HTTPTokenAuth(scheme='Bearer')
 
+# revoked api key hashes are shared through redis, so every process
+# drops its cached verification of them
+REVOKED_KEY = 'revoked-api-key:{}'
+
+# api key hash -> whether the key is valid
+_verified_keys = TTLCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_VALID_TTL)
+
+
+def _key_hash(api_key: str) -> str:
+    # never keep raw api keys in memory longer than needed
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
 @auth.verify_token
 def verify_token(api_key):
+    if not api_key:
+        return False
+
+    key_hash = _key_hash(api_key)
+    valid = _verified_keys.get(key_hash)
+    if valid is False:
+        return False
+    if valid and not _revoked(key_hash):
+        return True
+
     # Get an item from the table
-    response = dynamodb.get_item(
+    response = _dynamodb().get_item(
         TableName='ANDES_API_KEYS',
         Key={
             'api_key': {'S': api_key}
@@ -17,4 +54,29 @@ def verify_token(api_key):
     )
 
     # Check if the item exists in the table
-    return 'Item' in response
+    valid = 'Item' in response
+    _verified_keys.set(key_hash, valid, ttl=AUTH_CACHE_VALID_TTL if valid else AUTH_CACHE_INVALID_TTL)
+    return valid
+
+
+def _revoked(key_hash: str) -> bool:
+    if not get_connection().exists(REVOKED_KEY.format(key_hash)):
+        return False
+    _verified_keys.pop(key_hash)
+    return True
+
+
+def revoke_api_key(api_key: str):
+    """
+    delete api_key from DynamoDB and mark it revoked in redis until every
+    cached verification of it has expired
+    """
+    key_hash = _key_hash(api_key)
+    _dynamodb().delete_item(
+        TableName='ANDES_API_KEYS',
+        Key={
+            'api_key': {'S': api_key}
+        }
+    )
+    get_connection().set(REVOKED_KEY.format(key_hash), 1, ex=AUTH_CACHE_VALID_TTL)
+    _verified_keys.pop(key_hash)
@@ -0,0 +1,87 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List
+
+from andes.utils.config import CHAT_BATCH_MAX_QUESTIONS, CHAT_BATCH_CONCURRENCY
+from andes.services.answer_cache import ANSWER_CACHE, normalize_question
+from andes.services.embeddings import get_embeddings
+
+if TYPE_CHECKING:
+    from langchain.chains import RetrievalQA
+    from langchain.vectorstores import FAISS
+    from langchain.docstore.document import Document as LangchainDocument
+
+
+def search_batch(index: 'FAISS', vectors: List[List[float]], k: int) -> List[List['LangchainDocument']]:
+    """
+    the k nearest chunks of every query vector, in one matrix search.
+    Chunks shared by several queries are read once.
+    """
+    import numpy as np
+    from andes.services.chunk_store import get_chunks
+
+    _, positions = index.index.search(np.array(vectors, dtype=np.float32), k)
+    # faiss pads with -1 when the index has fewer than k vectors
+    rows = [[int(position) for position in row if position != -1] for row in positions]
+    distinct = list(dict.fromkeys(position for row in rows for position in row))
+    chunks = dict(zip(distinct, get_chunks(index, distinct)))
+    return [[chunks[position] for position in row] for row in rows]
+
+
+def _embed_missing(vectors: dict, keys: List[str], questions: dict):
+    # embed the questions of keys in batched requests, into vectors
+    if keys:
+        vectors.update(zip(keys, get_embeddings().embed_queries([questions[key] for key in keys])))
+
+
+def answer_batch(qa: 'RetrievalQA', scope: str, version: str, questions: List[str]) -> List[str]:
+    """
+    answer questions on the index of the QA chain, in order. Cached
+    answers are reused; the remaining distinct questions are embedded in
+    batched requests, searched in a single matrix query and answered by
+    at most CHAT_BATCH_CONCURRENCY concurrent completions.
+    """
+    if not questions:
+        raise ValueError("Questions cannot be empty")
+    if len(questions) > CHAT_BATCH_MAX_QUESTIONS:
+        raise ValueError(f"At most {CHAT_BATCH_MAX_QUESTIONS} questions can be asked at once")
+
+    # normalized question -> question, for each distinct one
+    distinct = {}
+    for question in questions:
+        distinct.setdefault(normalize_question(question), question)
+
+    # questions missing from the cache are embedded in batched requests,
+    # and the semantic lookups and the search reuse their vectors
+    vectors = {}
+    unanswered = [key for key, question in distinct.items() if ANSWER_CACHE.peek(scope, version, question) is None]
+    _embed_missing(vectors, unanswered, distinct)
+
+    cached = {
+        key: ANSWER_CACHE.get(scope, version, question, vector=vectors.get(key))
+        for key, question in distinct.items()
+    }
+    pending = {key: distinct[key] for key, answer in cached.items() if answer is None}
+    if not pending:
+        return [cached[key] for key in map(normalize_question, questions)]
+    # answers that expired since they were peeked
+    _embed_missing(vectors, [key for key in pending if key not in vectors], distinct)
+
+    texts = list(pending.values())
+    retriever = qa.retriever
+    documents = search_batch(retriever.vectorstore, [vectors[key] for key in pending], retriever.search_kwargs.get('k', 4))
+
+    def complete(question: str, question_documents: list) -> str:
+        # the same packing and completion RetrievalQA runs after its own retrieval
+        question_documents = retriever.pack(question, question_documents)
+        return qa.combine_documents_chain.run(input_documents=question_documents, question=question)
+
+    with ThreadPoolExecutor(max_workers=CHAT_BATCH_CONCURRENCY) as executor:
+        completed = dict(zip(pending, executor.map(complete, texts, documents)))
+
+    for key, question in pending.items():
+        ANSWER_CACHE.set(scope, version, question, completed[key], vector=vectors[key])
+
+    return [
+        cached[key] if cached[key] is not None else completed[key]
+        for key in map(normalize_question, questions)
+    ]
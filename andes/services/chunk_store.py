@@ -0,0 +1,144 @@
+import json
+import sqlite3
+import threading
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Tuple, Union
+
+from langchain.docstore.base import Docstore
+from langchain.docstore.document import Document as LangchainDocument
+
+if TYPE_CHECKING:
+    from langchain.vectorstores import FAISS
+
+
+# sqlite limits the number of variables in a single statement
+LOOKUP_BATCH_SIZE = 500
+
+
+CREATE_TABLE = (
+    'CREATE TABLE IF NOT EXISTS chunks ('
+    'position INTEGER PRIMARY KEY, '
+    'id TEXT NOT NULL UNIQUE, '
+    'text TEXT NOT NULL, '
+    'metadata TEXT NOT NULL)'
+)
+
+
+def write_chunks(path: str, chunks: Iterable[Tuple[str, LangchainDocument]]):
+    """
+    write (docstore id, chunk) pairs to a new SQLite chunk store at path,
+    numbered by their vector position in order
+    """
+    writer = ChunkWriter(path)
+    writer.append(chunks)
+    writer.close()
+
+
+class ChunkWriter:
+    """
+    Append-only writer of a SQLite chunk store, so chunks can be written
+    as they are produced instead of being kept in memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(CREATE_TABLE)
+        self.count = self._conn.execute('SELECT COUNT(*) FROM chunks').fetchone()[0]
+
+    def append(self, chunks: Iterable[Tuple[str, LangchainDocument]]):
+        """
+        add (docstore id, chunk) pairs after the chunks already written
+        """
+        rows = [
+            (self.count + i, docstore_id, chunk.page_content, json.dumps(chunk.metadata))
+            for i, (docstore_id, chunk) in enumerate(chunks)
+        ]
+        with self._conn:
+            self._conn.executemany('INSERT INTO chunks VALUES (?, ?, ?, ?)', rows)
+        self.count += len(rows)
+
+    def truncate(self, count: int):
+        """
+        drop the chunks from position count on
+        """
+        with self._conn:
+            self._conn.execute('DELETE FROM chunks WHERE position >= ?', (count,))
+        self.count = min(self.count, count)
+
+    def close(self):
+        self._conn.close()
+
+
+class ChunkStore(Docstore):
+    """
+    Read-only langchain docstore backed by the SQLite chunk store of an
+    index. Chunk texts and metadata stay on disk and only the chunks a
+    search returns are read.
+
+    The connection is opened once, so the store keeps reading the file
+    it was opened with even after the index is rebuilt and the file is
+    replaced.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def ids(self) -> List[str]:
+        """
+        docstore ids of the chunks, by vector position
+        """
+        with self._lock:
+            return [row[0] for row in self._conn.execute('SELECT id FROM chunks ORDER BY position')]
+
+    def search(self, search: str) -> Union[str, LangchainDocument]:
+        with self._lock:
+            row = self._conn.execute('SELECT text, metadata FROM chunks WHERE id = ?', (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return LangchainDocument(page_content=row[0], metadata=json.loads(row[1]))
+
+    def get(self, positions: List[int]) -> List[LangchainDocument]:
+        """
+        chunks at the given vector positions, in the same order
+        """
+        found = {}
+        for i in range(0, len(positions), LOOKUP_BATCH_SIZE):
+            batch = positions[i:i + LOOKUP_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f'SELECT position, text, metadata FROM chunks WHERE position IN ({placeholders})',
+                    [int(position) for position in batch]
+                ).fetchall()
+            for position, text, metadata in rows:
+                found[position] = LangchainDocument(page_content=text, metadata=json.loads(metadata))
+        return [found[int(position)] for position in positions]
+
+    def __iter__(self) -> Iterator[Tuple[str, LangchainDocument]]:
+        # read in batches, so copying a store never holds all of it
+        position = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    'SELECT position, id, text, metadata FROM chunks WHERE position > ? ORDER BY position LIMIT ?',
+                    (position, LOOKUP_BATCH_SIZE)
+                ).fetchall()
+            if not rows:
+                return
+            for position, docstore_id, text, metadata in rows:
+                yield docstore_id, LangchainDocument(page_content=text, metadata=json.loads(metadata))
+
+    def close(self):
+        self._conn.close()
+
+
+def get_chunks(index: 'FAISS', positions: List[int]) -> List[LangchainDocument]:
+    """
+    chunks at the given vector positions of a loaded index, reading them
+    in one query when the index is disk-backed
+    """
+    if isinstance(index.docstore, ChunkStore):
+        return index.docstore.get(positions)
+    return [index.docstore.search(index.index_to_docstore_id[position]) for position in positions]
@@ -0,0 +1,165 @@
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+import tiktoken
+from prometheus_client import Histogram
+from langchain.llms.openai import BaseOpenAI
+from langchain.vectorstores.base import VectorStore, VectorStoreRetriever
+from langchain.docstore.document import Document as LangchainDocument
+
+from andes.prompts import FIN_QA_PROMPT
+from andes.utils.config import CONTEXT_FETCH_K, CONTEXT_MAX_TOKENS, CONTEXT_MIN_CHUNK_TOKENS
+from andes.services.embedding_cache import text_hash
+
+
+# tokens of context sent with each question, to follow prompt size and cost
+CONTEXT_TOKENS = Histogram(
+    'chat_context_tokens',
+    'Tokens of retrieved context sent with each question.',
+    buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 8000)
+)
+
+# the stuff chain joins chunks with this separator
+DOCUMENT_SEPARATOR = '\n\n'
+
+# end of a sentence, or of a line for tables and lists
+SENTENCE_BOUNDARY = re.compile(r'[.!?]["\')\]]*(?=\s)|\n')
+
+
+@lru_cache(maxsize=None)
+def _encoding(model_name: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
+
+
+@lru_cache(maxsize=None)
+def _prompt_tokens(model_name: str) -> int:
+    # tokens of FIN_QA_PROMPT without its context and question
+    template = FIN_QA_PROMPT.replace('{{context}}', '').replace('{{question}}', '')
+    return len(_encoding(model_name).encode(template))
+
+
+def context_window(llm: BaseOpenAI) -> int:
+    """
+    tokens left for the context and question in a completion of llm,
+    once the prompt and the answer are accounted for
+    """
+    size = llm.modelname_to_contextsize(llm.model_name)
+    return size - max(llm.max_tokens, 0) - _prompt_tokens(llm.model_name)
+
+
+def _trim(text: str, max_tokens: int, encoding: tiktoken.Encoding) -> str:
+    """
+    the longest prefix of text within max_tokens that ends at a sentence
+    boundary, or '' if there is none
+    """
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+
+    head = encoding.decode(tokens[:max_tokens])
+    ends = [match.end() for match in SENTENCE_BOUNDARY.finditer(head)]
+    return head[:ends[-1]].rstrip() if ends else ''
+
+
+def _dedupe(text: str, start: int, spans: List[Tuple[int, int]]) -> Tuple[str, int]:
+    """
+    cut from text, starting at offset start of its source, the parts
+    already covered by the packed spans of that source
+    """
+    end = start + len(text)
+    for span_start, span_end in spans:
+        if span_start <= start and end <= span_end:
+            return '', start
+        if span_start <= start < span_end:
+            text, start = text[span_end - start:], span_end
+        elif span_start < end <= span_end:
+            text, end = text[:span_start - start], span_start
+    return text, start
+
+
+def pack_context(chunks: List[LangchainDocument], question: str, window: int,
+                 model_name: str) -> List[LangchainDocument]:
+    """
+    pack chunks, most relevant first, into the tokens left by the window
+    for the question, up to CONTEXT_MAX_TOKENS. Repeated chunks and the
+    overlap between neighbouring chunks of the same source are dropped,
+    and the first chunk that does not fit is trimmed at a sentence
+    boundary. Chunks of several indexes carry the index's scope in their
+    metadata, so only chunks of the same index overlap.
+    """
+    encoding = _encoding(model_name)
+    budget = min(CONTEXT_MAX_TOKENS, window - len(encoding.encode(question)))
+    separator_tokens = len(encoding.encode(DOCUMENT_SEPARATOR))
+
+    packed = []
+    used = 0
+    seen: Set[str] = set()
+    # packed (start, end) offsets by (scope, source), for chunks split
+    # with start_index
+    spans: Dict[Tuple[Optional[str], Optional[str]], List[Tuple[int, int]]] = {}
+
+    for chunk in chunks:
+        digest = text_hash(' '.join(chunk.page_content.split()))
+        if digest in seen:
+            continue
+        seen.add(digest)
+
+        text, metadata = chunk.page_content, dict(chunk.metadata)
+        source = (metadata.get('scope'), metadata.get('source'))
+        if 'start_index' in metadata:
+            text, metadata['start_index'] = _dedupe(text, metadata['start_index'], spans.get(source, []))
+        if not text.strip():
+            continue
+
+        remaining = budget - used - separator_tokens
+        tokens = len(encoding.encode(text))
+        if tokens > remaining:
+            # trim the chunk to the budget left, then stop
+            if remaining >= CONTEXT_MIN_CHUNK_TOKENS:
+                text = _trim(text, remaining, encoding)
+                tokens = len(encoding.encode(text))
+            if not text or tokens > remaining or tokens < CONTEXT_MIN_CHUNK_TOKENS:
+                break
+
+        packed.append(LangchainDocument(page_content=text, metadata=metadata))
+        used += tokens + separator_tokens
+        if 'start_index' in metadata:
+            spans.setdefault(source, []).append((metadata['start_index'], metadata['start_index'] + len(text)))
+
+    CONTEXT_TOKENS.observe(used)
+    return packed
+
+
+class PackedRetriever(VectorStoreRetriever):
+    """
+    vector store retriever that fetches CONTEXT_FETCH_K chunks and packs
+    them into the token budget of the QA prompt with pack_context
+    """
+
+    window: int
+    model_name: str
+
+    def pack(self, question: str, chunks: List[LangchainDocument]) -> List[LangchainDocument]:
+        return pack_context(chunks, question, self.window, self.model_name)
+
+    def _get_relevant_documents(self, query: str, *, run_manager) -> List[LangchainDocument]:
+        return self.pack(query, super()._get_relevant_documents(query, run_manager=run_manager))
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager) -> List[LangchainDocument]:
+        return self.pack(query, await super()._aget_relevant_documents(query, run_manager=run_manager))
+
+
+def packed_retriever(index: VectorStore, llm: BaseOpenAI) -> PackedRetriever:
+    """
+    retriever over index packing the context for completions of llm
+    """
+    return PackedRetriever(
+        vectorstore=index,
+        search_kwargs={'k': CONTEXT_FETCH_K},
+        window=context_window(llm),
+        model_name=llm.model_name,
+    )
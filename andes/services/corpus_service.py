@@ -0,0 +1,175 @@
+import heapq
+import logging
+from functools import lru_cache
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Optional, Tuple, Union
+
+from andes import database as db
+from andes.models import Document, WebPage, Tag
+from andes.utils.config import CORPUS_SEARCH_CONCURRENCY, CORPUS_TOP_K, CORPUS_MAX_SHARDS
+from andes.services import document_service, webpage_service
+from andes.services.embeddings import get_embeddings
+from andes.prompts import fin_qa_prompt
+
+if TYPE_CHECKING:
+    from langchain.docstore.document import Document as LangchainDocument
+
+
+# index of each kind of shard, by id
+SHARD_INDEXES = {
+    'document': document_service.get_index,
+    'webpage': webpage_service.get_index,
+}
+
+
+def validate_tags(tags) -> List[str]:
+    """
+    raise a ValueError unless tags is a list of non-empty strings
+    """
+    if not isinstance(tags, list) or not all(isinstance(tag, str) and tag.strip() for tag in tags):
+        raise ValueError('tags must be a list of non-empty strings')
+    return tags
+
+
+def set_tags(item: Union[Document, WebPage], tags: List[str]):
+    """
+    replace the tags of a document or webpage
+    """
+    for tag in item.tags:
+        db.session.delete(tag)
+
+    key = 'document_id' if isinstance(item, Document) else 'webpage_id'
+    db.session.add_all([Tag(name=name, **{key: item.id}) for name in dict.fromkeys(tags)])
+    db.session.commit()
+
+
+def _known_ids(model: Union[type[Document], type[WebPage]], ids: Optional[List[str]]) -> List[str]:
+    """
+    the given document or webpage ids, checked against the database
+    before they are used in any index path
+    """
+    kind = model.__tablename__
+    if ids is None:
+        return []
+    if not isinstance(ids, list) or not all(isinstance(id, str) for id in ids):
+        raise ValueError(f"{kind}_ids must be a list of ids")
+    if len(ids) > CORPUS_MAX_SHARDS:
+        raise ValueError(f"A corpus can have at most {CORPUS_MAX_SHARDS} documents and webpages")
+
+    found = {id for (id,) in db.session.query(model.id).filter(model.id.in_(ids))}
+    unknown = [id for id in ids if id not in found]
+    if unknown:
+        raise LookupError(f"Invalid {kind} ids: {', '.join(unknown)}")
+    return ids
+
+
+def resolve_shards(
+        document_ids: Optional[List[str]] = None,
+        webpage_ids: Optional[List[str]] = None,
+        tag: Optional[str] = None
+    ) -> List[str]:
+    """
+    scopes ('document:<id>' or 'webpage:<id>') of the corpus made of the
+    given documents and webpages, and of everything tagged with tag.
+    Raises LookupError for ids of documents or webpages that do not exist.
+    """
+    scopes = [f'document:{id}' for id in _known_ids(Document, document_ids)]
+    scopes += [f'webpage:{id}' for id in _known_ids(WebPage, webpage_ids)]
+    if tag:
+        for item in Tag.query.filter_by(name=tag):
+            scopes.append(f'document:{item.document_id}' if item.document_id else f'webpage:{item.webpage_id}')
+
+    scopes = list(dict.fromkeys(scopes))
+    if not scopes:
+        raise ValueError("The corpus is empty")
+    if len(scopes) > CORPUS_MAX_SHARDS:
+        raise ValueError(f"A corpus can have at most {CORPUS_MAX_SHARDS} documents and webpages")
+    return scopes
+
+
+def _search_shard(scope: str, vector: List[float], k: int) -> Optional[List[Tuple[float, str, 'LangchainDocument']]]:
+    """
+    the k nearest chunks of a shard as (distance, scope, chunk), nearest
+    first, or None if the shard has no index yet, or one built with
+    another embedding backend. The scope and distance are added to the
+    metadata of the chunks.
+    """
+    import numpy as np
+    from langchain.docstore.document import Document as LangchainDocument
+    from andes.services.chunk_store import get_chunks
+
+    kind, id = scope.split(':', 1)
+    try:
+        index = SHARD_INDEXES[kind](id)
+    except ValueError:
+        return None
+
+    distances, positions = index.index.search(np.array([vector], dtype=np.float32), k)
+    # faiss pads with -1 when the index has fewer than k vectors
+    hits = [(float(distance), int(position)) for distance, position in zip(distances[0], positions[0]) if position != -1]
+    chunks = get_chunks(index, [position for _, position in hits])
+    return [
+        (distance, scope, LangchainDocument(
+            page_content=chunk.page_content,
+            metadata={**chunk.metadata, 'scope': scope, 'distance': distance}
+        ))
+        for (distance, _), chunk in zip(hits, chunks)
+    ]
+
+
+@lru_cache(maxsize=None)
+def _combine_chain():
+    from langchain.llms import OpenAI
+    from langchain.chains.question_answering import load_qa_chain
+    return load_qa_chain(OpenAI(temperature=0), chain_type="stuff", prompt=fin_qa_prompt())
+
+
+def query(scopes: List[str], question: str, k: int = CORPUS_TOP_K) -> dict:
+    """
+    answer a question across the indexes of the corpus. The shards are
+    searched concurrently, reusing indexes loaded for chat, and only the
+    globally nearest k chunks, merged with a heap and packed into the
+    prompt's token budget, go to the LLM.
+    """
+    assert question, "Question cannot be empty"
+
+    vector = get_embeddings().embed_query(question)
+    with ThreadPoolExecutor(max_workers=min(CORPUS_SEARCH_CONCURRENCY, len(scopes))) as executor:
+        results = list(executor.map(lambda scope: _search_shard(scope, vector, k), scopes))
+
+    skipped = [scope for scope, result in zip(scopes, results) if result is None]
+    if skipped:
+        logging.info(f"Skipping {len(skipped)} shards without an index")
+
+    # every shard is sorted by distance, so merging stops after k chunks
+    shards = [result for result in results if result]
+    best = list(islice(heapq.merge(*shards, key=lambda result: result[0]), k))
+    if not best:
+        raise ValueError("None of the documents or webpages of the corpus are indexed")
+
+    # pack the chunks into the prompt's token budget, as chat does
+    from andes.services.context_packer import context_window, pack_context
+    chain = _combine_chain()
+    llm = chain.llm_chain.llm
+    chunks = pack_context([chunk for _, _, chunk in best], question, context_window(llm), llm.model_name)
+    answer = chain.run(input_documents=chunks, question=question)
+
+    return {
+        'answer': answer,
+        # the chunks the answer was given, as packed
+        'sources': [_source(chunk) for chunk in chunks],
+        'skipped': skipped,
+    }
+
+
+def _source(chunk: 'LangchainDocument') -> dict:
+    metadata = dict(chunk.metadata)
+    kind, id = metadata.pop('scope').split(':', 1)
+    return {
+        'type': kind,
+        'id': id,
+        'distance': metadata.pop('distance'),
+        'metadata': metadata,
+        'text': chunk.page_content,
+    }
@@ -1,38 +1,50 @@
 import os
-import boto3
+import time
+import uuid
+import shutil
+import hashlib
 import logging
-import openai
-import json
-from PIL import Image
-import pytesseract
-from pypdf import PdfReader
-from rq import Retry
-from typing import Union
-
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.llms import OpenAI
-from langchain.vectorstores import FAISS
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from langchain.embeddings.openai import OpenAIEmbeddings
-
-from andes.models import Document, DocumentChatHistory
-from andes.utils.config import UPLOAD_DIRECTORY
-from andes.services.serialization import pickle_dump, pickle_load
-from andes.services.rq import QUEUES
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterator, List, Optional, Union
+from sqlalchemy import update, delete
+from sqlalchemy.exc import IntegrityError
+
+from andes import database as db
+from andes.models import Document, DocumentChatHistory, DocumentContent
+from andes.utils.config import UPLOAD_DIRECTORY, EXTRACTION_JOB_RESULT_TTL, INDEX_BUILD_LOCK_TIMEOUT
+from andes.services.rq import QUEUES, get_connection
+from andes.services.index_cache import INDEX_CACHE
+from andes.services import index_store
+from andes.services.embeddings import get_embeddings, embedding_backend
+from andes.services.answer_cache import ANSWER_CACHE
+from andes.services.batch_chat import answer_batch
+from andes.services import extraction_cache
+from andes.services.job_status import JobProgress, get_status, wait_for_change
 from andes.schemas.extraction_config import ExtractionConfigSchema
-from andes.prompts import FIN_QA_PROMPT
+from andes.prompts import fin_qa_prompt
 
+# langchain, OCR, PDF, rq and AWS modules are imported where they are
+# used, so serving metadata routes does not load them
+if TYPE_CHECKING:
+    from rq.job import Job
+    from langchain.chains import RetrievalQA
+    from langchain.vectorstores import FAISS
 
-QA_PROMPT = PromptTemplate(
-    template=FIN_QA_PROMPT, 
-    input_variables=["context", 'question'],
-    template_format='jinja2'
-)
+
+# uploads are stored by content hash under this subdirectory
+CONTENT_DIRECTORY = 'content'
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+# redis lock serializing the index builds of a content
+BUILD_LOCK_KEY = 'index-build-lock:{}'
 
 
 S3_BUCKET = 'andes-chat-documents'
-s3 = boto3.client('s3')
+
+
+@lru_cache(maxsize=None)
+def _s3():
+    import boto3
+    return boto3.client('s3')
 
 
 def create_document(filename: str):
@@ -44,15 +56,115 @@ def create_document(filename: str):
     return doc
 
 
+def _content_directory(content_hash: str) -> str:
+    return os.path.join(UPLOAD_DIRECTORY, CONTENT_DIRECTORY, content_hash)
+
+
+def _acquire_content(content_hash: str) -> DocumentContent:
+    """
+    add a reference to the content, creating it if it is new
+    """
+    for _ in range(2):
+        updated = DocumentContent.query.filter_by(content_hash=content_hash).update(
+            {'ref_count': DocumentContent.ref_count + 1}
+        )
+        if updated:
+            db.session.commit()
+            return DocumentContent.query.get(content_hash)
+
+        try:
+            content = DocumentContent(content_hash=content_hash, ref_count=1)
+            content.save()
+            return content
+        except IntegrityError:
+            # created concurrently by another upload, reference it instead
+            db.session.rollback()
+
+    raise RuntimeError(f"Could not reference content {content_hash}")
+
+
+def _release_content(content_hash: str):
+    """
+    drop a reference to the content, deleting its artifacts with the last one
+    """
+    ref_count = db.session.execute(
+        update(DocumentContent)
+        .where(DocumentContent.content_hash == content_hash)
+        .values(ref_count=DocumentContent.ref_count - 1)
+        .returning(DocumentContent.ref_count)
+    ).scalar()
+
+    # the row stays locked until the commit, so an upload of the same
+    # content waits and then creates it again
+    if ref_count is not None and ref_count <= 0:
+        logging.info(f"Deleting unreferenced content {content_hash}")
+        db.session.execute(delete(DocumentContent).where(DocumentContent.content_hash == content_hash))
+        shutil.rmtree(_content_directory(content_hash), ignore_errors=True)
+    db.session.commit()
+
+
 def save_file(doc: Document, file):
     """
-    saves the file to the uploads folder
+    saves the file to the uploads folder, hashing it while it streams in.
+    The document directory links to a directory shared by every upload
+    with the same content, so extracted text and index are reused.
     """
     logging.info(f"Saving Document {doc}")
-    filepath = os.path.join(UPLOAD_DIRECTORY, doc.id, doc.filename)
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    file.save(filepath)
-    return filepath
+    os.makedirs(os.path.join(UPLOAD_DIRECTORY, CONTENT_DIRECTORY), exist_ok=True)
+
+    upload_path = os.path.join(UPLOAD_DIRECTORY, CONTENT_DIRECTORY, f'{doc.id}.upload')
+    sha256 = hashlib.sha256()
+    with open(upload_path, 'wb') as f:
+        for block in iter(lambda: file.stream.read(UPLOAD_BLOCK_SIZE), b''):
+            sha256.update(block)
+            f.write(block)
+
+    content_hash = sha256.hexdigest()
+    content = _acquire_content(content_hash)
+    if content.ref_count > 1:
+        logging.info(f"Document {doc} is a duplicate of content {content_hash}")
+
+    content_directory = _content_directory(content_hash)
+    os.makedirs(content_directory, exist_ok=True)
+
+    filepath = os.path.join(content_directory, doc.filename)
+    if os.path.exists(filepath):
+        os.remove(upload_path)
+    else:
+        os.replace(upload_path, filepath)
+
+    # link the document directory to the shared content
+    os.symlink(os.path.join(CONTENT_DIRECTORY, content_hash), os.path.join(UPLOAD_DIRECTORY, doc.id))
+
+    doc.info = {**(doc.info or {}), 'content_hash': content_hash}
+    doc.save()
+
+    return os.path.join(UPLOAD_DIRECTORY, doc.id, doc.filename)
+
+
+def delete_document(doc: Document):
+    """
+    delete the document, its chat history and its reference to the
+    shared content
+    """
+    logging.info(f"Deleting Document {doc}")
+    INDEX_CACHE.invalidate(f'document:{doc.id}')
+    ANSWER_CACHE.invalidate(f'document:{doc.id}')
+
+    document_directory = os.path.join(UPLOAD_DIRECTORY, doc.id)
+    content_hash = (doc.info or {}).get('content_hash')
+    if content_hash:
+        if os.path.islink(document_directory):
+            os.remove(document_directory)
+        _release_content(content_hash)
+    else:
+        shutil.rmtree(document_directory, ignore_errors=True)
+
+    for chat in doc.chats:
+        db.session.delete(chat)
+    for tag in doc.tags:
+        db.session.delete(tag)
+    doc.delete()
 
 
 def get_document(id: str) -> Union[Document, None]:
@@ -62,105 +174,194 @@ def get_document(id: str) -> Union[Document, None]:
     return Document.query.get(id)
 
 
-def _run_ocr(fpath: str) -> str:
+def _iter_pages(fpath: str, start_page: int = 0) -> Iterator[str]:
     """
-    Perform OCR on a PDF or Image file
+    Perform OCR on a PDF or Image file, yielding the text page by page
     """
     if fpath.lower().endswith('pdf'):
-        reader = PdfReader(fpath)
-        raw_document_text = '\n\n'.join([page.extract_text() for page in reader.pages])
-    else:
+        from andes.services.pdf_extraction import iter_pdf_pages
+        yield from iter_pdf_pages(fpath, start_page)
+    elif start_page == 0:
+        from PIL import Image
+        import pytesseract
         image = Image.open(fpath)
-        raw_document_text = pytesseract.image_to_string(image)
+        yield pytesseract.image_to_string(image)
 
-    return raw_document_text
 
-
-def _split_pdf(raw_document_text: str, chunk_size=4000, chunk_overlap=50) -> list[str]:
+def create_index(doc: Document, progress: Optional[JobProgress] = None):
     """
-    Pre-process PDF into chunks
+    create a langchain index for the document, or reuse the index of its
+    shared content, reporting the upload, ocr, split, embed and persist
+    stages to progress
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size = chunk_size,
-        chunk_overlap  = chunk_overlap,
-        length_function = len,
-        add_start_index = True,
-    )
+    from andes.services.pdf_extraction import pdf_page_count
+    from andes.services.index_pipeline import IndexBuilder
 
-    splits = text_splitter.create_documents([raw_document_text])
-    texts = [split.page_content for split in splits]
-    return texts
-
-
-def create_index(doc: Document):
-    """
-    create a langchain index for the document
-    """
     logging.info(f"Started creating index for {doc.filename}")
+    progress = progress or JobProgress(None)
 
-    filepath = os.path.join(UPLOAD_DIRECTORY, doc.id, doc.filename)
-    raw_document_text = _run_ocr(filepath)
+    dirpath = os.path.join(UPLOAD_DIRECTORY, doc.id)
+    filepath = os.path.join(dirpath, doc.filename)
 
-    # save the raw document text to disk
-    raw_document_text_path = os.path.join(UPLOAD_DIRECTORY, doc.id, 'raw_document_text.txt')
-    with open(raw_document_text_path, 'w') as f:
-        f.write(raw_document_text)
+    if filepath.lower().endswith('pdf'):
+        doc.page_count = pdf_page_count(filepath)
+        doc.save()
 
     # upload the file to s3
     file_name = f'{doc.id}.pdf'
-    s3.upload_file(filepath, S3_BUCKET, file_name,
-        ExtraArgs={
-            'ContentType': 'application/pdf',
-            'ContentDisposition': 'inline'
-        }
+    with progress.timed('upload', done=1):
+        _s3().upload_file(filepath, S3_BUCKET, file_name,
+            ExtraArgs={
+                'ContentType': 'application/pdf',
+                'ContentDisposition': 'inline'
+            }
+        )
+
+    def pages(start_page: int) -> Iterator[str]:
+        # pages before start_page were extracted by a previous attempt
+        progress.advance('ocr', done=start_page, total=doc.page_count)
+        return progress.track('ocr', _iter_pages(filepath, start_page))
+
+    # documents with the same content build its index one at a time, the
+    # later ones reuse it
+    content_id = (doc.info or {}).get('content_hash', doc.id)
+    lock = get_connection().lock(
+        BUILD_LOCK_KEY.format(content_id),
+        timeout=INDEX_BUILD_LOCK_TIMEOUT,
+        blocking_timeout=INDEX_BUILD_LOCK_TIMEOUT
     )
+    with lock:
+        if index_store.index_exists(dirpath) and index_store.index_embedding_backend(dirpath) == embedding_backend():
+            logging.info(f"Index already exists for {doc.filename}, skipping index generation")
+            return
+
+        # stream pages through the splitter and embeddings into the index,
+        # saving the raw document text to disk along the way
+        logging.info(f"Building index for {doc.filename}")
+        builder = IndexBuilder(
+            dirpath,
+            get_embeddings(),
+            raw_text_path=os.path.join(dirpath, 'raw_document_text.txt'),
+            progress=progress
+        )
+        index = builder.build(pages)
+
+        # pick the index type for the number of chunks
+        with progress.timed('optimize'):
+            index_store.optimize_index(index)
+
+        # save the index to disk
+        with progress.timed('persist'):
+            index_store.save_index(index, dirpath)
+        builder.clear_checkpoint()
+
+
+def index_job(doc_id: str):
+    """
+    run create_index inside an RQ worker, recording the job status
+    """
+    doc = get_document(doc_id)
+    if not doc:
+        raise ValueError(f"Invalid document id: {doc_id}")
 
-    # split the document into chunks
-    doc_splits = _split_pdf(raw_document_text)
-
-    # create a langchain index for each chunk
-    logging.info(f"Building index for {doc.filename}")
-    embeddings = OpenAIEmbeddings()
-    index = FAISS.from_texts(doc_splits, embeddings)
-
-    # save the index to disk
-    index_path = os.path.join(UPLOAD_DIRECTORY, doc.id, 'index.pkl')
-    pickle_dump(index, index_path)
+    progress = JobProgress(f'document:{doc.id}')
+    with progress.run():
+        create_index(doc, progress)
 
 
 def enqueue_index_gen(doc: Document):
     """
     enqueue the index generation task into a redis queue
     """
-    QUEUES['index_gen'].enqueue(create_index, doc, retry=Retry(max=3))
+    # duplicate uploads are enqueued too: their jobs upload the file and
+    # count its pages, then reuse the index of the shared content
+    from rq import Retry
+
+    # the status is queued before the job can start running
+    job_id = str(uuid.uuid4())
+    JobProgress(f'document:{doc.id}', reset=True).queued(job_id)
+    QUEUES['index_gen'].enqueue(index_job, doc.id, job_id=job_id, retry=Retry(max=3))
     logging.info(f"Enqueued index generation for {doc.filename}")
 
 
-def chat(doc: Document, message: str) -> str:
-    # query openai on the langchain index
+def get_index_status(doc: Document, since_version: Optional[int] = None, wait: float = 0) -> Optional[dict]:
+    """
+    status of the index jobs of the document. With since_version, wait
+    up to wait seconds for a status newer than that version.
+    None if no job status was recorded and there is no index.
+    """
+    scope = f'document:{doc.id}'
+    if since_version is not None and wait > 0:
+        status = wait_for_change(scope, since_version, wait)
+    else:
+        status = get_status(scope)
 
-    # sanity checks
-    if not os.path.exists(os.path.join(UPLOAD_DIRECTORY, doc.id, 'index.pkl')):
-        raise ValueError("Index does not exist for this document")
-    
-    assert message is not None, "Message cannot be empty"
+    if status is None and index_store.index_exists(os.path.join(UPLOAD_DIRECTORY, doc.id)):
+        # indexed before statuses were recorded, or the status expired
+        status = {'status': 'ready', 'version': 0}
+    return status
 
-    # load the index from disk
-    index_path = os.path.join(UPLOAD_DIRECTORY, doc.id, 'index.pkl')
-    index = pickle_load(index_path)
 
-    # create a chain
-    qa = RetrievalQA.from_chain_type(
-        OpenAI(temperature=0), 
+def _load_qa_chain(index_path: str) -> 'RetrievalQA':
+    """
+    load the index from disk and create a QA chain on top of it
+    """
+    from langchain.llms import OpenAI
+    from langchain.chains import RetrievalQA
+    from andes.services.context_packer import packed_retriever
+
+    index = index_store.load_index(os.path.dirname(index_path), get_embeddings())
+    # streaming lets chat_stream forward tokens, plain runs are unaffected
+    llm = OpenAI(temperature=0, streaming=True)
+    return RetrievalQA.from_chain_type(
+        llm, 
         chain_type="stuff", 
-        retriever=index.as_retriever(),
+        # the retrieved chunks are packed into the prompt's token budget
+        retriever=packed_retriever(index, llm),
         chain_type_kwargs={
-            "prompt": QA_PROMPT
+            "prompt": fin_qa_prompt()
         }
     )
 
-    # query GPT
-    response = qa.run(message)
+
+def _get_qa_chain(doc: Document) -> 'RetrievalQA':
+    """
+    get the QA chain for the document, reusing it if already in memory
+    """
+    # sanity checks
+    if not index_store.index_exists(os.path.join(UPLOAD_DIRECTORY, doc.id)):
+        raise ValueError("Index does not exist for this document")
+
+    index_path = index_store.index_path(os.path.join(UPLOAD_DIRECTORY, doc.id))
+    return INDEX_CACHE.get(f'document:{doc.id}', index_path, _load_qa_chain)
+
+
+def get_index(doc_id: str) -> 'FAISS':
+    """
+    the loaded index of the document, shared with its QA chain through
+    the index cache
+    """
+    dirpath = os.path.join(UPLOAD_DIRECTORY, doc_id)
+    if not index_store.index_exists(dirpath):
+        raise ValueError("Index does not exist for this document")
+
+    index_path = index_store.index_path(dirpath)
+    return INDEX_CACHE.get(f'document:{doc_id}', index_path, _load_qa_chain).retriever.vectorstore
+
+
+def chat(doc: Document, message: str) -> str:
+    # query openai on the langchain index
+    qa = _get_qa_chain(doc)
+    assert message is not None, "Message cannot be empty"
+
+    # reuse the answer of a repeated question on the same index
+    version = index_store.index_version(os.path.join(UPLOAD_DIRECTORY, doc.id))
+    response = ANSWER_CACHE.get(f'document:{doc.id}', version, message)
+
+    if response is None:
+        # query GPT
+        response = qa.run(message)
+        ANSWER_CACHE.set(f'document:{doc.id}', version, message, response)
 
     # save the chat history
     DocumentChatHistory(
@@ -172,11 +373,59 @@ def chat(doc: Document, message: str) -> str:
     return response
 
 
+def chat_stream(doc: Document, message: str) -> Iterator[str]:
+    """
+    like chat, but yield the answer tokens as they are generated.
+    The chat history is saved once the answer is complete.
+    """
+    from andes.services.streaming import stream_chain
+
+    qa = _get_qa_chain(doc)
+    assert message is not None, "Message cannot be empty"
+
+    # reuse the answer of a repeated question on the same index
+    version = index_store.index_version(os.path.join(UPLOAD_DIRECTORY, doc.id))
+    response = ANSWER_CACHE.get(f'document:{doc.id}', version, message)
+
+    if response is None:
+        # query GPT
+        response = yield from stream_chain(qa, message)
+        ANSWER_CACHE.set(f'document:{doc.id}', version, message, response)
+    else:
+        yield response
+
+    # save the chat history
+    DocumentChatHistory(
+        document_id = doc.id,
+        question = message,
+        answer = response
+    ).save()
+
+
+def chat_batch(doc: Document, questions: List[str]) -> List[str]:
+    """
+    answer several questions on the document at once, in order, loading
+    its index once. The chat history rows are inserted together.
+    """
+    qa = _get_qa_chain(doc)
+    version = index_store.index_version(os.path.join(UPLOAD_DIRECTORY, doc.id))
+    answers = answer_batch(qa, f'document:{doc.id}', version, questions)
+
+    # save the chat history
+    db.session.add_all([
+        DocumentChatHistory(document_id=doc.id, question=question, answer=answer)
+        for question, answer in zip(questions, answers)
+    ])
+    db.session.commit()
+
+    return answers
+
+
 def extract(doc: Document, config: ExtractionConfigSchema) -> str:
     # query openai on the langchain index
 
     # sanity checks
-    if not os.path.exists(os.path.join(UPLOAD_DIRECTORY, doc.id, 'index.pkl')):
+    if not index_store.index_exists(os.path.join(UPLOAD_DIRECTORY, doc.id)):
         raise ValueError("Index does not exist for this document")
     
     assert config is not None, "Extraction config cannot be empty"
@@ -186,35 +435,83 @@ def extract(doc: Document, config: ExtractionConfigSchema) -> str:
     with open(raw_document_text_path, 'r') as f:
         raw_document_text = f.read()
 
-    # create functions to call using the config
-    functions = [
-        {
-            'name': 'extract_all_key_information',
-            'description': 'Extract all key information from the document',
-            'parameters': {
-                'type': 'object',
-                # create a schema from the config
-                'properties': {
-                    x['label'] : {'type': 'string'} for x in config['entities']
-                }
-            }
-        }
-    ]
-
-    # function calling using GPT 4
-    response = openai.ChatCompletion.create(
-        model = 'gpt-4',
-        messages = [{'role': 'user', 'content': raw_document_text}],
-        functions = functions,
-        function_call = 'auto'
-    )
-    
-    response = response['choices'][0]['message']
+    # reuse the result of an identical (document, config) extraction
+    key = extraction_cache.cache_key(raw_document_text, config)
+    result = extraction_cache.get_result(key)
+    if result is not None:
+        logging.info(f"Using cached extraction for {doc}")
+        return result
+
+    # load the index to prefilter relevant chunks if requested
+    index = None
+    if config.get('prefilter_top_k'):
+        index = _get_qa_chain(doc).retriever.vectorstore
 
-    # save raw response to disk
+    # chunked function calling using GPT 4
+    from andes.services import extraction
+    result, responses = extraction.extract(raw_document_text, config, index=index)
+
+    # save raw responses to disk
     raw_response_path = os.path.join(UPLOAD_DIRECTORY, doc.id, 'raw_openai_response.txt')
     with open(raw_response_path, 'w') as f:
-        f.write(str(response))
+        f.write(str(responses))
+
+    extraction_cache.save_result(key, result)
+    return result
+
 
-    # parse function call input
-    return json.loads(response['function_call']['arguments'])
+def extract_job(doc_id: str, config: ExtractionConfigSchema) -> dict:
+    """
+    run an extraction inside an RQ worker
+    """
+    doc = get_document(doc_id)
+    if not doc:
+        raise ValueError(f"Invalid document id: {doc_id}")
+    return extract(doc, config)
+
+
+def enqueue_extract(doc: Document, config: ExtractionConfigSchema) -> 'Job':
+    """
+    enqueue an extraction task into a redis queue
+    """
+    from rq import Retry
+
+    job = QUEUES['extraction'].enqueue(
+        extract_job, doc.id, config,
+        retry=Retry(max=3),
+        result_ttl=EXTRACTION_JOB_RESULT_TTL,
+        failure_ttl=EXTRACTION_JOB_RESULT_TTL
+    )
+    logging.info(f"Enqueued extraction {job.id} for {doc.filename}")
+    return job
+
+
+def get_extract_job(doc: Document, job_id: str, wait: float = 0) -> Union[dict, None]:
+    """
+    status of an extraction job of the document, waiting up to wait
+    seconds for it to finish. returns None for unknown jobs.
+    """
+    from rq.job import Job, JobStatus
+    from rq.exceptions import NoSuchJobError
+
+    try:
+        job = Job.fetch(job_id, connection=QUEUES['extraction'].connection)
+    except NoSuchJobError:
+        return None
+
+    if job.func_name != f'{__name__}.extract_job' or job.args[0] != doc.id:
+        return None
+
+    # long-poll until the job is done or the wait is over
+    deadline = time.monotonic() + wait
+    status = job.get_status()
+    while status not in (JobStatus.FINISHED, JobStatus.FAILED) and time.monotonic() < deadline:
+        time.sleep(0.5)
+        status = job.get_status()
+
+    response = {'id': job.id, 'status': status.value}
+    if status == JobStatus.FINISHED:
+        response['result'] = job.result
+    elif status == JobStatus.FAILED:
+        response['error'] = job.exc_info.strip().splitlines()[-1] if job.exc_info else 'Extraction failed'
+    return response
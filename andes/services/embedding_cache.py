@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import hashlib
+import logging
+from array import array
+from typing import List
+
+from langchain.embeddings.base import Embeddings
+
+
+# sqlite limits the number of variables in a single statement
+LOOKUP_BATCH_SIZE = 500
+
+
+def text_hash(text: str) -> str:
+    """
+    sha256 hex digest of a chunk text
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper backed by a persistent SQLite store keyed by
+    (model name, hash of chunk text). Only cache misses are sent to the
+    underlying embeddings provider.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache_path: str):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache_path = cache_path
+        self._init_store()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        cached = self._lookup(set(hashes))
+
+        # embed each distinct missing text once
+        missing = {}
+        for text, h in zip(texts, hashes):
+            if h not in cached and h not in missing:
+                missing[h] = text
+
+        logging.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            new = dict(zip(missing.keys(), vectors))
+            self._store(new)
+            cached.update(new)
+
+        return [cached[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        # queries are rarely repeated, send them straight to the provider
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        embed several queries in batched provider requests, uncached
+        like embed_query
+        """
+        return self.embeddings.embed_documents(texts)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.cache_path, timeout=30)
+
+    def _init_store(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        with self._connect() as conn:
+            # WAL lets the API and RQ workers read while another process writes
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS embeddings ('
+                'model TEXT NOT NULL, '
+                'hash TEXT NOT NULL, '
+                'vector BLOB NOT NULL, '
+                'PRIMARY KEY (model, hash))'
+            )
+
+    def _lookup(self, hashes: set) -> dict:
+        hashes = list(hashes)
+        found = {}
+        with self._connect() as conn:
+            for i in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+                batch = hashes[i:i + LOOKUP_BATCH_SIZE]
+                rows = conn.execute(
+                    f'SELECT hash, vector FROM embeddings WHERE model = ? '
+                    f'AND hash IN ({",".join("?" * len(batch))})',
+                    [self.model_name, *batch]
+                )
+                for h, blob in rows:
+                    found[h] = array('f', blob).tolist()
+        return found
+
+    def _store(self, vectors: dict):
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)',
+                [(self.model_name, h, array('f', vector).tobytes()) for h, vector in vectors.items()]
+            )
@@ -0,0 +1,158 @@
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import openai
+import tiktoken
+from langchain.embeddings.base import Embeddings
+
+
+# maximum number of inputs accepted by a single embeddings request
+MAX_BATCH_SIZE = 2048
+
+# errors worth retrying with backoff
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.APIError,
+    openai.error.Timeout,
+    openai.error.APIConnectionError,
+    openai.error.ServiceUnavailableError,
+)
+
+
+def retry_delay(attempt: int, error: Exception) -> float:
+    """
+    seconds to wait before retrying a failed OpenAI request
+    """
+    # honour the provider's retry-after header when present
+    headers = getattr(error, 'headers', None) or {}
+    retry_after = headers.get('retry-after')
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+
+    delay = min(2 ** attempt, 60) + random.uniform(0, 1)
+    logging.warning(f"OpenAI request failed ({error}), retrying in {delay:.1f}s")
+    return delay
+
+
+class RateLimiter:
+    """
+    Token bucket limiter for requests per minute and tokens per minute.
+    Budgets are enforced per process.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        """
+        block until a request of the given number of tokens fits the budgets
+        """
+        # a request larger than the whole budget waits for a full bucket
+        tokens = min(tokens, self.tokens_per_minute)
+
+        while True:
+            with self._lock:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+
+                wait = max(
+                    (1 - self._requests) * 60 / self.requests_per_minute,
+                    (tokens - self._tokens) * 60 / self.tokens_per_minute,
+                )
+
+            time.sleep(wait)
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+
+class BatchedOpenAIEmbeddings(Embeddings):
+    """
+    OpenAI embeddings that split texts into token-bounded batches and
+    send them concurrently, within rate limits and with exponential
+    backoff on 429s and transient errors.
+
+    api_base can point at a local fake embeddings server for tests.
+    """
+
+    def __init__(
+            self,
+            model: str,
+            rate_limiter: RateLimiter,
+            parallelism: int = 4,
+            max_batch_tokens: int = 8000,
+            max_retries: int = 6,
+            api_base: Optional[str] = None
+        ):
+        self.model = model
+        self.rate_limiter = rate_limiter
+        self.parallelism = parallelism
+        self.max_batch_tokens = max_batch_tokens
+        self.max_retries = max_retries
+        self.api_base = api_base
+        self.encoding = tiktoken.encoding_for_model(model)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = self._make_batches(texts)
+        logging.info(f"Embedding {len(texts)} texts in {len(batches)} batches")
+
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            results = executor.map(lambda batch: self._embed_batch(*batch), batches)
+            return [vector for vectors in results for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text], len(self.encoding.encode(text)))[0]
+
+    def _make_batches(self, texts: List[str]) -> list:
+        """
+        group consecutive texts into (texts, token count) batches of at
+        most max_batch_tokens tokens
+        """
+        batches = []
+        batch, batch_tokens = [], 0
+        for text in texts:
+            tokens = len(self.encoding.encode(text))
+            if batch and (batch_tokens + tokens > self.max_batch_tokens or len(batch) >= MAX_BATCH_SIZE):
+                batches.append((batch, batch_tokens))
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+
+        if batch:
+            batches.append((batch, batch_tokens))
+        return batches
+
+    def _embed_batch(self, texts: List[str], tokens: int) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(tokens)
+            try:
+                response = openai.Embedding.create(
+                    model=self.model,
+                    input=texts,
+                    api_base=self.api_base
+                )
+                data = sorted(response['data'], key=lambda x: x['index'])
+                return [x['embedding'] for x in data]
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(retry_delay(attempt, e))
@@ -0,0 +1,85 @@
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from andes.utils.config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_MODEL,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_API_BASE,
+    EMBEDDING_PARALLELISM,
+    EMBEDDING_BATCH_TOKENS,
+    EMBEDDING_REQUESTS_PER_MINUTE,
+    EMBEDDING_TOKENS_PER_MINUTE,
+    LOCAL_EMBEDDING_MODEL,
+    LOCAL_EMBEDDING_BATCH_SIZE,
+    LOCAL_EMBEDDING_THREADS,
+)
+
+if TYPE_CHECKING:
+    from langchain.embeddings.base import Embeddings
+
+
+@lru_cache(maxsize=None)
+def _rate_limiter():
+    # shared by every embeddings object in this process
+    from andes.services.embedding_executor import RateLimiter
+    return RateLimiter(EMBEDDING_REQUESTS_PER_MINUTE, EMBEDDING_TOKENS_PER_MINUTE)
+
+
+def _openai_embeddings() -> 'Embeddings':
+    from andes.services.embedding_executor import BatchedOpenAIEmbeddings
+    return BatchedOpenAIEmbeddings(
+        model=EMBEDDING_MODEL,
+        rate_limiter=_rate_limiter(),
+        parallelism=EMBEDDING_PARALLELISM,
+        max_batch_tokens=EMBEDDING_BATCH_TOKENS,
+        api_base=EMBEDDING_API_BASE
+    )
+
+
+@lru_cache(maxsize=None)
+def _local_embeddings() -> 'Embeddings':
+    # the model is loaded once per process
+    from andes.services.local_embeddings import LocalEmbeddings
+    return LocalEmbeddings(
+        LOCAL_EMBEDDING_MODEL,
+        batch_size=LOCAL_EMBEDDING_BATCH_SIZE,
+        threads=LOCAL_EMBEDDING_THREADS
+    )
+
+
+# embedding backends by name, with the model each one runs
+EMBEDDING_BACKENDS = {
+    'openai': (_openai_embeddings, EMBEDDING_MODEL),
+    'local': (_local_embeddings, LOCAL_EMBEDDING_MODEL),
+}
+
+# backend of the indexes built before backends were recorded
+LEGACY_EMBEDDING_BACKEND = 'openai:text-embedding-ada-002'
+
+
+def _backend():
+    if EMBEDDING_BACKEND not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Invalid embedding backend: {EMBEDDING_BACKEND}")
+    return EMBEDDING_BACKENDS[EMBEDDING_BACKEND]
+
+
+def embedding_backend() -> str:
+    """
+    backend and model of this deployment, e.g. 'openai:text-embedding-ada-002',
+    recorded in every index it builds
+    """
+    return f'{EMBEDDING_BACKEND}:{_backend()[1]}'
+
+
+def get_embeddings() -> 'Embeddings':
+    """
+    embeddings used to build and query indexes, from the backend chosen
+    with EMBEDDING_BACKEND, with a persistent cache in front of it
+    """
+    # langchain, openai and the local model are only imported once
+    # embeddings are needed
+    from andes.services.embedding_cache import CachedEmbeddings
+
+    create, model = _backend()
+    return CachedEmbeddings(create(), model_name=model, cache_path=EMBEDDING_CACHE_PATH)
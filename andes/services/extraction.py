@@ -0,0 +1,148 @@
+import json
+import time
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import openai
+import tiktoken
+from langchain.vectorstores import FAISS
+
+from andes.utils.config import (
+    EXTRACTION_MODEL,
+    EXTRACTION_WINDOW_TOKENS,
+    EXTRACTION_WINDOW_OVERLAP,
+    EXTRACTION_PARALLELISM,
+)
+from andes.services.embedding_executor import RETRYABLE_ERRORS, retry_delay
+
+
+FUNCTION_NAME = 'extract_all_key_information'
+MAX_RETRIES = 6
+
+# smaller prefilters are raised to the k chat retrieves with by default
+PREFILTER_MIN_TOP_K = 4
+
+
+def _make_functions(config: dict) -> list:
+    """
+    create functions to call using the config
+    """
+    return [
+        {
+            'name': FUNCTION_NAME,
+            'description': 'Extract all key information from the document',
+            'parameters': {
+                'type': 'object',
+                # create a schema from the config
+                'properties': {
+                    x['label'] : {'type': 'string'} for x in config['entities']
+                }
+            }
+        }
+    ]
+
+
+def split_windows(text: str, window_tokens: int = EXTRACTION_WINDOW_TOKENS,
+                  overlap_tokens: int = EXTRACTION_WINDOW_OVERLAP) -> List[str]:
+    """
+    split text into windows of at most window_tokens tokens, consecutive
+    windows overlapping by overlap_tokens
+    """
+    encoding = tiktoken.encoding_for_model(EXTRACTION_MODEL)
+    tokens = encoding.encode(text)
+    step = max(window_tokens - overlap_tokens, 1)
+
+    windows = []
+    for start in range(0, max(len(tokens), 1), step):
+        windows.append(encoding.decode(tokens[start:start + window_tokens]))
+        if start + window_tokens >= len(tokens):
+            break
+    return windows
+
+
+def prefilter_chunks(text: str, index: FAISS, config: dict, top_k: int) -> List[str]:
+    """
+    keep only the top_k most relevant index chunks for each entity, in
+    the order they appear in the document
+    """
+    chunks = {}
+    for entity in config['entities']:
+        query = entity.get('description') or f"{entity['name']} ({entity['label']})"
+        for chunk in index.similarity_search(query, k=top_k):
+            chunks[chunk.page_content] = text.find(chunk.page_content)
+
+    return sorted(chunks, key=lambda chunk: (chunks[chunk], chunk))
+
+
+def _extract_window(window: str, functions: list) -> Tuple[Dict[str, Any], dict]:
+    """
+    run function calling extraction on a single window
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = openai.ChatCompletion.create(
+                model = EXTRACTION_MODEL,
+                messages = [{'role': 'user', 'content': window}],
+                functions = functions,
+                function_call = {'name': FUNCTION_NAME}
+            )
+            break
+        except RETRYABLE_ERRORS as e:
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(retry_delay(attempt, e))
+
+    message = response['choices'][0]['message']
+    try:
+        fields = json.loads(message['function_call']['arguments'])
+    except (KeyError, json.JSONDecodeError):
+        logging.warning('Extraction window returned no parsable function call')
+        fields = {}
+    return fields, message
+
+
+def merge_results(results: List[Dict[str, Any]], labels: List[str]) -> Dict[str, Any]:
+    """
+    merge per-window results into one value per label: the most common
+    non-empty value, ties broken by the earliest window it appears in
+    """
+    merged = {}
+    for label in labels:
+        values = [
+            result[label] for result in results
+            if result.get(label) not in (None, '', 'N/A')
+        ]
+        if not values:
+            merged[label] = None
+            continue
+
+        counts = Counter(json.dumps(value, sort_keys=True) for value in values)
+        merged[label] = max(values, key=lambda v: (counts[json.dumps(v, sort_keys=True)], -values.index(v)))
+    return merged
+
+
+def extract(text: str, config: dict, index: Optional[FAISS] = None) -> Tuple[Dict[str, Any], List[dict]]:
+    """
+    map-reduce extraction: run function calling on token windows of the
+    text concurrently and merge the results per entity label. When the
+    config sets prefilter_top_k and an index is given, only the chunks
+    relevant to each entity are sent.
+
+    returns the merged fields and the raw response messages
+    """
+    top_k = config.get('prefilter_top_k')
+    if index is not None and top_k:
+        text = '\n\n'.join(prefilter_chunks(text, index, config, max(top_k, PREFILTER_MIN_TOP_K)))
+
+    windows = split_windows(text)
+    functions = _make_functions(config)
+    logging.info(f"Extracting {len(config['entities'])} entities from {len(windows)} windows")
+
+    with ThreadPoolExecutor(max_workers=EXTRACTION_PARALLELISM) as executor:
+        outputs = list(executor.map(lambda window: _extract_window(window, functions), windows))
+
+    results = [fields for fields, _ in outputs]
+    labels = [entity['label'] for entity in config['entities']]
+    return merge_results(results, labels), [message for _, message in outputs]
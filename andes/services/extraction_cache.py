@@ -0,0 +1,44 @@
+import os
+import json
+import hashlib
+from typing import Any, Dict, Optional
+
+from andes.utils.config import EXTRACTION_CACHE_DIRECTORY, EXTRACTION_MODEL
+from andes.services.serialization import json_dump, json_load
+
+
+def cache_key(text: str, config: dict) -> str:
+    """
+    key of an extraction: hash of the document content and of the
+    canonicalized config (including the model it runs on)
+    """
+    text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    canonical_config = json.dumps(
+        {'model': EXTRACTION_MODEL, 'config': config},
+        sort_keys=True,
+        separators=(',', ':')
+    )
+    config_hash = hashlib.sha256(canonical_config.encode('utf-8')).hexdigest()
+    return os.path.join(text_hash, config_hash)
+
+
+def get_result(key: str) -> Optional[Dict[str, Any]]:
+    """
+    cached extraction result for key, if any
+    """
+    filepath = os.path.join(EXTRACTION_CACHE_DIRECTORY, key + '.json')
+    if not os.path.exists(filepath):
+        return None
+    return json_load(filepath)
+
+
+def save_result(key: str, result: Dict[str, Any]):
+    """
+    cache the extraction result for key
+    """
+    filepath = os.path.join(EXTRACTION_CACHE_DIRECTORY, key + '.json')
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+    # write then rename so concurrent readers never see a partial file
+    json_dump(result, f'{filepath}.{os.getpid()}.tmp')
+    os.replace(f'{filepath}.{os.getpid()}.tmp', filepath)
@@ -0,0 +1,107 @@
+import re
+from typing import Optional
+from urllib.parse import urljoin
+
+import lxml.html
+from lxml import etree
+
+
+# elements whose content is never useful text
+BOILERPLATE_TAGS = {
+    'head', 'script', 'style', 'noscript', 'template', 'svg', 'iframe', 'canvas',
+    'nav', 'header', 'footer', 'aside', 'form', 'button', 'select',
+}
+BOILERPLATE_ROLES = {'navigation', 'banner', 'contentinfo', 'complementary', 'search'}
+
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+
+# elements that end a line of text
+BLOCK_TAGS = HEADING_TAGS | {
+    'p', 'div', 'section', 'article', 'main', 'li', 'ul', 'ol', 'dl', 'dt', 'dd',
+    'table', 'tr', 'pre', 'blockquote', 'br', 'hr', 'figcaption', 'address',
+}
+
+
+def _normalize(text: str) -> str:
+    # collapse runs of spaces within lines and of blank lines
+    text = re.sub(r'[ \t\r\f\v\xa0]+', ' ', text)
+    text = re.sub(r' *\n *', '\n', text)
+    return re.sub(r'\n{3,}', '\n\n', text).strip()
+
+
+def _is_boilerplate(element) -> bool:
+    return element.tag in BOILERPLATE_TAGS or element.get('role') in BOILERPLATE_ROLES
+
+
+def extract_html(content: bytes, base_url: Optional[str] = None) -> dict:
+    """
+    parse HTML once with lxml and return its title, outgoing links
+    (resolved against base_url), and the text without boilerplate, both
+    whole and split into sections at each heading
+    """
+    if not content.strip():
+        return {'title': '', 'links': [], 'sections': [], 'text': ''}
+
+    tree = lxml.html.fromstring(content)
+
+    title = tree.findtext('.//title') or ''
+    links = [
+        urljoin(base_url, href) if base_url else href
+        for href in tree.xpath('//a/@href')
+    ]
+
+    # text before the first heading goes to an untitled section
+    sections = [{'heading': '', 'level': 0, 'parts': []}]
+    # > 0 while inside an element whose content is skipped
+    skip_depth = 0
+
+    # drop comments, keeping the text around them
+    etree.strip_tags(tree, etree.Comment, etree.ProcessingInstruction)
+
+    for event, element in etree.iterwalk(tree, events=('start', 'end')):
+
+        if event == 'start':
+            if skip_depth or _is_boilerplate(element):
+                skip_depth += 1
+                continue
+            if element.tag in HEADING_TAGS:
+                # a heading starts a new section, its content is the section heading
+                sections.append({'heading': element.text_content(), 'level': int(element.tag[1]), 'parts': []})
+                skip_depth += 1
+                continue
+            if element.text:
+                sections[-1]['parts'].append(element.text)
+        else:
+            if skip_depth:
+                skip_depth -= 1
+                # the tail of a skipped element is outside of it
+                if skip_depth or not element.tail:
+                    continue
+                sections[-1]['parts'].append(element.tail)
+                continue
+            if element.tag in BLOCK_TAGS:
+                sections[-1]['parts'].append('\n')
+            if element.tail:
+                sections[-1]['parts'].append(element.tail)
+
+    sections = [
+        {
+            'heading': _normalize(section['heading']),
+            'level': section['level'],
+            'text': _normalize(''.join(section['parts'])),
+        }
+        for section in sections
+    ]
+    sections = [section for section in sections if section['heading'] or section['text']]
+
+    text = '\n\n'.join(
+        '\n'.join(part for part in (section['heading'], section['text']) if part)
+        for section in sections
+    )
+
+    return {
+        'title': _normalize(title),
+        'links': links,
+        'sections': sections,
+        'text': text,
+    }
@@ -0,0 +1,117 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable
+
+from prometheus_client import Counter, Gauge
+
+from andes.utils.config import INDEX_CACHE_MAX_BYTES
+
+
+# metrics to size the cache
+INDEX_CACHE_HITS = Counter('index_cache_hits_total', 'Index cache hits.')
+INDEX_CACHE_MISSES = Counter('index_cache_misses_total', 'Index cache misses.')
+INDEX_CACHE_EVICTIONS = Counter('index_cache_evictions_total', 'Index cache evictions.')
+INDEX_CACHE_BYTES = Gauge('index_cache_bytes', 'Approximate bytes held by the index cache.')
+
+
+class IndexCache:
+    """
+    LRU cache of loaded indexes keyed by document/webpage id.
+
+    Entries are invalidated when the mtime of the file they were loaded
+    from changes, and evicted in LRU order once the approximate size
+    (the size of the file on disk) exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (mtime, size, value)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, filepath: str, loader: Callable[[str], Any]) -> Any:
+        """
+        return the cached value for key, loading it with loader(filepath)
+        if it is missing or the file changed since it was loaded
+        """
+        mtime = os.path.getmtime(filepath)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == mtime:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                INDEX_CACHE_HITS.inc()
+                return entry[2]
+
+            # drop stale entry, the index was rebuilt
+            if entry is not None:
+                self._remove(key)
+
+            self.misses += 1
+            INDEX_CACHE_MISSES.inc()
+
+        # load outside the lock so other keys are not blocked
+        value = loader(filepath)
+        size = os.path.getsize(filepath)
+
+        with self._lock:
+            if size > self.max_bytes:
+                logging.info(f"Index {key} of {size} bytes exceeds cache budget, not caching")
+                return value
+
+            if key in self._entries:
+                self._remove(key)
+
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                evicted_key = next(iter(self._entries))
+                self._remove(evicted_key)
+                logging.info(f"Evicted index {evicted_key} from cache")
+                self.evictions += 1
+                INDEX_CACHE_EVICTIONS.inc()
+
+            self._entries[key] = (mtime, size, value)
+            self.current_bytes += size
+            INDEX_CACHE_BYTES.set(self.current_bytes)
+
+        return value
+
+    def invalidate(self, key: str):
+        """
+        drop key from the cache
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            INDEX_CACHE_BYTES.set(0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+        INDEX_CACHE_BYTES.set(self.current_bytes)
+
+
+# shared cache for all indexes loaded in this process
+INDEX_CACHE = IndexCache(INDEX_CACHE_MAX_BYTES)
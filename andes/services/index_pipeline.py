@@ -0,0 +1,285 @@
+import os
+import time
+import uuid
+import shutil
+import logging
+from bisect import bisect_right
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.vectorstores import FAISS
+from langchain.embeddings.base import Embeddings
+from langchain.docstore.document import Document as LangchainDocument
+
+from andes.utils.config import INDEX_BUILD_BATCH_SIZE, INDEX_CHECKPOINT_INTERVAL
+from andes.services import index_store
+from andes.services.chunk_store import ChunkStore, ChunkWriter
+from andes.services.embeddings import embedding_backend
+from andes.services.job_status import JobProgress
+from andes.services.serialization import json_dump, json_load
+
+
+CHUNK_SIZE = 4000
+CHUNK_OVERLAP = 50
+
+# pages are joined with this separator in the raw text
+PAGE_SEPARATOR = '\n\n'
+
+CHECKPOINT_DIRECTORY = 'checkpoint'
+CHECKPOINT_STATE_FILENAME = 'state.json'
+# float32 vectors of the checkpointed chunks, appended in chunk order
+CHECKPOINT_VECTORS_FILENAME = 'vectors.f32'
+
+
+class StreamingTextSplitter:
+    """
+    Incremental RecursiveCharacterTextSplitter: text is fed piece by
+    piece and complete chunks are returned as soon as they are known,
+    so only a few chunks worth of text are ever buffered.
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+                 buffer: str = '', offset: int = 0):
+        self.chunk_size = chunk_size
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size = chunk_size,
+            chunk_overlap  = chunk_overlap,
+            length_function = len,
+            add_start_index = True,
+        )
+        # unsplit text, and its offset in the whole text
+        self.buffer = buffer
+        self.offset = offset
+
+    def feed(self, text: str) -> List[Tuple[str, int]]:
+        """
+        add text and return the (chunk, start offset) pairs now complete
+        """
+        self.buffer += text
+        if len(self.buffer) < self.chunk_size * 4:
+            return []
+        return self._split(final=False)
+
+    def close(self) -> List[Tuple[str, int]]:
+        """
+        return the remaining chunks
+        """
+        return self._split(final=True)
+
+    def _split(self, final: bool) -> List[Tuple[str, int]]:
+        splits = self.splitter.create_documents([self.buffer])
+
+        # the last chunk may still grow with the next text, keep it buffered
+        keep = None if final or not splits else splits.pop()
+        chunks = [(split.page_content, self.offset + split.metadata['start_index']) for split in splits]
+
+        if keep is None:
+            self.offset += len(self.buffer)
+            self.buffer = ''
+        else:
+            start = keep.metadata['start_index']
+            self.offset += start
+            self.buffer = self.buffer[start:]
+        return chunks
+
+
+class IndexBuilder:
+    """
+    Build an index from a stream of pages with bounded memory:
+    pages -> incremental splitter -> embedding batches -> incremental add.
+
+    Chunks are written to a chunk store and vectors appended to a file in
+    the checkpoint directory as they are embedded, so chunk texts are
+    never kept in memory. Every few batches a checkpoint records how many
+    of them are complete, so a retried job resumes from the last
+    checkpoint instead of starting over. The split, embed and persist
+    stages are reported to progress.
+    """
+
+    def __init__(self, dirpath: str, embeddings: Embeddings, raw_text_path: str,
+                 batch_size: int = INDEX_BUILD_BATCH_SIZE,
+                 checkpoint_interval: int = INDEX_CHECKPOINT_INTERVAL,
+                 progress: Optional[JobProgress] = None):
+        self.dirpath = dirpath
+        self.checkpoint_dir = os.path.join(dirpath, CHECKPOINT_DIRECTORY)
+        self.embeddings = embeddings
+        self.raw_text_path = raw_text_path
+        self.batch_size = batch_size
+        self.checkpoint_interval = checkpoint_interval
+        self.progress = progress or JobProgress(None)
+
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+
+        # exact index of the vectors embedded so far
+        self.faiss_index = None
+        self.chunks: Optional[ChunkWriter] = None
+        self.vectors = None
+        self.pages_done = 0
+        # offset of the first character of each page in the raw text
+        self.page_offsets: List[int] = []
+        self.pending: List[Tuple[str, int]] = []
+        self.splitter = StreamingTextSplitter()
+        self._batches_since_checkpoint = 0
+        self._docstore: Optional[ChunkStore] = None
+
+    def build(self, pages: Callable[[int], Iterator[str]]) -> FAISS:
+        """
+        build the index from pages(start_page), which yields page texts
+        starting at the given page number. The chunks of the returned
+        index are read from the checkpoint directory until
+        clear_checkpoint is called, so save it first.
+        """
+        raw_text_length = self._resume()
+
+        partial_path = self.raw_text_path + '.partial'
+        with open(partial_path, 'ab') as raw_text, \
+                open(os.path.join(self.checkpoint_dir, CHECKPOINT_VECTORS_FILENAME), 'ab') as vectors:
+            raw_text.truncate(raw_text_length)
+            self.vectors = vectors
+
+            for page in pages(self.pages_done):
+                text = page if self.pages_done == 0 else PAGE_SEPARATOR + page
+                self.page_offsets.append(self.splitter.offset + len(self.splitter.buffer) + len(text) - len(page))
+                raw_text.write(text.encode('utf-8'))
+                self.pages_done += 1
+
+                for chunk in self._split(self.splitter.feed, text):
+                    self._add(chunk)
+
+                # checkpoint only between pages so the state stays consistent
+                if self._batches_since_checkpoint >= self.checkpoint_interval:
+                    raw_text.flush()
+                    self._checkpoint(raw_text.tell())
+
+            for chunk in self._split(self.splitter.close):
+                self._add(chunk)
+            self._flush()
+
+        self.chunks.close()
+        if self.faiss_index is None:
+            raise ValueError("No text could be extracted from the document")
+
+        os.replace(partial_path, self.raw_text_path)
+        logging.info(f"Built index of {self.faiss_index.ntotal} chunks from {self.pages_done} pages")
+
+        self._docstore = ChunkStore(os.path.join(self.checkpoint_dir, index_store.CHUNKS_FILENAME))
+        index_to_docstore_id = dict(enumerate(self._docstore.ids()))
+        return FAISS(self.embeddings.embed_query, self.faiss_index, self._docstore, index_to_docstore_id)
+
+    def clear_checkpoint(self):
+        if self._docstore is not None:
+            self._docstore.close()
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+    def _split(self, split: Callable, *args) -> List[Tuple[str, int]]:
+        start = time.monotonic()
+        chunks = split(*args)
+        self.progress.advance('split', len(chunks), time.monotonic() - start)
+        return chunks
+
+    def _add(self, chunk: Tuple[str, int]):
+        self.pending.append(chunk)
+        if len(self.pending) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        """
+        embed the pending chunks, add them to the index and append them
+        to the checkpoint files
+        """
+        import faiss
+        import numpy as np
+        if not self.pending:
+            return
+
+        texts = [text for text, _ in self.pending]
+        with self.progress.timed('embed', done=len(texts)):
+            vectors = np.array(self.embeddings.embed_documents(texts), dtype=np.float32)
+
+            if self.faiss_index is None:
+                self.faiss_index = faiss.IndexFlatL2(vectors.shape[1])
+            self.faiss_index.add(vectors)
+
+        self.vectors.write(vectors.tobytes())
+        self.chunks.append(
+            (str(uuid.uuid4()), LangchainDocument(
+                page_content=text,
+                metadata={'start_index': start, 'page': bisect_right(self.page_offsets, start)}
+            ))
+            for text, start in self.pending
+        )
+
+        self.pending = []
+        self._batches_since_checkpoint += 1
+
+    def _checkpoint(self, raw_text_length: int):
+        with self.progress.timed('persist'):
+            self._save_checkpoint(raw_text_length)
+
+    def _save_checkpoint(self, raw_text_length: int):
+        logging.info(f"Checkpointing index build at page {self.pages_done}")
+
+        # vectors and chunks are already on disk, the state file records
+        # how many of them the checkpoint covers
+        self.vectors.flush()
+        os.fsync(self.vectors.fileno())
+
+        state_path = os.path.join(self.checkpoint_dir, CHECKPOINT_STATE_FILENAME)
+        json_dump({
+            'pages_done': self.pages_done,
+            'page_offsets': self.page_offsets,
+            'pending': self.pending,
+            'buffer': self.splitter.buffer,
+            'offset': self.splitter.offset,
+            'raw_text_length': raw_text_length,
+            'count': self.chunks.count,
+            'dimension': self.faiss_index.d if self.faiss_index is not None else None,
+            'embeddings': embedding_backend(),
+        }, state_path + '.tmp')
+        os.replace(state_path + '.tmp', state_path)
+
+        self._batches_since_checkpoint = 0
+
+    def _resume(self) -> int:
+        """
+        restore the last checkpoint if any, dropping the vectors and chunks
+        written after it, and return the length of raw text it covers
+        """
+        import faiss
+        import numpy as np
+
+        state_path = os.path.join(self.checkpoint_dir, CHECKPOINT_STATE_FILENAME)
+        state = json_load(state_path) if os.path.exists(state_path) else None
+        if state is not None and state.get('embeddings') != embedding_backend():
+            # written by an older version, or with another embedding backend
+            logging.info(f"Discarding checkpoint of {self.dirpath}")
+            state = None
+
+        if state is None:
+            # start over, removing what an earlier attempt left behind
+            shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+            os.makedirs(self.checkpoint_dir)
+
+        self.chunks = ChunkWriter(os.path.join(self.checkpoint_dir, index_store.CHUNKS_FILENAME))
+        if state is None:
+            return 0
+
+        logging.info(f"Resuming index build from page {state['pages_done']}")
+        count = state['count']
+        self.chunks.truncate(count)
+
+        vectors_path = os.path.join(self.checkpoint_dir, CHECKPOINT_VECTORS_FILENAME)
+        if count:
+            dimension = state['dimension']
+            with open(vectors_path, 'r+b') as f:
+                f.truncate(count * dimension * 4)
+            self.faiss_index = faiss.IndexFlatL2(dimension)
+            self.faiss_index.add(np.fromfile(vectors_path, dtype=np.float32).reshape(count, dimension))
+        elif os.path.exists(vectors_path):
+            os.remove(vectors_path)
+
+        self.pages_done = state['pages_done']
+        self.page_offsets = state['page_offsets']
+        self.pending = [tuple(chunk) for chunk in state['pending']]
+        self.splitter = StreamingTextSplitter(buffer=state['buffer'], offset=state['offset'])
+        return state['raw_text_length']
@@ -0,0 +1,357 @@
+import os
+import math
+import logging
+from typing import TYPE_CHECKING, Iterator, List, Tuple
+
+from andes.utils.config import (
+    INDEX_FLAT_MAX_CHUNKS, INDEX_APPROXIMATE_TYPE, INDEX_COMPRESSION_MIN_CHUNKS,
+    INDEX_COMPRESSION, INDEX_IVF_NPROBE, INDEX_HNSW_M, INDEX_HNSW_EF_SEARCH
+)
+from andes.services.serialization import pickle_load, json_dump, json_load
+from andes.services.embeddings import embedding_backend, LEGACY_EMBEDDING_BACKEND
+
+# faiss and langchain are imported on first use, not with this module
+if TYPE_CHECKING:
+    from langchain.vectorstores import FAISS
+    from langchain.docstore.document import Document as LangchainDocument
+    from langchain.embeddings.base import Embeddings
+
+
+# on-disk layout of an index directory
+INDEX_FILENAME = 'index.faiss'
+CHUNKS_FILENAME = 'chunks.sqlite'
+PARAMS_FILENAME = 'params.json'
+LEGACY_INDEX_FILENAME = 'index.pkl'
+LEGACY_CHUNKS_FILENAME = 'chunks.json'
+
+# indexes built by langchain, checkpoints and legacy indexes are exact
+FLAT_PARAMS = {'type': 'flat', 'factory': 'Flat'}
+
+# faiss storage of the vectors for each compression
+COMPRESSION_STORAGE = {None: 'Flat', 'fp16': 'SQfp16', 'sq8': 'SQ8', 'pq': 'PQ{m}'}
+
+# vectors sampled to train IVF centroids and quantizers
+TRAINING_SAMPLE_SIZE = 100000
+
+
+def _mmap_flags(params: dict) -> int:
+    # memory-map the index so processes share pages through the OS page cache.
+    # IO_FLAG_MMAP_IFC also maps the codes of flat and HNSW indexes on faiss
+    # builds that support it, IVF indexes cannot be read with it.
+    import faiss
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    if params['type'] in ('flat', 'hnsw'):
+        flags |= getattr(faiss, 'IO_FLAG_MMAP_IFC', 0)
+    return flags
+
+
+def index_exists(dirpath: str) -> bool:
+    """
+    check if an index (native or legacy pickle) exists in dirpath
+    """
+    return (
+        os.path.exists(os.path.join(dirpath, INDEX_FILENAME)) or
+        os.path.exists(os.path.join(dirpath, LEGACY_INDEX_FILENAME))
+    )
+
+
+def index_path(dirpath: str) -> str:
+    """
+    path of the native index file in dirpath, migrating a legacy
+    pickled index or JSON chunk file first if needed
+    """
+    _migrate_legacy_index(dirpath)
+    _migrate_legacy_chunks(dirpath)
+    return os.path.join(dirpath, INDEX_FILENAME)
+
+
+def index_version(dirpath: str) -> str:
+    """
+    version of the index in dirpath, changes whenever it is rebuilt
+    """
+    return str(os.path.getmtime(index_path(dirpath)))
+
+
+def index_params(dirpath: str) -> dict:
+    """
+    type and parameters of the index in dirpath, see choose_params
+    """
+    path = os.path.join(dirpath, PARAMS_FILENAME)
+    return json_load(path) if os.path.exists(path) else dict(FLAT_PARAMS)
+
+
+def index_embedding_backend(dirpath: str) -> str:
+    """
+    embedding backend and model the index in dirpath was built with
+    """
+    return index_params(dirpath).get('embeddings', LEGACY_EMBEDDING_BACKEND)
+
+
+def check_embedding_backend(dirpath: str):
+    """
+    raise a ValueError if the index in dirpath was built with another
+    embedding backend than this deployment's, as its vectors cannot be
+    compared with the query embeddings
+    """
+    backend = index_embedding_backend(dirpath)
+    if backend != embedding_backend():
+        raise ValueError(
+            f"Index was built with {backend} embeddings but this deployment "
+            f"uses {embedding_backend()}, the index must be rebuilt"
+        )
+
+
+def choose_params(count: int, dimension: int) -> dict:
+    """
+    index type for count vectors: exact search for small indexes, where
+    it is fast enough and needs no training, then IVF or HNSW, storing
+    the vectors as float16, 8 bit scalars or product codes for the
+    largest ones
+    """
+    if count <= INDEX_FLAT_MAX_CHUNKS:
+        return dict(FLAT_PARAMS)
+
+    compression = INDEX_COMPRESSION if count >= INDEX_COMPRESSION_MIN_CHUNKS else None
+    if compression not in COMPRESSION_STORAGE:
+        raise ValueError(f"Invalid index compression: {compression}")
+    # 8 bit product codes of at most 16 dimensions each
+    m = next(m for m in range(max(1, dimension // 16), 0, -1) if dimension % m == 0)
+    storage = COMPRESSION_STORAGE[compression].format(m=m)
+
+    params = {'type': INDEX_APPROXIMATE_TYPE, 'compression': compression}
+    if INDEX_APPROXIMATE_TYPE == 'ivf':
+        nlist = int(4 * math.sqrt(count))
+        params.update(factory=f'IVF{nlist},{storage}', nlist=nlist, nprobe=min(INDEX_IVF_NPROBE, nlist))
+    elif INDEX_APPROXIMATE_TYPE == 'hnsw':
+        factory = f'HNSW{INDEX_HNSW_M}' if storage == 'Flat' else f'HNSW{INDEX_HNSW_M},{storage}'
+        params.update(factory=factory, M=INDEX_HNSW_M, efSearch=INDEX_HNSW_EF_SEARCH)
+    else:
+        raise ValueError(f"Invalid approximate index type: {INDEX_APPROXIMATE_TYPE}")
+    if compression == 'pq':
+        params['pq_m'] = m
+    return params
+
+
+def build_faiss_index(params: dict, vectors):
+    """
+    build the faiss index described by params from a float32 matrix
+    """
+    import faiss
+    import numpy as np
+
+    faiss_index = faiss.index_factory(vectors.shape[1], params['factory'])
+    if not faiss_index.is_trained:
+        sample = vectors
+        if len(vectors) > TRAINING_SAMPLE_SIZE:
+            rows = np.random.default_rng(0).choice(len(vectors), TRAINING_SAMPLE_SIZE, replace=False)
+            sample = vectors[np.sort(rows)]
+        faiss_index.train(sample)
+    faiss_index.add(vectors)
+
+    # search time parameters are saved with the index
+    for name in ('nprobe', 'efSearch'):
+        if name in params:
+            faiss.ParameterSpace().set_index_parameter(faiss_index, name, params[name])
+    return faiss_index
+
+
+def _vectors(faiss_index):
+    """
+    all vectors of the index, in order, decoded from their compressed
+    form if the index is compressed
+    """
+    import faiss
+    ivf = faiss.try_extract_index_ivf(faiss_index)
+    if ivf is not None:
+        # ids are sequential as vectors are never removed from IVF indexes
+        ivf.make_direct_map()
+    return faiss_index.reconstruct_n(0, faiss_index.ntotal)
+
+
+def optimize_index(index: 'FAISS') -> dict:
+    """
+    rebuild the index with the type chosen for its size, if it is not of
+    that type already, and return its params
+    """
+    faiss_index = index.index
+    params = choose_params(faiss_index.ntotal, faiss_index.d)
+    current = getattr(index, 'params', FLAT_PARAMS)
+    if (current['type'], current.get('compression')) == (params['type'], params.get('compression')):
+        return current
+
+    logging.info(f"Rebuilding index of {faiss_index.ntotal} chunks as {params['factory']}")
+    index.index = build_faiss_index(params, _vectors(faiss_index))
+    index.params = params
+    return params
+
+
+def save_index(index: 'FAISS', dirpath: str):
+    """
+    write a langchain FAISS index to dirpath as a native FAISS file,
+    a SQLite chunk store holding the chunk texts and metadata by vector
+    position, and a JSON file holding the index type and parameters and
+    the embedding backend it was built with
+    """
+    import faiss
+    from andes.services.chunk_store import write_chunks
+    os.makedirs(dirpath, exist_ok=True)
+
+    # write to temporary files and rename, so readers never see a partial
+    # index. the index file goes last as its mtime versions the index.
+    suffix = f'.{os.getpid()}.tmp'
+
+    chunks_path = os.path.join(dirpath, CHUNKS_FILENAME)
+    _remove(chunks_path + suffix)
+    write_chunks(chunks_path + suffix, (
+        (index.index_to_docstore_id[i], chunk) for i, chunk in iter_chunks(index)
+    ))
+    os.replace(chunks_path + suffix, chunks_path)
+
+    params_path = os.path.join(dirpath, PARAMS_FILENAME)
+    json_dump({
+        **getattr(index, 'params', FLAT_PARAMS),
+        'count': index.index.ntotal,
+        'dimension': index.index.d,
+        'embeddings': getattr(index, 'embedding_backend', None) or embedding_backend(),
+    }, params_path + suffix)
+    os.replace(params_path + suffix, params_path)
+
+    faiss_path = os.path.join(dirpath, INDEX_FILENAME)
+    faiss.write_index(index.index, faiss_path + suffix)
+    os.replace(faiss_path + suffix, faiss_path)
+
+
+def iter_chunks(index: 'FAISS') -> Iterator[Tuple[int, 'LangchainDocument']]:
+    """
+    yield (vector position, chunk) for every chunk of the index
+    """
+    from andes.services.chunk_store import ChunkStore
+    if isinstance(index.docstore, ChunkStore):
+        for i, (_, chunk) in enumerate(index.docstore):
+            yield i, chunk
+        return
+
+    for i in range(index.index.ntotal):
+        yield i, index.docstore.search(index.index_to_docstore_id[i])
+
+
+def remove_chunks(index: 'FAISS', positions: List[int]):
+    """
+    remove the vectors at the given positions, and their chunks, from the
+    index. Only exact indexes renumber the remaining vectors on removal,
+    so approximate ones are turned back into exact indexes of the kept
+    vectors; optimize_index rebuilds them before saving.
+    """
+    import faiss
+    import numpy as np
+    if not positions:
+        return
+
+    removed = set(positions)
+    if getattr(index, 'params', FLAT_PARAMS)['type'] == 'flat':
+        index.index.remove_ids(np.array(sorted(removed), dtype=np.int64))
+    else:
+        vectors = _vectors(index.index)
+        kept = np.array([i for i in range(len(vectors)) if i not in removed], dtype=np.int64)
+        flat = faiss.IndexFlatL2(index.index.d)
+        flat.add(vectors[kept])
+        index.index = flat
+        index.params = dict(FLAT_PARAMS)
+
+    # the remaining vectors are renumbered in order
+    kept_ids = []
+    for i in range(len(index.index_to_docstore_id)):
+        docstore_id = index.index_to_docstore_id[i]
+        if i in removed:
+            # InMemoryDocstore has no delete in this langchain version
+            index.docstore._dict.pop(docstore_id, None)
+        else:
+            kept_ids.append(docstore_id)
+    index.index_to_docstore_id = dict(enumerate(kept_ids))
+
+
+def load_index(dirpath: str, embeddings: 'Embeddings', mmap: bool = True) -> 'FAISS':
+    """
+    load the index in dirpath as a langchain FAISS object, with the
+    vectors memory-mapped instead of read into the heap and the chunks
+    left on disk, read only when a search returns them. Indexes that
+    will be added to must be loaded with mmap=False, which reads the
+    vectors and chunks into memory.
+
+    Indexes built with another embedding backend are rejected.
+    """
+    import faiss
+    from langchain.vectorstores import FAISS
+    from langchain.docstore.in_memory import InMemoryDocstore
+    from andes.services.chunk_store import ChunkStore
+
+    path = index_path(dirpath)
+    params = index_params(dirpath)
+    faiss_index = faiss.read_index(path, _mmap_flags(params) if mmap else 0)
+    check_embedding_backend(dirpath)
+    docstore = ChunkStore(os.path.join(dirpath, CHUNKS_FILENAME))
+
+    if mmap:
+        ids = docstore.ids()
+    else:
+        chunks = dict(docstore)
+        docstore.close()
+        ids = list(chunks)
+        docstore = InMemoryDocstore(chunks)
+    index_to_docstore_id = dict(enumerate(ids))
+
+    index = FAISS(embeddings.embed_query, faiss_index, docstore, index_to_docstore_id)
+    index.params = params
+    index.embedding_backend = index_embedding_backend(dirpath)
+    return index
+
+
+def _migrate_legacy_index(dirpath: str):
+    """
+    convert a pickled langchain index.pkl into the native format
+    """
+    legacy_path = os.path.join(dirpath, LEGACY_INDEX_FILENAME)
+    if os.path.exists(os.path.join(dirpath, INDEX_FILENAME)) or not os.path.exists(legacy_path):
+        return
+
+    logging.info(f"Migrating legacy index {legacy_path}")
+    index = pickle_load(legacy_path)
+    index.embedding_backend = LEGACY_EMBEDDING_BACKEND
+    save_index(index, dirpath)
+    _remove(legacy_path)
+
+
+def _migrate_legacy_chunks(dirpath: str):
+    """
+    convert the chunks.json of an index into a SQLite chunk store
+    """
+    from langchain.docstore.document import Document as LangchainDocument
+    from andes.services.chunk_store import write_chunks
+
+    legacy_path = os.path.join(dirpath, LEGACY_CHUNKS_FILENAME)
+    chunks_path = os.path.join(dirpath, CHUNKS_FILENAME)
+    if os.path.exists(chunks_path) or not os.path.exists(legacy_path):
+        return
+
+    logging.info(f"Migrating legacy chunks {legacy_path}")
+    try:
+        chunks = json_load(legacy_path)
+    except FileNotFoundError:
+        # migrated by another process in the meantime
+        return
+    suffix = f'.{os.getpid()}.tmp'
+    _remove(chunks_path + suffix)
+    write_chunks(chunks_path + suffix, (
+        (docstore_id, LangchainDocument(page_content=text, metadata=metadata))
+        for docstore_id, text, metadata in zip(chunks['ids'], chunks['texts'], chunks['metadatas'])
+    ))
+    os.replace(chunks_path + suffix, chunks_path)
+    _remove(legacy_path)
+
+
+def _remove(path: str):
+    # another process may have removed the same file concurrently
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+
+from andes.utils.config import JOB_STATUS_TTL, JOB_PROGRESS_INTERVAL
+from andes.services.rq import get_connection
+
+
+STATUS_KEY = 'job-status:{}'
+VERSION_KEY = 'job-status-version:{}'
+# every status write publishes {scope, version} here
+UPDATES_CHANNEL = 'job-status-updates'
+
+
+class JobProgress:
+    """
+    Status of the jobs building the index of a document or webpage
+    (scope, e.g. 'document:<id>'), kept in redis: overall status and,
+    per pipeline stage, items done and seconds spent.
+
+    Progress writes are throttled to one per JOB_PROGRESS_INTERVAL,
+    status changes and new stages are written right away. Each write
+    bumps the version of the status, which clients use as ETag. Without
+    a scope, progress is only kept in memory.
+    """
+
+    def __init__(self, scope: Optional[str], reset: bool = False):
+        self.scope = scope
+        record = None if reset or scope is None else get_status(scope)
+        self.record = {
+            'status': 'pending',
+            'job_id': None,
+            'stage': None,
+            'stages': {},
+            'error': None,
+            **(record or {}),
+        }
+        # stages restarted by this job, counted from zero
+        self._started = set()
+        self._written_at = 0.0
+
+    def queued(self, job_id: str):
+        self.record['job_id'] = job_id
+        self.set_status('queued')
+
+    def set_status(self, status: str, error: Optional[str] = None):
+        self.record['status'] = status
+        self.record['error'] = error
+        self._write()
+
+    @contextmanager
+    def run(self, finish: bool = True):
+        """
+        mark the job running, then ready when done unless finish is False
+        (e.g. a later job continues the pipeline), or failed on errors
+        """
+        from rq import get_current_job
+        job = get_current_job()
+        if job is not None:
+            self.record['job_id'] = job.id
+        self.set_status('running')
+
+        try:
+            yield self
+        except Exception as e:
+            # rq retries the job while it has retries left
+            status = 'retrying' if job is not None and job.retries_left else 'failed'
+            self.set_status(status, error=str(e))
+            raise
+
+        if finish:
+            self.record['stage'] = None
+            self.set_status('ready')
+
+    def advance(self, stage: str, done: int = 0, seconds: float = 0.0, total: Optional[int] = None):
+        """
+        add items done and seconds spent to a stage
+        """
+        new_stage = stage not in self._started
+        if new_stage:
+            self._started.add(stage)
+            self.record['stages'][stage] = {'done': 0, 'total': None, 'seconds': 0.0}
+
+        entry = self.record['stages'][stage]
+        entry['done'] += done
+        entry['seconds'] = round(entry['seconds'] + seconds, 3)
+        if total is not None:
+            entry['total'] = total
+        self.record['stage'] = stage
+
+        if new_stage or time.monotonic() - self._written_at >= JOB_PROGRESS_INTERVAL:
+            self._write()
+
+    @contextmanager
+    def timed(self, stage: str, done: int = 0, total: Optional[int] = None):
+        """
+        time the block as part of a stage, counting done items after it
+        """
+        start = time.monotonic()
+        yield
+        self.advance(stage, done, time.monotonic() - start, total)
+
+    def track(self, stage: str, items: Iterable, total: Optional[int] = None) -> Iterator:
+        """
+        yield from items, timing the production of each one as a stage
+        """
+        items = iter(items)
+        while True:
+            start = time.monotonic()
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            self.advance(stage, 1, time.monotonic() - start, total)
+            yield item
+
+    def _write(self):
+        self.record['updated_at'] = time.time()
+        if self.scope is None:
+            return
+        try:
+            connection = get_connection()
+            version = connection.incr(VERSION_KEY.format(self.scope))
+            self.record['version'] = version
+
+            pipeline = connection.pipeline()
+            pipeline.set(STATUS_KEY.format(self.scope), json.dumps(self.record), ex=JOB_STATUS_TTL)
+            pipeline.expire(VERSION_KEY.format(self.scope), JOB_STATUS_TTL)
+            pipeline.publish(UPDATES_CHANNEL, json.dumps({'scope': self.scope, 'version': version}))
+            pipeline.execute()
+        except Exception as e:
+            # progress is best effort, never fail the job over it
+            logging.warning(f"Could not write status of {self.scope}: {e}")
+        self._written_at = time.monotonic()
+
+
+def get_status(scope: str) -> Optional[dict]:
+    """
+    latest status of the scope, None if no job reported one
+    """
+    record = get_connection().get(STATUS_KEY.format(scope))
+    return json.loads(record) if record else None
+
+
+# scope -> {condition, waiters, version} of the statuses being waited on,
+# updated by the watcher thread. recreated after a fork like the thread.
+_watches = {}
+_lock = threading.Lock()
+_watcher_pid = None
+
+
+def wait_for_change(scope: str, version: int, timeout: float) -> Optional[dict]:
+    """
+    wait up to timeout seconds for the status of the scope to move past
+    version and return the latest status. Waiters are woken by a single
+    redis subscription per process, so waiting costs no redis calls.
+    """
+    _ensure_watcher()
+    deadline = time.monotonic() + timeout
+
+    with _lock:
+        watch = _watches.setdefault(scope, {
+            'condition': threading.Condition(_lock),
+            'waiters': 0,
+            'version': 0,
+        })
+        watch['waiters'] += 1
+
+    try:
+        status = get_status(scope)
+        if (status or {}).get('version', 0) != version:
+            return status
+
+        with _lock:
+            while watch['version'] <= version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                watch['condition'].wait(remaining)
+    finally:
+        with _lock:
+            watch['waiters'] -= 1
+            if not watch['waiters']:
+                _watches.pop(scope, None)
+
+    return get_status(scope)
+
+
+def _run_watcher():
+    while True:
+        try:
+            pubsub = get_connection().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(UPDATES_CHANNEL)
+            for message in pubsub.listen():
+                update = json.loads(message['data'])
+                with _lock:
+                    watch = _watches.get(update['scope'])
+                    if watch is not None:
+                        watch['version'] = max(watch['version'], update['version'])
+                        watch['condition'].notify_all()
+        except Exception as e:
+            logging.warning(f"Job status watcher disconnected: {e}")
+            time.sleep(1)
+
+
+def _ensure_watcher():
+    """
+    start the watcher thread once per process
+    """
+    global _watches, _watcher_pid
+    if _watcher_pid == os.getpid():
+        return
+
+    with _lock:
+        if _watcher_pid == os.getpid():
+            return
+
+        # forked children inherit the parent's waiters but not its thread
+        if _watcher_pid is not None:
+            _watches = {}
+
+        threading.Thread(target=_run_watcher, daemon=True).start()
+        _watcher_pid = os.getpid()
@@ -0,0 +1,63 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from langchain.embeddings.base import Embeddings
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    Sentence embeddings computed on the CPU with a sentence-transformers
+    model, without any network call.
+
+    Texts are sorted by length and grouped into batches, so each batch
+    pads to similar lengths and runs as one vectorized forward pass.
+    The batches run concurrently on a pool of threads, one core each.
+    Vectors are L2-normalized like OpenAI embeddings.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 32, threads: int = 1):
+        try:
+            import torch
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError(
+                "The local embedding backend needs sentence-transformers, "
+                "install it with `pip install sentence-transformers`"
+            )
+
+        # parallelism comes from the thread pool, torch ops stay single threaded
+        torch.set_num_threads(1)
+
+        logging.info(f"Loading local embedding model {model_name}")
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.model.eval()
+        self.batch_size = batch_size
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        # fast tokenizers are not safe to use from several threads at once
+        self._tokenizer_lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        logging.info(f"Embedding {len(texts)} texts locally in {len(batches)} batches")
+
+        vectors = [None] * len(texts)
+        results = self.executor.map(lambda batch: self._encode([texts[i] for i in batch]), batches)
+        for batch, encoded in zip(batches, results):
+            for i, vector in zip(batch, encoded):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        import torch
+
+        with self._tokenizer_lock:
+            features = self.model.tokenize(texts)
+        with torch.inference_mode():
+            embeddings = self.model(features)['sentence_embedding']
+        return torch.nn.functional.normalize(embeddings, p=2, dim=1).tolist()
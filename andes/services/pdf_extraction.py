@@ -0,0 +1,57 @@
+import logging
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+import pytesseract
+from pypdf import PdfReader
+from pdf2image import convert_from_path
+
+from andes.utils.config import PDF_EXTRACTION_WORKERS, OCR_MIN_PAGE_CHARS, OCR_DPI
+
+
+@lru_cache(maxsize=4)
+def _open_pdf(fpath: str) -> PdfReader:
+    # parse the PDF once per pool process instead of once per page
+    return PdfReader(fpath)
+
+
+def _extract_page(fpath: str, page_number: int) -> str:
+    """
+    extract the text layer of a page, falling back to OCR when the page
+    has little or no text (e.g. scanned pages)
+    """
+    text = _open_pdf(fpath).pages[page_number].extract_text() or ''
+    if len(text.strip()) >= OCR_MIN_PAGE_CHARS:
+        return text
+
+    logging.info(f"Running OCR on page {page_number + 1} of {fpath}")
+    images = convert_from_path(fpath, dpi=OCR_DPI, first_page=page_number + 1, last_page=page_number + 1)
+    return pytesseract.image_to_string(images[0])
+
+
+def pdf_page_count(fpath: str) -> int:
+    return len(_open_pdf(fpath).pages)
+
+
+def iter_pdf_pages(fpath: str, start_page: int = 0) -> Iterator[str]:
+    """
+    yield the text of each page of a PDF in order, from start_page,
+    extracting pages in parallel on a process pool. Only a bounded number
+    of pages are in flight, so consumers can start on the first pages
+    while later ones are still being OCR'd.
+    """
+    page_count = pdf_page_count(fpath)
+    max_in_flight = PDF_EXTRACTION_WORKERS * 2
+
+    with ProcessPoolExecutor(max_workers=PDF_EXTRACTION_WORKERS) as executor:
+        pending = deque()
+        next_page = start_page
+
+        while next_page < page_count or pending:
+            while next_page < page_count and len(pending) < max_in_flight:
+                pending.append(executor.submit(_extract_page, fpath, next_page))
+                next_page += 1
+
+            yield pending.popleft().result()
@@ -1,14 +1,51 @@
 import logging
-from redis import Redis
-from rq import Queue
+from collections.abc import Mapping
+from functools import lru_cache
 
 
-QUEUES = {
-    'index_gen': {},
-    'crawler': {},
-    'webpage_index_gen': {},
-}
+QUEUE_NAMES = [
+    'index_gen',
+    'crawler',
+    'webpage_index_gen',
+    'extraction',
+]
 
-for queue_name in QUEUES:
-    QUEUES[queue_name] = Queue(queue_name, connection=Redis('redis_service'))
-    logging.info(f"Starting {queue_name}")
\ No newline at end of file
+
+@lru_cache(maxsize=None)
+def get_connection():
+    """
+    redis connection shared by the queues and job statuses, created on
+    first use
+    """
+    from redis import Redis
+    return Redis('redis_service')
+
+
+class _Queues(Mapping):
+    """
+    queue name -> rq Queue, each created on first use
+    """
+
+    def __init__(self, names):
+        self._names = list(names)
+        self._queues = {}
+
+    def __getitem__(self, queue_name):
+        if queue_name not in self._names:
+            raise KeyError(queue_name)
+
+        queue = self._queues.get(queue_name)
+        if queue is None:
+            from rq import Queue
+            queue = self._queues[queue_name] = Queue(queue_name, connection=get_connection())
+            logging.info(f"Starting {queue_name}")
+        return queue
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+
+QUEUES = _Queues(QUEUE_NAMES)
@@ -0,0 +1,196 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import urljoin, urldefrag, urlsplit, urlunsplit, parse_qsl, urlencode
+from urllib.robotparser import RobotFileParser
+
+import requests
+from lxml import etree
+from requests.adapters import HTTPAdapter
+
+from andes.utils.config import (
+    CRAWL_TIMEOUT,
+    CRAWLER_USER_AGENT,
+    SITE_CRAWL_CONCURRENCY,
+    SITE_CRAWL_PER_HOST_CONCURRENCY,
+)
+from andes.services.html_extraction import extract_html
+
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """
+    resolve url against base and normalize it for deduplication:
+    no fragment, lowercase scheme and host, no default port, non-empty
+    path and sorted query. returns None for non-http(s) urls.
+    """
+    url, _ = urldefrag(urljoin(base, url) if base else url)
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    netloc = parts.hostname.lower()
+    if parts.port and parts.port != DEFAULT_PORTS[scheme]:
+        netloc = f'{netloc}:{parts.port}'
+
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+
+def _site(url: str) -> str:
+    # www.example.com and example.com are the same site
+    host = urlsplit(url).hostname or ''
+    return host[4:] if host.startswith('www.') else host
+
+
+class SiteCrawler:
+    """
+    Breadth-first crawler of the same-domain pages reachable from a seed
+    url, within depth and page limits. Pages are fetched concurrently on
+    a pooled HTTP session, with a per-host concurrency limit, robots.txt
+    rules and normalized-url deduplication. Pages that are not crawled
+    are recorded in skipped with the reason.
+    """
+
+    def __init__(
+            self,
+            seed_url: str,
+            max_depth: int,
+            max_pages: int,
+            concurrency: int = SITE_CRAWL_CONCURRENCY,
+            per_host_concurrency: int = SITE_CRAWL_PER_HOST_CONCURRENCY
+        ):
+        self.seed_url = normalize_url(seed_url)
+        if self.seed_url is None:
+            raise ValueError(f'Invalid url {seed_url}')
+
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+
+        # reuse connections across all fetches
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = CRAWLER_USER_AGENT
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.per_host_concurrency = per_host_concurrency
+        self.skipped: List[dict] = []
+        self._host_slots = {}
+        self._robots = {}
+        self._lock = threading.Lock()
+
+    def crawl(self) -> Iterator[Tuple[str, bytes, dict]]:
+        """
+        yield (url, html, extracted content) for every crawled page,
+        level by level
+        """
+        seen = {self.seed_url}
+        frontier = [self.seed_url]
+        crawled = 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for depth in range(self.max_depth + 1):
+                if not frontier:
+                    break
+
+                # do not fetch more than the remaining page budget
+                frontier = frontier[:self.max_pages - crawled]
+                next_frontier = []
+
+                for url, html, content in executor.map(self._fetch, frontier):
+                    if html is None:
+                        continue
+
+                    crawled += 1
+                    yield url, html, content
+
+                    if depth == self.max_depth:
+                        continue
+                    for link in filter(None, map(normalize_url, content['links'])):
+                        if link not in seen and _site(link) == _site(self.seed_url):
+                            seen.add(link)
+                            next_frontier.append(link)
+
+                if crawled >= self.max_pages:
+                    break
+                frontier = next_frontier
+
+        logging.info(f"Crawled {crawled} pages from {self.seed_url}")
+
+    def _fetch(self, url: str) -> Tuple[str, Optional[bytes], Optional[dict]]:
+        """
+        fetch a page, returning its HTML and extracted content
+        """
+        if not self._allowed(url):
+            return self._skip(url, 'disallowed by robots.txt')
+
+        try:
+            with self._host_slot(urlsplit(url).netloc):
+                response = self.session.get(url, timeout=CRAWL_TIMEOUT)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            return self._skip(url, f'fetch failed: {e}')
+
+        if 'html' not in response.headers.get('Content-Type', 'text/html'):
+            return self._skip(url, 'not HTML')
+
+        try:
+            content = extract_html(response.content, base_url=response.url)
+        except etree.LxmlError as e:
+            # e.g. pages with nothing but comments
+            return self._skip(url, f'unparseable HTML: {e}')
+        return url, response.content, content
+
+    def _skip(self, url: str, reason: str) -> Tuple[str, None, None]:
+        logging.info(f"Skipping {url}: {reason}")
+        with self._lock:
+            self.skipped.append({'url': url, 'reason': reason})
+        return url, None, None
+
+    def _host_slot(self, netloc: str) -> threading.BoundedSemaphore:
+        """
+        semaphore limiting the concurrent fetches of a host, created once
+        per host
+        """
+        with self._lock:
+            slot = self._host_slots.get(netloc)
+            if slot is None:
+                slot = self._host_slots[netloc] = threading.BoundedSemaphore(self.per_host_concurrency)
+            return slot
+
+    def _allowed(self, url: str) -> bool:
+        """
+        check robots.txt of the url's host, fetched once per host
+        """
+        parts = urlsplit(url)
+        host = f'{parts.scheme}://{parts.netloc}'
+
+        with self._lock:
+            robots = self._robots.get(host)
+
+        if robots is None:
+            robots = RobotFileParser()
+            try:
+                response = self.session.get(f'{host}/robots.txt', timeout=CRAWL_TIMEOUT)
+            except requests.RequestException as e:
+                logging.warning(f"Failed to fetch robots.txt of {host}: {e}")
+                response = None
+
+            # a missing robots.txt allows everything, while an unreadable
+            # one (unauthorized, forbidden, server error) disallows everything
+            if response is not None and response.ok:
+                robots.parse(response.text.splitlines())
+            elif response is not None and response.status_code == 404:
+                robots.allow_all = True
+            else:
+                robots.disallow_all = True
+            with self._lock:
+                self._robots[host] = robots
+
+        return robots.can_fetch(CRAWLER_USER_AGENT, url)
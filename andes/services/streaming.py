@@ -0,0 +1,54 @@
+import queue
+import threading
+from typing import Any, Iterator
+
+from langchain.chains.base import Chain
+from langchain.callbacks.base import BaseCallbackHandler
+
+
+# marks the end of the token stream
+_DONE = object()
+
+
+class _QueueCallbackHandler(BaseCallbackHandler):
+    """
+    push LLM tokens into a queue as they are generated
+    """
+
+    def __init__(self, tokens: queue.Queue):
+        self.tokens = tokens
+
+    def on_llm_new_token(self, token: str, **kwargs: Any):
+        self.tokens.put(token)
+
+
+def stream_chain(chain: Chain, message: str) -> Iterator[str]:
+    """
+    run the chain in a background thread and yield LLM tokens as they
+    are generated. The generator returns the chain's final answer.
+    The chain's LLM must be created with streaming=True.
+    """
+    tokens = queue.Queue()
+    result = {}
+
+    def run():
+        try:
+            result['answer'] = chain.run(message, callbacks=[_QueueCallbackHandler(tokens)])
+        except Exception as e:
+            result['error'] = e
+        finally:
+            tokens.put(_DONE)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+
+    while True:
+        token = tokens.get()
+        if token is _DONE:
+            break
+        yield token
+
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result['answer']
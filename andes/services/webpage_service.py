@@ -1,39 +1,53 @@
 import os
+import uuid
+import shutil
 import logging
-import requests
-from rq import Retry
-from bs4 import BeautifulSoup
-
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.llms import OpenAI
-from langchain.vectorstores import FAISS
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from langchain.embeddings.openai import OpenAIEmbeddings
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple
 
+from andes import database as db
 from andes.models import WebPage, WebPageChatHistory
-from andes.utils.config import UPLOAD_DIRECTORY
-from andes.services.serialization import pickle_dump, pickle_load
+from andes.utils.config import (
+    UPLOAD_DIRECTORY,
+    CRAWL_TIMEOUT,
+    SITE_CRAWL_MAX_DEPTH,
+    SITE_CRAWL_MAX_PAGES,
+)
 from andes.services.rq import QUEUES
-from andes.prompts import FIN_QA_PROMPT
+from andes.services.serialization import json_dump, json_load
+from andes.services.index_cache import INDEX_CACHE
+from andes.services import index_store
+from andes.services.embeddings import get_embeddings
+from andes.services.answer_cache import ANSWER_CACHE
+from andes.services.batch_chat import answer_batch
+from andes.services.job_status import JobProgress, get_status, wait_for_change
+from andes.prompts import fin_qa_prompt
 
+# langchain, crawling and HTML parsing modules are imported where they
+# are used, so serving metadata routes does not load them
+if TYPE_CHECKING:
+    from langchain.chains import RetrievalQA
+    from langchain.vectorstores import FAISS
 
-QA_PROMPT = PromptTemplate(
-    template=FIN_QA_PROMPT, 
-    input_variables=["context", 'question'],
-    template_format='jinja2'
-)
 
+# crawled pages of a site and the manifest of their urls
+SITE_PAGES_DIRECTORY = 'pages'
+SITE_MANIFEST_FILENAME = 'pages.json'
 
-def create_webpage(url: str):
+
+def create_webpage(url: str, crawl_config: Optional[dict] = None):
     """
-    create WebPage sqlalchemy model object
+    create WebPage sqlalchemy model object. A crawl_config with
+    mode 'site' crawls the whole site from url instead of a single page.
     """
-    page = WebPage(url=url)
+    page = WebPage(url=url, info={'crawl': crawl_config} if crawl_config else {})
     page.save()
     return page
 
 
+def _is_site(page: WebPage) -> bool:
+    return ((page.info or {}).get('crawl') or {}).get('mode') == 'site'
+
+
 def get_webpage(id: str):
     """
     get WebPage sqlalchemy model object
@@ -42,51 +56,251 @@ def get_webpage(id: str):
     return page
 
 
-def crawl(page: WebPage):
+def _content_path(html_path: str) -> str:
     """
-    crawl webpage and save HTML to a file
+    path of the content extracted from the HTML file at html_path
     """
-    logging.info(f"Crawling WebPage {page}")
+    return os.path.splitext(html_path)[0] + '.json'
 
-    # crawl webpage using python libraries
-    response = requests.get(page.url)
 
-    # get webpage title
-    soup = BeautifulSoup(response.content, 'html.parser')
-    
-    # extract the title
-    title = soup.title.string
+def _save_html(html_path: str, html: bytes, content: dict):
+    """
+    save raw HTML and, alongside it, its title, sections and clean text
+    """
+    with open(html_path, 'wb') as f:
+        f.write(html)
+    json_dump(
+        {key: content[key] for key in ('title', 'sections', 'text')},
+        _content_path(html_path)
+    )
+
 
-    # add title to page and save
-    page.title = title
+def _fetch(page: WebPage, conditional: bool = False) -> bool:
+    """
+    fetch the webpage and save its HTML, title and cache validators.
+    With conditional, the stored validators are sent and False is
+    returned if the page has not been modified.
+    """
+    headers = {}
+    validators = (page.info or {}).get('http', {})
+    if conditional and validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if conditional and validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+
+    # crawl webpage using python libraries
+    import requests
+    from lxml import etree
+    from andes.services.html_extraction import extract_html
+
+    response = requests.get(page.url, headers=headers, timeout=CRAWL_TIMEOUT)
+    if response.status_code == 304:
+        return False
+    response.raise_for_status()
+
+    # extract the title and clean text in a single parse
+    try:
+        content = extract_html(response.content, base_url=response.url)
+    except etree.LxmlError as e:
+        # e.g. pages with nothing but comments, as the site crawler skips
+        raise ValueError(f"Could not parse the HTML of {page.url}: {e}")
+
+    # add title and validators to page and save
+    page.title = content['title']
+    page.info = {
+        **(page.info or {}),
+        'http': {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+    }
     page.save()
     
-    # save raw HTML to a file
+    # save raw HTML and the extracted content to files
     filepath = os.path.join(UPLOAD_DIRECTORY, page.id, 'raw.html')
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    with open(filepath, 'wb') as f:
-        f.write(response.content)
+    _save_html(filepath, response.content, content)
+
+    return True
+
+
+def _crawl_site(page: WebPage, progress: JobProgress):
+    """
+    crawl the same-domain pages reachable from the webpage url and save
+    their HTML, along with a manifest of the crawled urls. Skipped pages
+    are recorded in the crawl info of the webpage.
+    """
+    from andes.services.site_crawler import SiteCrawler
+
+    config = page.info['crawl']
+    crawler = SiteCrawler(
+        page.url,
+        max_depth=config.get('max_depth', SITE_CRAWL_MAX_DEPTH),
+        max_pages=config.get('max_pages', SITE_CRAWL_MAX_PAGES)
+    )
+
+    dirpath = os.path.join(UPLOAD_DIRECTORY, page.id)
+    pages_dir = os.path.join(dirpath, SITE_PAGES_DIRECTORY)
+    shutil.rmtree(pages_dir, ignore_errors=True)
+    os.makedirs(pages_dir)
+
+    manifest = []
+    pages = progress.track('crawl', crawler.crawl(), total=crawler.max_pages)
+    for i, (url, html, content) in enumerate(pages):
+        filename = f'{i}.html'
+        _save_html(os.path.join(pages_dir, filename), html, content)
+        manifest.append({'url': url, 'file': filename})
+
+        # the seed page gives the title and the raw HTML
+        if i == 0:
+            page.title = content['title']
+            page.save()
+            _save_html(os.path.join(dirpath, 'raw.html'), html, content)
+
+    # pages that were found but not crawled, with the reason
+    page.info = {**page.info, 'crawl': {**config, 'skipped': crawler.skipped}}
+    page.save()
+
+    if not manifest:
+        raise ValueError(f"Could not crawl any page from {page.url}")
+
+    json_dump(manifest, os.path.join(dirpath, SITE_MANIFEST_FILENAME))
+
+
+def _enqueue(queue_name: str, func, page: WebPage, progress: Optional[JobProgress] = None) -> str:
+    """
+    enqueue a job on the webpage id, after marking the webpage status
+    queued. With progress, the job continues the pipeline it reports.
+    """
+    from rq import Retry
+
+    job_id = str(uuid.uuid4())
+    (progress or JobProgress(f'webpage:{page.id}', reset=True)).queued(job_id)
+    QUEUES[queue_name].enqueue(func, page.id, job_id=job_id, retry=Retry(max=3))
+    return job_id
+
+
+def _job_webpage(page_id: str) -> WebPage:
+    page = get_webpage(page_id)
+    if not page:
+        raise ValueError(f"Invalid webpage id: {page_id}")
+    return page
+
+
+def crawl(page: WebPage, progress: Optional[JobProgress] = None):
+    """
+    crawl webpage and save HTML to a file
+    """
+    logging.info(f"Crawling WebPage {page}")
+    progress = progress or JobProgress(None)
+    if _is_site(page):
+        _crawl_site(page, progress)
+    else:
+        with progress.timed('crawl', done=1, total=1):
+            _fetch(page)
 
     # enqueue the create index task
-    QUEUES['webpage_index_gen'].enqueue(create_index, page, retry=Retry(max=3))
+    _enqueue('webpage_index_gen', index_job, page, progress)
+
+
+def crawl_job(page_id: str):
+    """
+    run crawl inside an RQ worker, recording the job status
+    """
+    page = _job_webpage(page_id)
+    progress = JobProgress(f'webpage:{page.id}')
+    # the index job enqueued by the crawl finishes the pipeline
+    with progress.run(finish=False):
+        crawl(page, progress)
 
 
 def enqueue_crawl(page: WebPage):
     # enqueue the crawl task
-    QUEUES['crawler'].enqueue(crawl, page, retry=Retry(max=3))
+    _enqueue('crawler', crawl_job, page)
     logging.info(f"Enqueued crawl task for {page}")
 
 
+def refresh(page: WebPage, progress: Optional[JobProgress] = None) -> bool:
+    """
+    re-crawl the webpage if it changed, then update its index. returns
+    whether an index update was enqueued.
+    """
+    logging.info(f"Refreshing WebPage {page}")
+    progress = progress or JobProgress(None)
+    if _is_site(page):
+        # sites are re-crawled fully, the index update skips unchanged chunks
+        _crawl_site(page, progress)
+    else:
+        with progress.timed('crawl', done=1, total=1):
+            modified = _fetch(page, conditional=True)
+        if not modified:
+            logging.info(f"WebPage {page} not modified")
+            return False
+
+    # enqueue the update index task
+    _enqueue('webpage_index_gen', update_index_job, page, progress)
+    return True
+
+
+def refresh_job(page_id: str):
+    """
+    run refresh inside an RQ worker, recording the job status
+    """
+    page = _job_webpage(page_id)
+    progress = JobProgress(f'webpage:{page.id}')
+    with progress.run(finish=False):
+        if not refresh(page, progress):
+            progress.set_status('ready')
+
+
+def enqueue_refresh(page: WebPage):
+    # enqueue the refresh task
+    _enqueue('crawler', refresh_job, page)
+    logging.info(f"Enqueued refresh task for {page}")
+
+
+def enqueue_refresh_all():
+    """
+    enqueue a refresh of every tracked webpage, e.g. from a periodic job
+    """
+    for page in WebPage.query.all():
+        enqueue_refresh(page)
+
+
+def get_index_status(page: WebPage, since_version: Optional[int] = None, wait: float = 0) -> Optional[dict]:
+    """
+    status of the crawl and index jobs of the webpage. With
+    since_version, wait up to wait seconds for a status newer than that
+    version.
+    None if no job status was recorded and there is no index.
+    """
+    scope = f'webpage:{page.id}'
+    if since_version is not None and wait > 0:
+        status = wait_for_change(scope, since_version, wait)
+    else:
+        status = get_status(scope)
+
+    if status is None and index_store.index_exists(os.path.join(UPLOAD_DIRECTORY, page.id)):
+        # indexed before statuses were recorded, or the status expired
+        status = {'status': 'ready', 'version': 0}
+    return status
+
+
 def _split_webpage(filepath: str, chunk_size=4000, chunk_overlap=50) -> list[str]:
     """
-    read raw HTML from file and split into chunks
+    read the text extracted from the raw HTML file and split into chunks
     """
-    with open(filepath, 'rb') as f:
-        raw_webpage_html = f.read()
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from andes.services.html_extraction import extract_html
+
+    content_path = _content_path(filepath)
+    if not os.path.exists(content_path):
+        # pages crawled before text was extracted at crawl time
+        with open(filepath, 'rb') as f:
+            raw_webpage_html = f.read()
+        _save_html(filepath, raw_webpage_html, extract_html(raw_webpage_html))
 
-    # read raw HTML into string
-    soup = BeautifulSoup(raw_webpage_html, 'html.parser')
-    page_text = soup.get_text()
+    page_text = json_load(content_path)['text']
 
     # split text into chunks
     text_splitter = RecursiveCharacterTextSplitter(
@@ -101,58 +315,199 @@ def _split_webpage(filepath: str, chunk_size=4000, chunk_overlap=50) -> list[str
     return texts
 
 
-def create_index(page: WebPage):
+def _webpage_chunks(page: WebPage) -> Tuple[List[str], List[dict]]:
+    """
+    chunks of the webpage, or of every crawled page of a site, with the
+    url they come from as metadata
+    """
+    dirpath = os.path.join(UPLOAD_DIRECTORY, page.id)
+    if not _is_site(page):
+        texts = _split_webpage(os.path.join(dirpath, 'raw.html'))
+        return texts, [{'source': page.url} for _ in texts]
+
+    texts, metadatas = [], []
+    for entry in json_load(os.path.join(dirpath, SITE_MANIFEST_FILENAME)):
+        page_texts = _split_webpage(os.path.join(dirpath, SITE_PAGES_DIRECTORY, entry['file']))
+        texts.extend(page_texts)
+        metadatas.extend({'source': entry['url']} for _ in page_texts)
+    return texts, metadatas
+
+
+def create_index(page: WebPage, progress: Optional[JobProgress] = None):
     """
     create a langchain index for the webpage
     """
-    logging.info(f"Started creating index for {page}")
+    from langchain.vectorstores import FAISS
 
-    filepath = os.path.join(UPLOAD_DIRECTORY, page.id, 'raw.html')
-    page_splits = _split_webpage(filepath)
+    logging.info(f"Started creating index for {page}")
+    progress = progress or JobProgress(None)
+    with progress.timed('split'):
+        page_splits, metadatas = _webpage_chunks(page)
 
     # create a langchain index for each chunk
     logging.info(f"Building index for {page}")
-    embeddings = OpenAIEmbeddings()
-    index = FAISS.from_texts(page_splits, embeddings)
+    embeddings = get_embeddings()
+    with progress.timed('embed', done=len(page_splits), total=len(page_splits)):
+        index = FAISS.from_texts(page_splits, embeddings, metadatas)
+
+    # pick the index type for the number of chunks
+    with progress.timed('optimize'):
+        index_store.optimize_index(index)
 
     # save the index to disk
-    index_path = os.path.join(UPLOAD_DIRECTORY, page.id, 'index.pkl')
-    pickle_dump(index, index_path)
+    with progress.timed('persist'):
+        index_store.save_index(index, os.path.join(UPLOAD_DIRECTORY, page.id))
 
 
-def enqueue_index_gen(page: WebPage):
+def update_index(page: WebPage, progress: Optional[JobProgress] = None):
     """
-    enqueue the index generation task into a redis queue
+    update the webpage index in place: chunks are diffed by content hash
+    against the stored ones, only added chunks are embedded and removed
+    chunks are deleted
     """
-    QUEUES['index_gen'].enqueue(create_index, page, retry=Retry(max=3))
-    logging.info(f"Enqueued index generation for {page.filename}")
+    dirpath = os.path.join(UPLOAD_DIRECTORY, page.id)
+    if not index_store.index_exists(dirpath):
+        return create_index(page, progress)
+
+    # vectors of another embedding backend cannot be reused
+    try:
+        index_store.check_embedding_backend(dirpath)
+    except ValueError as e:
+        logging.info(f"Rebuilding index for {page}: {e}")
+        return create_index(page, progress)
+
+    from andes.services.embedding_cache import text_hash
+
+    logging.info(f"Started updating index for {page}")
+    progress = progress or JobProgress(None)
+    with progress.timed('split'):
+        page_splits, metadatas = _webpage_chunks(page)
+    embeddings = get_embeddings()
+    index = index_store.load_index(dirpath, embeddings, mmap=False)
+
+    # positions of the stored chunks by content hash
+    stored = {}
+    for position, chunk in index_store.iter_chunks(index):
+        stored.setdefault(text_hash(chunk.page_content), []).append(position)
+
+    # match new chunks to stored ones, counting repeated chunks
+    added, added_metadatas = [], []
+    for text, metadata in zip(page_splits, metadatas):
+        positions = stored.get(text_hash(text))
+        if positions:
+            positions.pop(0)
+        else:
+            added.append(text)
+            added_metadatas.append(metadata)
+    removed = [position for positions in stored.values() for position in positions]
+
+    if not added and not removed:
+        logging.info(f"Index for {page} is up to date")
+        return
+
+    logging.info(f"Updating index for {page}: {len(added)} chunks added, {len(removed)} removed")
+    index_store.remove_chunks(index, removed)
+    if added:
+        with progress.timed('embed', done=len(added), total=len(added)):
+            index.add_embeddings(list(zip(added, embeddings.embed_documents(added))), added_metadatas)
+
+    # the index may have changed size class, or been made exact by removals
+    with progress.timed('optimize'):
+        index_store.optimize_index(index)
 
+    # save the index to disk
+    with progress.timed('persist'):
+        index_store.save_index(index, dirpath)
 
-def chat(page: WebPage, message: str) -> str:
-    # query openai on the langchain index
 
-    # sanity checks
-    if not os.path.exists(os.path.join(UPLOAD_DIRECTORY, page.id, 'index.pkl')):
-        raise ValueError("Index does not exist for this webpage")
-    
-    assert message is not None, "Message cannot be empty"
+def index_job(page_id: str):
+    """
+    run create_index inside an RQ worker, recording the job status
+    """
+    page = _job_webpage(page_id)
+    progress = JobProgress(f'webpage:{page.id}')
+    with progress.run():
+        create_index(page, progress)
 
-    # load the index from disk
-    index_path = os.path.join(UPLOAD_DIRECTORY, page.id, 'index.pkl')
-    index = pickle_load(index_path)
 
-    # create a chain
-    qa = RetrievalQA.from_chain_type(
-        OpenAI(temperature=0), 
+def update_index_job(page_id: str):
+    """
+    run update_index inside an RQ worker, recording the job status
+    """
+    page = _job_webpage(page_id)
+    progress = JobProgress(f'webpage:{page.id}')
+    with progress.run():
+        update_index(page, progress)
+
+
+def enqueue_index_gen(page: WebPage):
+    """
+    enqueue the index generation task into a redis queue
+    """
+    _enqueue('webpage_index_gen', index_job, page)
+    logging.info(f"Enqueued index generation for {page}")
+
+
+def _load_qa_chain(index_path: str) -> 'RetrievalQA':
+    """
+    load the index from disk and create a QA chain on top of it
+    """
+    from langchain.llms import OpenAI
+    from langchain.chains import RetrievalQA
+    from andes.services.context_packer import packed_retriever
+
+    index = index_store.load_index(os.path.dirname(index_path), get_embeddings())
+    # streaming lets chat_stream forward tokens, plain runs are unaffected
+    llm = OpenAI(temperature=0, streaming=True)
+    return RetrievalQA.from_chain_type(
+        llm, 
         chain_type="stuff", 
-        retriever=index.as_retriever(),
+        # the retrieved chunks are packed into the prompt's token budget
+        retriever=packed_retriever(index, llm),
         chain_type_kwargs={
-            "prompt": QA_PROMPT
+            "prompt": fin_qa_prompt()
         }
     )
 
-    # query GPT
-    response = qa.run(message)
+
+def _get_qa_chain(page: WebPage) -> 'RetrievalQA':
+    """
+    get the QA chain for the webpage, reusing it if already in memory
+    """
+    # sanity checks
+    if not index_store.index_exists(os.path.join(UPLOAD_DIRECTORY, page.id)):
+        raise ValueError("Index does not exist for this webpage")
+
+    index_path = index_store.index_path(os.path.join(UPLOAD_DIRECTORY, page.id))
+    return INDEX_CACHE.get(f'webpage:{page.id}', index_path, _load_qa_chain)
+
+
+def get_index(page_id: str) -> 'FAISS':
+    """
+    the loaded index of the webpage, shared with its QA chain through
+    the index cache
+    """
+    dirpath = os.path.join(UPLOAD_DIRECTORY, page_id)
+    if not index_store.index_exists(dirpath):
+        raise ValueError("Index does not exist for this webpage")
+
+    index_path = index_store.index_path(dirpath)
+    return INDEX_CACHE.get(f'webpage:{page_id}', index_path, _load_qa_chain).retriever.vectorstore
+
+
+def chat(page: WebPage, message: str) -> str:
+    # query openai on the langchain index
+    qa = _get_qa_chain(page)
+    assert message is not None, "Message cannot be empty"
+
+    # reuse the answer of a repeated question on the same index
+    version = index_store.index_version(os.path.join(UPLOAD_DIRECTORY, page.id))
+    response = ANSWER_CACHE.get(f'webpage:{page.id}', version, message)
+
+    if response is None:
+        # query GPT
+        response = qa.run(message)
+        ANSWER_CACHE.set(f'webpage:{page.id}', version, message, response)
 
     # save the chat history
     WebPageChatHistory(
@@ -162,3 +517,51 @@ def chat(page: WebPage, message: str) -> str:
     ).save()
 
     return response
+
+
+def chat_stream(page: WebPage, message: str) -> Iterator[str]:
+    """
+    like chat, but yield the answer tokens as they are generated.
+    The chat history is saved once the answer is complete.
+    """
+    from andes.services.streaming import stream_chain
+
+    qa = _get_qa_chain(page)
+    assert message is not None, "Message cannot be empty"
+
+    # reuse the answer of a repeated question on the same index
+    version = index_store.index_version(os.path.join(UPLOAD_DIRECTORY, page.id))
+    response = ANSWER_CACHE.get(f'webpage:{page.id}', version, message)
+
+    if response is None:
+        # query GPT
+        response = yield from stream_chain(qa, message)
+        ANSWER_CACHE.set(f'webpage:{page.id}', version, message, response)
+    else:
+        yield response
+
+    # save the chat history
+    WebPageChatHistory(
+        webpage_id = page.id,
+        question = message,
+        answer = response
+    ).save()
+
+
+def chat_batch(page: WebPage, questions: List[str]) -> List[str]:
+    """
+    answer several questions on the webpage at once, in order, loading
+    its index once. The chat history rows are inserted together.
+    """
+    qa = _get_qa_chain(page)
+    version = index_store.index_version(os.path.join(UPLOAD_DIRECTORY, page.id))
+    answers = answer_batch(qa, f'webpage:{page.id}', version, questions)
+
+    # save the chat history
+    db.session.add_all([
+        WebPageChatHistory(webpage_id=page.id, question=question, answer=answer)
+        for question, answer in zip(questions, answers)
+    ])
+    db.session.commit()
+
+    return answers
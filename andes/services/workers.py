@@ -0,0 +1,217 @@
+import os
+import time
+import signal
+import logging
+import importlib
+import multiprocessing
+from typing import Dict, Optional
+
+from prometheus_client import Counter, start_http_server
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from rq import SimpleWorker, Worker
+from rq.job import Job
+from rq.queue import Queue
+from rq.worker import WorkerStatus
+
+from andes.utils.config import (
+    WORKER_PROCESSES,
+    WORKER_MAX_JOBS,
+    WORKER_MAX_MEMORY_MB,
+    WORKER_METRICS_PORT,
+)
+from andes.services.rq import QUEUES, get_connection
+
+
+# imported once by the supervisor, so forked workers share them. the
+# services import most of these lazily, on first use.
+PRELOAD_MODULES = [
+    'numpy',
+    'faiss',
+    'openai',
+    'tiktoken',
+    'boto3',
+    'requests',
+    'PIL.Image',
+    'pytesseract',
+    'pdf2image',
+    'pypdf',
+    'lxml.html',
+    'langchain.llms',
+    'langchain.chains',
+    'langchain.prompts',
+    'langchain.vectorstores',
+    'langchain.text_splitter',
+    'andes.services.document_service',
+    'andes.services.webpage_service',
+    'andes.services.index_pipeline',
+    'andes.services.pdf_extraction',
+    'andes.services.extraction',
+    'andes.services.embedding_executor',
+    'andes.services.embedding_cache',
+    'andes.services.streaming',
+    'andes.services.site_crawler',
+    'andes.services.html_extraction',
+]
+
+WORKER_RESTARTS = Counter('rq_worker_restarts_total', 'Worker processes restarted.', ['queue', 'reason'])
+
+
+def parse_worker_processes(spec: str) -> Dict[str, int]:
+    """
+    parse "queue=count,..." into {queue: count}
+    """
+    processes = {}
+    for entry in filter(None, (entry.strip() for entry in spec.split(','))):
+        queue_name, _, count = entry.partition('=')
+        if queue_name not in QUEUES:
+            raise ValueError(f"Unknown queue {queue_name}")
+        processes[queue_name] = int(count or 1)
+    return processes
+
+
+def _rss_bytes() -> int:
+    # current resident memory, from /proc where available
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RecyclingWorker(SimpleWorker):
+    """
+    Worker running jobs in its own process, so imports and in-process
+    caches are reused across jobs. It stops after a job that leaves it
+    above max_memory bytes; the supervisor then starts a fresh one.
+    """
+
+    def __init__(self, *args, max_memory: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_memory = max_memory
+
+    def execute_job(self, job: Job, queue: Queue):
+        super().execute_job(job, queue)
+
+        rss = _rss_bytes()
+        if rss > self.max_memory:
+            self.log.info('Worker %s: using %d MB, recycling', self.key, rss // (1024 * 1024))
+            self._stop_requested = True
+
+
+def _run_worker(queue_name: str, max_jobs: int, max_memory: int):
+    """
+    entry point of a forked worker process
+    """
+    # default signal handling, rq installs its own warm shutdown handlers
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    from andes import app
+    with app.app_context():
+        worker = RecyclingWorker([QUEUES[queue_name]], connection=get_connection(), max_memory=max_memory)
+        worker.work(max_jobs=max_jobs)
+
+
+class QueueCollector:
+    """
+    prometheus collector of queue depths and worker utilization, read
+    from redis at scrape time
+    """
+
+    def collect(self):
+        depth = GaugeMetricFamily('rq_queue_depth', 'Jobs waiting in the queue.', labels=['queue'])
+        started = GaugeMetricFamily('rq_queue_started_jobs', 'Jobs running from the queue.', labels=['queue'])
+        failed = GaugeMetricFamily('rq_queue_failed_jobs', 'Failed jobs of the queue.', labels=['queue'])
+        workers = GaugeMetricFamily('rq_workers', 'Workers of the queue.', labels=['queue'])
+        utilization = GaugeMetricFamily('rq_worker_utilization', 'Fraction of busy workers of the queue.', labels=['queue'])
+
+        for queue_name, queue in QUEUES.items():
+            depth.add_metric([queue_name], queue.count)
+            started.add_metric([queue_name], queue.started_job_registry.count)
+            failed.add_metric([queue_name], queue.failed_job_registry.count)
+
+            queue_workers = Worker.all(queue=queue)
+            busy = sum(worker.get_state() == WorkerStatus.BUSY for worker in queue_workers)
+            workers.add_metric([queue_name], len(queue_workers))
+            utilization.add_metric([queue_name], busy / len(queue_workers) if queue_workers else 0)
+
+        return [depth, started, failed, workers, utilization]
+
+
+def preload():
+    """
+    import heavy modules and load data every job needs before forking
+    """
+    start = time.monotonic()
+    for module in PRELOAD_MODULES:
+        importlib.import_module(module)
+
+    import tiktoken
+    tiktoken.get_encoding('cl100k_base')
+
+    # workers open their own database connections
+    from andes import app, database
+    with app.app_context():
+        database.engine.dispose()
+
+    logging.info(f"Preloaded modules in {time.monotonic() - start:.1f}s")
+
+
+def supervise(
+        processes: Optional[Dict[str, int]] = None,
+        max_jobs: int = WORKER_MAX_JOBS,
+        max_memory: int = WORKER_MAX_MEMORY_MB * 1024 * 1024,
+        metrics_port: int = WORKER_METRICS_PORT
+    ):
+    """
+    run and keep alive the configured number of worker processes per
+    queue, forked from this preloaded process, until SIGINT or SIGTERM
+    """
+    processes = processes or parse_worker_processes(WORKER_PROCESSES)
+    preload()
+
+    REGISTRY.register(QueueCollector())
+    start_http_server(metrics_port)
+
+    context = multiprocessing.get_context('fork')
+    running = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    logging.info(f"Starting workers {processes}")
+    while not stopping:
+        for queue_name, count in processes.items():
+            for slot in range(count):
+                process = running.get((queue_name, slot))
+                if process is not None and process.is_alive():
+                    continue
+
+                if process is not None:
+                    # workers exit cleanly when recycled
+                    reason = 'recycled' if process.exitcode == 0 else 'crashed'
+                    logging.info(f"Worker {process.pid} of {queue_name} exited ({reason}), restarting")
+                    WORKER_RESTARTS.labels(queue=queue_name, reason=reason).inc()
+
+                process = context.Process(
+                    target=_run_worker,
+                    args=(queue_name, max_jobs, max_memory),
+                    name=f'worker-{queue_name}-{slot}'
+                )
+                process.start()
+                running[(queue_name, slot)] = process
+        time.sleep(1)
+
+    # warm shutdown: workers finish their current job
+    logging.info("Stopping workers")
+    for process in running.values():
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGTERM)
+    for process in running.values():
+        process.join()
@@ -6,4 +6,124 @@ load_dotenv()
 
 UPLOAD_DIRECTORY = os.getenv('UPLOAD_DIRECTORY')
 DB_PATH = os.getenv('DB_PATH')
-SERVER_URL = os.getenv('SERVER_URL', 'http://localhost:8000')
\ No newline at end of file
+SERVER_URL = os.getenv('SERVER_URL', 'http://localhost:8000')
+
+# maximum approximate bytes of loaded indexes kept in memory per process
+INDEX_CACHE_MAX_BYTES = int(os.getenv('INDEX_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+
+# embedding backend of this deployment: 'openai' (EMBEDDING_MODEL) or 'local'
+# (LOCAL_EMBEDDING_MODEL run on the CPU in batches of LOCAL_EMBEDDING_BATCH_SIZE
+# by LOCAL_EMBEDDING_THREADS threads). Indexes are tied to the backend that
+# built them.
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'openai')
+LOCAL_EMBEDDING_MODEL = os.getenv('LOCAL_EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv('LOCAL_EMBEDDING_BATCH_SIZE', 32))
+LOCAL_EMBEDDING_THREADS = int(os.getenv('LOCAL_EMBEDDING_THREADS', os.cpu_count() or 1))
+
+# persistent embedding cache shared by documents and webpages
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-ada-002')
+EMBEDDING_CACHE_PATH = os.getenv(
+    'EMBEDDING_CACHE_PATH',
+    os.path.join(UPLOAD_DIRECTORY or '.', 'embedding_cache.sqlite')
+)
+
+# batched, concurrent embedding requests and the provider budgets they respect
+EMBEDDING_API_BASE = os.getenv('EMBEDDING_API_BASE')
+EMBEDDING_PARALLELISM = int(os.getenv('EMBEDDING_PARALLELISM', 4))
+EMBEDDING_BATCH_TOKENS = int(os.getenv('EMBEDDING_BATCH_TOKENS', 8000))
+EMBEDDING_REQUESTS_PER_MINUTE = int(os.getenv('EMBEDDING_REQUESTS_PER_MINUTE', 3000))
+EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv('EMBEDDING_TOKENS_PER_MINUTE', 1000000))
+
+# per-page PDF extraction; pages with less text than this are OCR'd
+PDF_EXTRACTION_WORKERS = int(os.getenv('PDF_EXTRACTION_WORKERS', os.cpu_count() or 1))
+OCR_MIN_PAGE_CHARS = int(os.getenv('OCR_MIN_PAGE_CHARS', 20))
+OCR_DPI = int(os.getenv('OCR_DPI', 300))
+
+# answer cache for repeated questions; a similarity threshold > 0 also
+# reuses answers for questions whose embeddings are that close
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 10000))
+ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', 24 * 60 * 60))
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv('ANSWER_CACHE_SIMILARITY_THRESHOLD', 0))
+
+# chunked extraction over token windows
+EXTRACTION_MODEL = os.getenv('EXTRACTION_MODEL', 'gpt-4')
+EXTRACTION_WINDOW_TOKENS = int(os.getenv('EXTRACTION_WINDOW_TOKENS', 6000))
+EXTRACTION_WINDOW_OVERLAP = int(os.getenv('EXTRACTION_WINDOW_OVERLAP', 200))
+EXTRACTION_PARALLELISM = int(os.getenv('EXTRACTION_PARALLELISM', 4))
+
+# extraction results cached by (document content hash, config hash)
+EXTRACTION_CACHE_DIRECTORY = os.getenv(
+    'EXTRACTION_CACHE_DIRECTORY',
+    os.path.join(UPLOAD_DIRECTORY or '.', 'extraction_cache')
+)
+# seconds finished extraction jobs are kept for polling
+EXTRACTION_JOB_RESULT_TTL = int(os.getenv('EXTRACTION_JOB_RESULT_TTL', 24 * 60 * 60))
+
+# slack notifications are buffered and sent in batches by a background thread
+SLACK_BUFFER_SIZE = int(os.getenv('SLACK_BUFFER_SIZE', 1000))
+SLACK_FLUSH_INTERVAL = float(os.getenv('SLACK_FLUSH_INTERVAL', 5))
+
+# API key verification cache, valid and invalid keys are cached separately
+AUTH_CACHE_VALID_TTL = int(os.getenv('AUTH_CACHE_VALID_TTL', 300))
+AUTH_CACHE_INVALID_TTL = int(os.getenv('AUTH_CACHE_INVALID_TTL', 60))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_CACHE_MAX_ENTRIES', 10000))
+# point at a local DynamoDB (e.g. dynamodb-local) for tests
+DYNAMODB_ENDPOINT_URL = os.getenv('DYNAMODB_ENDPOINT_URL')
+
+# streaming index builds: chunks embedded per batch, and how many batches
+# are added to the index between checkpoints
+INDEX_BUILD_BATCH_SIZE = int(os.getenv('INDEX_BUILD_BATCH_SIZE', 256))
+INDEX_CHECKPOINT_INTERVAL = int(os.getenv('INDEX_CHECKPOINT_INTERVAL', 4))
+# seconds an index build holds the lock of its content, documents with
+# the same content wait for it and reuse the index
+INDEX_BUILD_LOCK_TIMEOUT = int(os.getenv('INDEX_BUILD_LOCK_TIMEOUT', 60 * 60))
+
+# seconds before a webpage fetch times out
+CRAWL_TIMEOUT = float(os.getenv('CRAWL_TIMEOUT', 30))
+
+# multi-page site crawls
+CRAWLER_USER_AGENT = os.getenv('CRAWLER_USER_AGENT', 'AndesBot/1.0')
+SITE_CRAWL_MAX_DEPTH = int(os.getenv('SITE_CRAWL_MAX_DEPTH', 2))
+SITE_CRAWL_MAX_PAGES = int(os.getenv('SITE_CRAWL_MAX_PAGES', 100))
+SITE_CRAWL_CONCURRENCY = int(os.getenv('SITE_CRAWL_CONCURRENCY', 8))
+SITE_CRAWL_PER_HOST_CONCURRENCY = int(os.getenv('SITE_CRAWL_PER_HOST_CONCURRENCY', 4))
+
+# index job status and progress kept in redis; running jobs write their
+# progress at most once per interval
+JOB_STATUS_TTL = int(os.getenv('JOB_STATUS_TTL', 7 * 24 * 60 * 60))
+JOB_PROGRESS_INTERVAL = float(os.getenv('JOB_PROGRESS_INTERVAL', 1))
+
+# worker supervisor: worker processes per queue ("queue=count,..."), and
+# workers are recycled after this many jobs or above this resident memory
+WORKER_PROCESSES = os.getenv('WORKER_PROCESSES', 'index_gen=1,crawler=4,webpage_index_gen=1,extraction=2')
+WORKER_MAX_JOBS = int(os.getenv('WORKER_MAX_JOBS', 100))
+WORKER_MAX_MEMORY_MB = int(os.getenv('WORKER_MAX_MEMORY_MB', 2048))
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', 9100))
+
+# batch chat: maximum questions per request, and completions run at once
+CHAT_BATCH_MAX_QUESTIONS = int(os.getenv('CHAT_BATCH_MAX_QUESTIONS', 100))
+CHAT_BATCH_CONCURRENCY = int(os.getenv('CHAT_BATCH_CONCURRENCY', 8))
+
+# corpus queries across document and webpage indexes: shards searched at
+# once, chunks passed to the LLM, and maximum shards per query
+CORPUS_SEARCH_CONCURRENCY = int(os.getenv('CORPUS_SEARCH_CONCURRENCY', 16))
+CORPUS_TOP_K = int(os.getenv('CORPUS_TOP_K', 4))
+CORPUS_MAX_SHARDS = int(os.getenv('CORPUS_MAX_SHARDS', 500))
+
+# index type by chunk count: exact search up to INDEX_FLAT_MAX_CHUNKS, then
+# an approximate index (ivf or hnsw), compressed (fp16, sq8 or pq) from
+# INDEX_COMPRESSION_MIN_CHUNKS. nprobe and efSearch trade recall for speed.
+INDEX_FLAT_MAX_CHUNKS = int(os.getenv('INDEX_FLAT_MAX_CHUNKS', 20000))
+INDEX_APPROXIMATE_TYPE = os.getenv('INDEX_APPROXIMATE_TYPE', 'ivf')
+INDEX_COMPRESSION_MIN_CHUNKS = int(os.getenv('INDEX_COMPRESSION_MIN_CHUNKS', 200000))
+INDEX_COMPRESSION = os.getenv('INDEX_COMPRESSION', 'fp16')
+INDEX_IVF_NPROBE = int(os.getenv('INDEX_IVF_NPROBE', 16))
+INDEX_HNSW_M = int(os.getenv('INDEX_HNSW_M', 32))
+INDEX_HNSW_EF_SEARCH = int(os.getenv('INDEX_HNSW_EF_SEARCH', 64))
+
+# chat context packing: chunks retrieved per question, packed in relevance
+# order into at most CONTEXT_MAX_TOKENS tokens (less if the model context
+# window is smaller), dropping trimmed chunks shorter than the minimum
+CONTEXT_FETCH_K = int(os.getenv('CONTEXT_FETCH_K', 8))
+CONTEXT_MAX_TOKENS = int(os.getenv('CONTEXT_MAX_TOKENS', 2000))
+CONTEXT_MIN_CHUNK_TOKENS = int(os.getenv('CONTEXT_MIN_CHUNK_TOKENS', 64))
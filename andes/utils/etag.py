@@ -0,0 +1,43 @@
+import json
+import math
+import hashlib
+from typing import Optional
+
+from flask import request, jsonify
+
+
+def etag_version() -> Optional[int]:
+    """
+    status version encoded in the request's If-None-Match ETag, i.e. the
+    version of the status the client already has
+    """
+    for etag in request.if_none_match.as_set():
+        version, _, _ = etag.partition('-')
+        if version.isdigit():
+            return int(version)
+    return None
+
+
+def conditional_response(payload: dict, version: int):
+    """
+    JSON response with an ETag made of the status version and a digest
+    of the payload, or 304 Not Modified if the client already has it
+    """
+    digest = hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    response = jsonify(payload)
+    response.set_etag(f'{version}-{digest[:16]}')
+    return response.make_conditional(request)
+
+
+def wait_seconds(maximum: float) -> Optional[float]:
+    """
+    seconds the request's `wait` argument asks to long-poll, capped at
+    maximum. None if it is not a non-negative number
+    """
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        return None
+    if math.isnan(wait) or wait < 0:
+        return None
+    return min(wait, maximum)
@@ -1,30 +1,144 @@
 import os
+import time
+import queue
+import atexit
+import threading
+from functools import lru_cache
 from typing import Any, Dict
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
 
-# Initialize a Web API client
+from andes.utils.config import SLACK_BUFFER_SIZE, SLACK_FLUSH_INTERVAL
+
 slack_token = os.getenv('SLACK_BOT_TOKEN')
-client = WebClient(token=slack_token)
+
+# slack rejects messages longer than this
+MAX_MESSAGE_LENGTH = 40000
+
+# channel told about dropped messages when nothing else is being sent
+DROPPED_NOTICE_CHANNEL = '#api-notifs'
+
+# bounded buffer of (channel, message) drained by the sender thread.
+# both are recreated after a fork, as threads do not survive it.
+_buffer = queue.Queue(maxsize=SLACK_BUFFER_SIZE)
+_sender_pid = None
+_dropped = 0
+_lock = threading.Lock()
 
 
 def send_message(
-        message: Any, 
+        message: Any,
         channel: str
     ):
+    """
+    queue a message to be sent to slack by the background sender.
+    Never blocks: when the buffer is full the message is dropped.
+    """
+    global _dropped
     assert message, 'Message cannot be empty'
 
     # if its a dict, convert to string
     if isinstance(message, dict):
         message = f'```{message}```'
 
+    _ensure_sender()
+
     try:
-        client.chat_postMessage(
-            channel=channel,  
-            text=message
+        _buffer.put_nowait((channel, message))
+    except queue.Full:
+        with _lock:
+            _dropped += 1
+
+
+def flush():
+    """
+    send all buffered messages, coalesced into one message per channel
+    """
+    global _dropped
+
+    messages: Dict[str, list] = {}
+    while True:
+        try:
+            channel, message = _buffer.get_nowait()
+        except queue.Empty:
+            break
+        messages.setdefault(channel, []).append(message)
+
+    with _lock:
+        dropped, _dropped = _dropped, 0
+
+    if dropped:
+        channel = next(iter(messages), DROPPED_NOTICE_CHANNEL)
+        messages.setdefault(channel, []).append(f'_{dropped} notifications dropped, buffer was full_')
+
+    for channel, texts in messages.items():
+        for text in _pack(texts):
+            _post(channel, text)
+
+
+def _pack(texts: list) -> list:
+    """
+    join texts into as few messages as fit slack's length limit
+    """
+    packed, current = [], ''
+    for text in texts:
+        text = text[:MAX_MESSAGE_LENGTH]
+        if current and len(current) + len(text) + 1 > MAX_MESSAGE_LENGTH:
+            packed.append(current)
+            current = ''
+        current = f'{current}\n{text}' if current else text
+    if current:
+        packed.append(current)
+    return packed
+
+
+@lru_cache(maxsize=None)
+def _client():
+    # Initialize a Web API client, from the sender thread on first send
+    from slack_sdk import WebClient
+    return WebClient(token=slack_token)
+
+
+def _post(channel: str, text: str):
+    from slack_sdk.errors import SlackApiError
+    try:
+        _client().chat_postMessage(
+            channel=channel,
+            text=text
         )
     except SlackApiError as e:
         # You will get a SlackApiError if "ok" is False
         assert e.response["ok"] is False
         assert e.response["error"]  # str like 'invalid_auth', 'channel_not_found'
-        print(f"Got an error: {e.response['error']}")
\ No newline at end of file
+        print(f"Got an error: {e.response['error']}")
+    except Exception as e:
+        print(f"Failed to send slack message: {e}")
+
+
+def _run_sender():
+    while True:
+        time.sleep(SLACK_FLUSH_INTERVAL)
+        flush()
+
+
+def _ensure_sender():
+    """
+    start the sender thread once per process
+    """
+    global _buffer, _sender_pid, _dropped
+    if _sender_pid == os.getpid():
+        return
+
+    with _lock:
+        if _sender_pid == os.getpid():
+            return
+
+        # forked children inherit the parent's buffer but not its thread
+        if _sender_pid is not None:
+            _buffer = queue.Queue(maxsize=SLACK_BUFFER_SIZE)
+            _dropped = 0
+
+        threading.Thread(target=_run_sender, daemon=True).start()
+        _sender_pid = os.getpid()
+
+
+# send what is left when the process exits
+atexit.register(flush)
@@ -0,0 +1,48 @@
+import json
+import logging
+from typing import Any, Callable, Iterator
+from flask import Response, stream_with_context
+
+
+def sse_event(data: Any, event: str = None) -> str:
+    """
+    format data as a Server-Sent Event
+    """
+    message = f'data: {json.dumps(data)}\n\n'
+    if event:
+        message = f'event: {event}\n' + message
+    return message
+
+
+def sse_response(tokens: Iterator[str], on_complete: Callable[[str], None] = None) -> Response:
+    """
+    stream tokens to the client as SSE 'token' events, followed by a
+    'done' event holding the full answer. on_complete is called with
+    the full answer once the stream is finished.
+    """
+    def generate():
+        answer = []
+        try:
+            for token in tokens:
+                answer.append(token)
+                yield sse_event({'token': token}, event='token')
+        except Exception as e:
+            logging.exception('Streaming response failed')
+            yield sse_event({'error': str(e)}, event='error')
+            return
+
+        answer = ''.join(answer)
+        yield sse_event({'answer': answer}, event='done')
+
+        if on_complete:
+            on_complete(answer)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # disable proxy buffering so tokens are flushed immediately
+            'X-Accel-Buffering': 'no'
+        }
+    )
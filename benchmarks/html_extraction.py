@@ -0,0 +1,66 @@
+"""
+compare the previous BeautifulSoup text extraction with extract_html on
+the HTML fixtures, e.g.
+
+    python benchmarks/html_extraction.py --repeat 200
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# importing andes creates the app, which needs a database
+os.environ.setdefault('DB_PATH', 'sqlite://')
+
+from andes.services.html_extraction import extract_html
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'html')
+
+
+def extract_bs4(content: bytes) -> dict:
+    # what crawling and indexing used to do: one parse for the title at
+    # crawl time, another for the text at index time
+    title = BeautifulSoup(content, 'html.parser').title
+    text = BeautifulSoup(content, 'html.parser').get_text()
+    return {'title': title.string if title else '', 'text': text}
+
+
+def run(extractor, pages, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for content in pages.values():
+            extractor(content)
+    return (time.perf_counter() - start) / (repeat * len(pages))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--fixtures', default=FIXTURES)
+    args = parser.parse_args()
+
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(args.fixtures, '*.html'))):
+        with open(path, 'rb') as f:
+            pages[os.path.basename(path)] = f.read()
+    if not pages:
+        sys.exit(f'No fixtures found in {args.fixtures}')
+
+    print(f"{'page':<32}{'bs4 chars':>12}{'lxml chars':>12}")
+    for name, content in pages.items():
+        print(f"{name:<32}{len(extract_bs4(content)['text']):>12}{len(extract_html(content)['text']):>12}")
+
+    bs4_time = run(extract_bs4, pages, args.repeat)
+    lxml_time = run(extract_html, pages, args.repeat)
+    print()
+    print(f"bs4 html.parser: {bs4_time * 1000:.3f} ms/page")
+    print(f"extract_html:    {lxml_time * 1000:.3f} ms/page ({bs4_time / lxml_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+measure the cold import time of the API with python -X importtime and
+check it against a budget, e.g.
+
+    python benchmarks/import_time.py --budget-ms 1500
+
+exits with an error if the import takes longer than the budget, or if
+any of the modules that must only be loaded on first use are imported
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# cold import budget of the andes package, in milliseconds
+IMPORT_BUDGET_MS = 1500
+
+# heavy dependencies and clients the API must not import at startup
+LAZY_MODULES = [
+    'langchain', 'faiss', 'openai', 'tiktoken', 'numpy',
+    'PIL', 'pytesseract', 'pdf2image', 'pypdf', 'lxml', 'bs4',
+    'boto3', 'botocore', 'slack_sdk', 'redis', 'rq',
+]
+
+
+def import_times(module: str) -> dict:
+    """
+    import module in a fresh interpreter and return the cumulative
+    import time of every module it loaded, in microseconds
+    """
+    env = {
+        **os.environ,
+        # importing andes creates the app, which needs a database
+        'DB_PATH': os.environ.get('DB_PATH', 'sqlite://'),
+    }
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f'Could not import {module}:\n{result.stderr}')
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', default='andes')
+    parser.add_argument('--budget-ms', type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    # the fastest run is the least noisy
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    times = min(runs, key=lambda run: run[args.module])
+    total_ms = times[args.module] / 1000
+
+    print(f"{'module':<48}{'cumulative ms':>14}")
+    for name, cumulative in sorted(times.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<48}{cumulative / 1000:>14.1f}")
+    print()
+    print(f"import {args.module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    errors = []
+    if total_ms > args.budget_ms:
+        errors.append(f"import of {args.module} is over budget")
+    loaded = sorted({name.split('.')[0] for name in times} & set(LAZY_MODULES))
+    if loaded:
+        errors.append(f"modules that must load lazily were imported: {', '.join(loaded)}")
+
+    if errors:
+        sys.exit('\n'.join(errors))
+
+
+if __name__ == '__main__':
+    main()
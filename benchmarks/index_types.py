@@ -0,0 +1,95 @@
+"""
+compare recall, search latency, build time and memory of the index types
+chosen by index_store on synthetic embeddings, e.g.
+
+    python benchmarks/index_types.py --count 100000 --dimension 1536
+
+recall is the share of the exact k nearest neighbours an index returns
+"""
+import os
+import sys
+import time
+import argparse
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# importing andes creates the app, which needs a database
+os.environ.setdefault('DB_PATH', 'sqlite://')
+
+from andes.services.index_store import build_faiss_index, choose_params
+
+
+def embeddings(count: int, dimension: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    unit vectors around a few hundred topics, closer to real chunk
+    embeddings than uniform noise
+    """
+    topics = rng.standard_normal((max(1, count // 200), dimension), dtype=np.float32)
+    vectors = topics[rng.integers(len(topics), size=count)]
+    vectors += 0.5 * rng.standard_normal((count, dimension), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def benchmark(params: dict, vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    start = time.perf_counter()
+    index = build_faiss_index(params, vectors)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    # one query at a time, as in chat
+    results = np.vstack([index.search(query[None], k)[1] for query in queries])
+    latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    recall = np.mean([len(set(found) & set(exact)) / k for found, exact in zip(results, truth)])
+    return {
+        'build s': build_seconds,
+        'query ms': latency_ms,
+        f'recall@{k}': recall,
+        'MB': faiss.serialize_index(index).nbytes / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--dimension', type=int, default=1536)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = embeddings(args.count, args.dimension, rng)
+    queries = embeddings(args.queries, args.dimension, rng)
+
+    exact = faiss.IndexFlatL2(args.dimension)
+    exact.add(vectors)
+    truth = exact.search(queries, args.k)[1]
+
+    # every index type index_store can choose, at this size
+    nlist = choose_params(args.count, args.dimension).get('nlist') or int(4 * np.sqrt(args.count))
+    m = next(m for m in range(max(1, args.dimension // 16), 0, -1) if args.dimension % m == 0)
+    candidates = {'flat': {'factory': 'Flat'}}
+    for name, storage in [('', 'Flat'), (' fp16', 'SQfp16'), (' sq8', 'SQ8'), (' pq', f'PQ{m}')]:
+        candidates[f'ivf{name}'] = {'factory': f'IVF{nlist},{storage}', 'nprobe': 16}
+        candidates[f'hnsw{name}'] = {
+            'factory': 'HNSW32' if storage == 'Flat' else f'HNSW32,{storage}',
+            'efSearch': 64,
+        }
+
+    chosen = choose_params(args.count, args.dimension)['factory']
+    print(f"{args.count} vectors of {args.dimension} dimensions, index_store chooses {chosen}")
+    print()
+
+    columns = None
+    for name, params in candidates.items():
+        result = benchmark(params, vectors, queries, truth, args.k)
+        if columns is None:
+            columns = list(result)
+            print(f"{'index':<12}{'factory':<24}" + ''.join(f'{column:>12}' for column in columns))
+        print(f"{name:<12}{params['factory']:<24}" + ''.join(f'{result[column]:>12.3f}' for column in columns))
+
+
+if __name__ == '__main__':
+    main()
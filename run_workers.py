@@ -1,9 +1,4 @@
-from redis import Redis
-from rq import Worker
-from andes import app
-from andes.services.rq import QUEUES
+from andes.services.workers import supervise
 
-with app.app_context():
-    queue_names = list(QUEUES.keys())
-    worker = Worker(queue_names, connection=Redis(host='redis_service'))
-    worker.work()
+if __name__ == '__main__':
+    supervise()
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+# configuration is read when andes is imported
+os.environ.setdefault('DB_PATH', 'sqlite://')
+os.environ.setdefault('UPLOAD_DIRECTORY', tempfile.mkdtemp(prefix='andes-test-'))
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'test')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'test')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class WordEncoding:
+    """
+    tiktoken stand-in counting one token per space separated word, so
+    tests do not download encodings
+    """
+
+    def encode(self, text: str) -> list:
+        return text.split(' ') if text else []
+
+    def decode(self, tokens: list) -> str:
+        return ' '.join(tokens)
+
+
+class FakeServer:
+    """
+    local HTTP server answering requests with handle(method, path, body),
+    which returns (status, headers, body). Requests are recorded.
+    """
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                server.requests.append((self.command, self.path, body))
+                status, headers, content = server.handle(self.command, self.path, body)
+                if isinstance(content, (dict, list)):
+                    content = json.dumps(content).encode()
+                    headers = {'Content-Type': 'application/json', **headers}
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = _respond
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def fake_server():
+    servers = []
+
+    def start(handle) -> FakeServer:
+        server = FakeServer(handle)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture
+def app():
+    from andes import app, database
+    with app.app_context():
+        yield app
+        database.session.remove()
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    # every bearer token is accepted
+    from andes.services.auth import auth
+    monkeypatch.setattr(auth, 'verify_token_callback', lambda api_key: True)
+    return app.test_client()
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    # queues and job statuses use an in-process fake redis
+    import fakeredis
+    from andes.services import rq, job_status, auth, document_service
+    connection = fakeredis.FakeStrictRedis()
+    for module in (rq, job_status, auth, document_service):
+        monkeypatch.setattr(module, 'get_connection', lambda: connection)
+    monkeypatch.setattr(rq.QUEUES, '_queues', {})
+    return connection
+
+
+@pytest.fixture
+def document(app):
+    from andes.models.document import Document
+    doc = Document(filename='report.pdf')
+    doc.save()
+    yield doc
+    doc.delete()
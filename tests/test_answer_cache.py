@@ -0,0 +1,74 @@
+import time
+
+from andes.services.answer_cache import AnswerCache, normalize_question
+
+
+def _embed(question):
+    # one dimension per topic word
+    return [float(word in question) + 0.01 for word in ('revenue', 'margin', 'buyback')]
+
+
+def test_normalize_question():
+    assert normalize_question('  What was   Revenue?! ') == 'what was revenue'
+
+
+def test_exact_hits_and_misses():
+    cache = AnswerCache(max_entries=10, ttl=60)
+    assert cache.get('document:1', 'v1', 'What was revenue?') is None
+
+    cache.set('document:1', 'v1', 'What was revenue?', '4.1 billion')
+    assert cache.get('document:1', 'v1', 'what was revenue') == '4.1 billion'
+    # answers are scoped
+    assert cache.get('document:2', 'v1', 'what was revenue') is None
+    assert cache.get('document:1', 'v1', 'what was the margin') is None
+
+
+def test_new_index_version_drops_answers():
+    cache = AnswerCache(max_entries=10, ttl=60)
+    cache.set('document:1', 'v1', 'what was revenue', '4.1 billion')
+    cache.set('document:2', 'v1', 'what was revenue', '2 billion')
+
+    assert cache.get('document:1', 'v2', 'what was revenue') is None
+    # the old version is gone even if it is asked for again
+    assert cache.get('document:1', 'v1', 'what was revenue') is None
+    assert cache.get('document:2', 'v1', 'what was revenue') == '2 billion'
+
+
+def test_answers_expire():
+    cache = AnswerCache(max_entries=10, ttl=0.05)
+    cache.set('document:1', 'v1', 'what was revenue', '4.1 billion')
+    time.sleep(0.1)
+    assert cache.get('document:1', 'v1', 'what was revenue') is None
+
+
+def test_invalidate():
+    cache = AnswerCache(max_entries=10, ttl=60)
+    cache.set('document:1', 'v1', 'what was revenue', '4.1 billion')
+    cache.invalidate('document:1')
+    assert cache.peek('document:1', 'v1', 'what was revenue') is None
+
+
+def test_semantic_hits_above_threshold():
+    calls = []
+    cache = AnswerCache(max_entries=10, ttl=60, similarity_threshold=0.9,
+                        embed_query=lambda question: calls.append(question) or _embed(question))
+    assert cache.semantic
+
+    cache.set('document:1', 'v1', 'what was revenue', '4.1 billion')
+    cache.set('document:1', 'v1', 'what was the margin', '18 percent')
+
+    assert cache.get('document:1', 'v1', 'how much revenue was there') == '4.1 billion'
+    assert cache.get('document:1', 'v1', 'was there a buyback') is None
+    assert cache.get('document:2', 'v1', 'how much revenue was there') is None
+
+    # a given vector is used instead of embedding the question
+    calls.clear()
+    assert cache.get('document:1', 'v1', 'anything', vector=_embed('margin')) == '18 percent'
+    assert calls == []
+
+
+def test_semantic_lookup_is_off_without_threshold():
+    cache = AnswerCache(max_entries=10, ttl=60, embed_query=_embed)
+    assert not cache.semantic
+    cache.set('document:1', 'v1', 'what was revenue', '4.1 billion')
+    assert cache.get('document:1', 'v1', 'how much revenue was there') is None
@@ -0,0 +1,54 @@
+import pytest
+
+
+@pytest.fixture
+def api_keys(monkeypatch, redis):
+    """
+    ANDES_API_KEYS table in a moto DynamoDB stand-in, holding the key 'valid'
+    """
+    from moto import mock_aws
+    from andes.services import auth
+    from andes.utils.cache import TTLCache
+
+    with mock_aws():
+        auth._dynamodb.cache_clear()
+        client = auth._dynamodb()
+        client.create_table(
+            TableName='ANDES_API_KEYS',
+            KeySchema=[{'AttributeName': 'api_key', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'api_key', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        client.put_item(TableName='ANDES_API_KEYS', Item={'api_key': {'S': 'valid'}})
+        monkeypatch.setattr(auth, '_verified_keys', TTLCache(100, 300))
+        yield client
+    auth._dynamodb.cache_clear()
+
+
+def test_keys_are_verified_against_dynamodb(api_keys):
+    from andes.services import auth
+    assert auth.verify_token('valid')
+    assert not auth.verify_token('unknown')
+    assert not auth.verify_token('')
+
+
+def test_revoked_keys_are_rejected_by_every_process(api_keys, monkeypatch):
+    from andes.services import auth
+
+    assert auth.verify_token('valid')
+    # a verification another process cached before the revocation
+    cached = auth._verified_keys
+    monkeypatch.setattr(auth, '_verified_keys', auth.TTLCache(100, 300))
+    auth.revoke_api_key('valid')
+    monkeypatch.setattr(auth, '_verified_keys', cached)
+
+    assert cached.get(auth._key_hash('valid')) is True
+    assert not auth.verify_token('valid')
+    assert 'Item' not in api_keys.get_item(TableName='ANDES_API_KEYS', Key={'api_key': {'S': 'valid'}})
+
+
+def test_revoke_command(app, api_keys):
+    from andes.services import auth
+    result = app.test_cli_runner().invoke(args=['revoke-api-key', 'valid'])
+    assert result.exit_code == 0
+    assert not auth.verify_token('valid')
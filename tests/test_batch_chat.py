@@ -0,0 +1,133 @@
+from typing import Any, List
+
+import pytest
+from langchain.llms.base import LLM
+
+from conftest import WordEncoding
+
+TEXTS = [
+    'Revenue grew 12 percent to 4.1 billion dollars.',
+    'Operating margin fell to 18 percent on higher costs.',
+    'The board approved a 2 billion dollar buyback.',
+    'Headcount was flat at 12000 employees.',
+]
+
+
+class EchoLLM(LLM):
+    """
+    answers with the prompt it was given, so answers show the context
+    """
+    prompts: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return 'echo'
+
+    def _call(self, prompt: str, stop: Any = None, run_manager: Any = None, **kwargs: Any) -> str:
+        self.prompts.append(prompt)
+        return prompt
+
+
+class CountingEmbeddings:
+    """
+    bag of letters embeddings, counting the embedding calls
+    """
+
+    def __init__(self):
+        self.query_calls = 0
+        self.batch_calls = 0
+
+    def _embed(self, text):
+        text = text.lower()
+        return [float(text.count(letter)) + 0.1 for letter in 'abcdefghijklmnopqrstuvwxyz']
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        self.query_calls += 1
+        return self._embed(text)
+
+    def embed_queries(self, texts):
+        self.batch_calls += 1
+        return [self._embed(text) for text in texts]
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    from andes.services import batch_chat
+    embeddings = CountingEmbeddings()
+    monkeypatch.setattr(batch_chat, 'get_embeddings', lambda: embeddings)
+    return embeddings
+
+
+@pytest.fixture
+def qa(embeddings, monkeypatch):
+    from langchain.chains import RetrievalQA
+    from langchain.vectorstores import FAISS
+    from andes.prompts import fin_qa_prompt
+    from andes.services import context_packer
+
+    monkeypatch.setattr(context_packer, '_encoding', lambda model_name: WordEncoding())
+    index = FAISS.from_texts(TEXTS, embeddings)
+    retriever = context_packer.PackedRetriever(vectorstore=index, search_kwargs={'k': 2}, window=1000, model_name='model')
+    return RetrievalQA.from_chain_type(
+        EchoLLM(prompts=[]), chain_type='stuff', retriever=retriever,
+        chain_type_kwargs={'prompt': fin_qa_prompt()}
+    )
+
+
+@pytest.fixture
+def answer_cache(monkeypatch, embeddings):
+    from andes.services import batch_chat
+    from andes.services.answer_cache import AnswerCache
+    cache = AnswerCache(100, 300, similarity_threshold=0.999, embed_query=embeddings.embed_query)
+    monkeypatch.setattr(batch_chat, 'ANSWER_CACHE', cache)
+    return cache
+
+
+QUESTIONS = ['What was revenue?', 'How many employees?', 'what was revenue', 'Was there a buyback?']
+
+
+def test_batch_answers_match_single_questions(qa, answer_cache):
+    from andes.services.batch_chat import answer_batch
+    questions = [QUESTIONS[0], QUESTIONS[1], QUESTIONS[3]]
+    single = [qa.run(question) for question in questions]
+    assert answer_batch(qa, 'document:a', 'v1', questions) == single
+
+
+def test_repeated_questions_share_an_answer(qa, answer_cache):
+    from andes.services.batch_chat import answer_batch
+    answers = answer_batch(qa, 'document:a', 'v1', QUESTIONS)
+    assert answers[2] == answers[0]
+
+
+def test_questions_are_embedded_in_one_batch(qa, answer_cache, embeddings):
+    from andes.services.batch_chat import answer_batch
+    answer_batch(qa, 'document:a', 'v1', QUESTIONS)
+    # the semantic cache lookups reuse the batch vectors
+    assert (embeddings.batch_calls, embeddings.query_calls) == (1, 0)
+    # 'what was revenue' is answered once
+    assert len(qa.combine_documents_chain.llm_chain.llm.prompts) == 3
+
+
+def test_cached_answers_are_reused(qa, answer_cache, embeddings):
+    from andes.services.batch_chat import answer_batch
+    llm = qa.combine_documents_chain.llm_chain.llm
+
+    first = answer_batch(qa, 'document:a', 'v1', QUESTIONS)
+    prompts = len(llm.prompts)
+
+    # all cached: nothing is embedded or completed
+    assert answer_batch(qa, 'document:a', 'v1', list(reversed(QUESTIONS))) == list(reversed(first))
+    assert len(llm.prompts) == prompts
+    assert embeddings.batch_calls == 1
+
+    # a new question misses, the others hit
+    answers = answer_batch(qa, 'document:a', 'v1', ['Was margin lower?', 'What was revenue?'])
+    assert answers[1] == first[0]
+    assert len(llm.prompts) == prompts + 1
+
+    # a rebuilt index drops the cached answers
+    answer_batch(qa, 'document:a', 'v2', ['What was revenue?'])
+    assert len(llm.prompts) == prompts + 2
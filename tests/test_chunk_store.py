@@ -0,0 +1,72 @@
+import os
+
+import pytest
+from langchain.docstore.document import Document as LangchainDocument
+
+
+def _chunks(numbers):
+    return [(f'id-{i}', LangchainDocument(page_content=f'chunk {i}', metadata={'page': i})) for i in numbers]
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    from andes.services.chunk_store import write_chunks
+    path = str(tmp_path / 'chunks.sqlite')
+    write_chunks(path, _chunks(range(5)))
+    return path
+
+
+def test_chunks_are_read_by_position_and_id(store_path, monkeypatch):
+    from andes.services import chunk_store
+    monkeypatch.setattr(chunk_store, 'LOOKUP_BATCH_SIZE', 2)
+    store = chunk_store.ChunkStore(store_path)
+
+    assert store.ids() == [f'id-{i}' for i in range(5)]
+    assert [chunk.page_content for chunk in store.get([4, 0, 2, 0])] == ['chunk 4', 'chunk 0', 'chunk 2', 'chunk 0']
+    assert store.search('id-3') == LangchainDocument(page_content='chunk 3', metadata={'page': 3})
+    assert store.search('id-9') == 'ID id-9 not found.'
+    # iterated in batches, in position order
+    assert list(store) == _chunks(range(5))
+    store.close()
+
+
+def test_writer_appends_after_existing_chunks_and_truncates(store_path):
+    from andes.services.chunk_store import ChunkStore, ChunkWriter
+    writer = ChunkWriter(store_path)
+    assert writer.count == 5
+    writer.truncate(3)
+    writer.append(_chunks(range(10, 12)))
+    assert writer.count == 5
+    writer.close()
+
+    store = ChunkStore(store_path)
+    assert store.ids() == ['id-0', 'id-1', 'id-2', 'id-10', 'id-11']
+    assert store.get([3])[0].page_content == 'chunk 10'
+    store.close()
+
+
+def test_store_keeps_reading_the_replaced_file(store_path, tmp_path):
+    from andes.services.chunk_store import ChunkStore, write_chunks
+    store = ChunkStore(store_path)
+
+    rebuilt = str(tmp_path / 'rebuilt.sqlite')
+    write_chunks(rebuilt, _chunks(range(20, 22)))
+    os.replace(rebuilt, store_path)
+
+    assert store.get([4])[0].page_content == 'chunk 4'
+    store.close()
+
+
+def test_get_chunks_matches_in_memory_index(tmp_path):
+    from test_index_store import _index
+    from andes.services import index_store
+    from andes.services.chunk_store import ChunkStore, get_chunks
+
+    index, embeddings = _index(50)
+    index_store.save_index(index, str(tmp_path))
+    loaded = index_store.load_index(str(tmp_path), embeddings)
+    assert isinstance(loaded.docstore, ChunkStore)
+
+    positions = [7, 3, 49, 0]
+    assert get_chunks(loaded, positions) == get_chunks(index, positions)
+    assert [chunk.page_content for chunk in get_chunks(loaded, positions)] == ['7', '3', '49', '0']
@@ -0,0 +1,89 @@
+import pytest
+from langchain.docstore.document import Document as LangchainDocument
+
+from conftest import WordEncoding
+
+
+@pytest.fixture(autouse=True)
+def encoding(monkeypatch):
+    from andes.services import context_packer
+    monkeypatch.setattr(context_packer, '_encoding', lambda model_name: WordEncoding())
+    monkeypatch.setattr(context_packer, '_prompt_tokens', lambda model_name: 10)
+
+
+def _chunk(words, start, **metadata):
+    text = ' '.join(words)
+    return LangchainDocument(page_content=text, metadata={'start_index': start, **metadata})
+
+
+WORDS = [f'w{i}' for i in range(20)]
+
+
+def test_overlap_is_cut_within_a_document():
+    from andes.services.context_packer import pack_context
+    # the second chunk overlaps the first by w5 .. w9
+    first = _chunk(WORDS[:10], 0)
+    second = _chunk(WORDS[5:15], len(' '.join(WORDS[:5])) + 1)
+
+    packed = pack_context([first, second], 'question', 1000, 'model')
+    assert [chunk.page_content.split() for chunk in packed] == [WORDS[:10], WORDS[10:15]]
+
+
+def test_chunks_of_different_documents_do_not_overlap():
+    from andes.services.context_packer import pack_context
+    # same offsets, but in two documents searched together
+    first = _chunk(WORDS[:10], 0, scope='document:a')
+    second = _chunk(WORDS[10:20], 0, scope='document:b')
+
+    packed = pack_context([first, second], 'question', 1000, 'model')
+    assert [chunk.page_content for chunk in packed] == [first.page_content, second.page_content]
+
+
+def test_corpus_sources_are_the_packed_chunks(app, monkeypatch):
+    from langchain.vectorstores import FAISS
+    from andes.services import corpus_service, context_packer
+
+    class Embeddings:
+        def embed_query(self, text):
+            return [float(len(text)), 1.0]
+
+        def embed_documents(self, texts):
+            return [self.embed_query(text) for text in texts]
+
+    def index(texts):
+        embeddings = Embeddings()
+        return FAISS.from_embeddings(
+            [(text, embeddings.embed_query(text)) for text in texts], embeddings,
+            [{'start_index': 0} for _ in texts]
+        )
+
+    indexes = {'a': index([' '.join(WORDS[:8])]), 'b': index([' '.join(WORDS[:9])])}
+    monkeypatch.setitem(corpus_service.SHARD_INDEXES, 'document', lambda id: indexes[id])
+    monkeypatch.setattr(corpus_service, 'get_embeddings', lambda: Embeddings())
+
+    class LLM:
+        model_name = 'model'
+        max_tokens = 0
+
+        def modelname_to_contextsize(self, model_name):
+            return 1000
+
+    class Chain:
+        llm_chain = type('LLMChain', (), {'llm': LLM()})()
+
+        def run(self, input_documents, question):
+            self.documents = input_documents
+            return 'answer'
+
+    chain = Chain()
+    monkeypatch.setattr(corpus_service, '_combine_chain', lambda: chain)
+    # room for one chunk only
+    monkeypatch.setattr(context_packer, 'CONTEXT_MAX_TOKENS', 12)
+    monkeypatch.setattr(context_packer, 'CONTEXT_MIN_CHUNK_TOKENS', 100)
+
+    response = corpus_service.query(['document:a', 'document:b'], 'question', k=2)
+
+    # both documents were retrieved, only the nearest one was packed
+    assert [chunk.page_content for chunk in chain.documents] == [' '.join(WORDS[:8])]
+    assert [(source['id'], source['text']) for source in response['sources']] == [('a', ' '.join(WORDS[:8]))]
+    assert response['sources'][0]['metadata'] == {'start_index': 0}
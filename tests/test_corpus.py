@@ -0,0 +1,40 @@
+import pytest
+
+HEADERS = {'Authorization': 'Bearer key'}
+
+
+@pytest.fixture
+def no_search(monkeypatch):
+    # fails the test if a shard is searched
+    from andes.services import corpus_service
+    def search(*args):
+        raise AssertionError('searched an unknown shard')
+    monkeypatch.setattr(corpus_service, 'query', search)
+    monkeypatch.setattr(corpus_service, '_search_shard', search)
+
+
+@pytest.mark.parametrize('ids', [
+    {'document_ids': ['../../etc']},
+    {'webpage_ids': ['missing']},
+])
+def test_unknown_ids_are_not_found(client, document, no_search, ids):
+    response = client.post('/corpus/query', json={'question': 'revenue?', 'document_ids': [document.id], **ids}, headers=HEADERS)
+    assert response.status_code == 404
+    assert b'Invalid' in response.data
+
+
+def test_ids_must_be_strings(client, no_search):
+    response = client.post('/corpus/query', json={'question': 'revenue?', 'document_ids': [{'id': 1}]}, headers=HEADERS)
+    assert response.status_code == 400
+
+
+def test_known_ids_are_resolved(app, document):
+    from andes.services import corpus_service
+    assert corpus_service.resolve_shards(document_ids=[document.id, document.id]) == [f'document:{document.id}']
+
+
+@pytest.mark.parametrize('k', [0, -1, 'five', 2.5, True])
+def test_invalid_k_is_rejected(client, document, no_search, k):
+    response = client.post('/corpus/query', json={'question': 'revenue?', 'document_ids': [document.id], 'k': k}, headers=HEADERS)
+    assert response.status_code == 400
+    assert b'k must be a positive integer' in response.data
@@ -0,0 +1,89 @@
+import io
+import os
+import json
+
+import pytest
+
+
+class Upload:
+    def __init__(self, content: bytes):
+        self.stream = io.BytesIO(content)
+
+
+def _upload(content: bytes, filename='report.pdf'):
+    from andes.services import document_service
+    doc = document_service.create_document(filename)
+    document_service.save_file(doc, Upload(content))
+    return doc
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    from moto import mock_aws
+    from andes.services import document_service
+
+    with mock_aws():
+        document_service._s3.cache_clear()
+        client = document_service._s3()
+        client.create_bucket(
+            Bucket=document_service.S3_BUCKET,
+            CreateBucketConfiguration={'LocationConstraint': 'us-west-1'}
+        )
+        yield client
+    document_service._s3.cache_clear()
+
+
+def test_duplicates_are_uploaded_and_counted_but_not_reindexed(app, redis, s3, monkeypatch):
+    from andes.services import document_service, index_store, pdf_extraction, index_pipeline
+    from andes.services.embeddings import embedding_backend
+
+    doc = _upload(b'%PDF duplicate')
+    # the content was indexed for an earlier upload
+    dirpath = os.path.join(document_service.UPLOAD_DIRECTORY, doc.id)
+    open(os.path.join(dirpath, index_store.INDEX_FILENAME), 'wb').close()
+    with open(os.path.join(dirpath, index_store.PARAMS_FILENAME), 'w') as f:
+        json.dump({'embeddings': embedding_backend()}, f)
+
+    monkeypatch.setattr(pdf_extraction, 'pdf_page_count', lambda fpath: 3)
+    monkeypatch.setattr(index_pipeline, 'IndexBuilder', None)
+
+    document_service.index_job(doc.id)
+
+    assert document_service.get_document(doc.id).page_count == 3
+    s3.head_object(Bucket=document_service.S3_BUCKET, Key=f'{doc.id}.pdf')
+    document_service.delete_document(doc)
+
+
+def test_index_builds_of_the_same_content_are_serialized(app, redis, s3, monkeypatch):
+    from redis.exceptions import LockError
+    from andes.services import document_service, pdf_extraction
+
+    doc = _upload(b'%PDF locked')
+    monkeypatch.setattr(pdf_extraction, 'pdf_page_count', lambda fpath: 1)
+    monkeypatch.setattr(document_service, 'INDEX_BUILD_LOCK_TIMEOUT', 0.1)
+
+    # another job is building the index of this content
+    content_hash = doc.info['content_hash']
+    with redis.lock(document_service.BUILD_LOCK_KEY.format(content_hash), timeout=10):
+        with pytest.raises(LockError):
+            document_service.create_index(doc)
+    document_service.delete_document(doc)
+
+
+def test_content_is_deleted_with_its_last_reference(app, redis):
+    from andes.models import DocumentContent
+    from andes.services import document_service
+
+    first = _upload(b'%PDF shared')
+    second = _upload(b'%PDF shared')
+    content_hash = first.info['content_hash']
+    content_directory = document_service._content_directory(content_hash)
+    assert DocumentContent.query.get(content_hash).ref_count == 2
+
+    document_service.delete_document(first)
+    assert DocumentContent.query.get(content_hash).ref_count == 1
+    assert os.path.isdir(content_directory)
+
+    document_service.delete_document(second)
+    assert DocumentContent.query.get(content_hash) is None
+    assert not os.path.exists(content_directory)
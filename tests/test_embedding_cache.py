@@ -0,0 +1,38 @@
+class RecordingEmbeddings:
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text)), 0.5] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_only_missing_texts_are_embedded(tmp_path):
+    from andes.services.embedding_cache import CachedEmbeddings
+
+    provider = RecordingEmbeddings()
+    cache = CachedEmbeddings(provider, 'model', str(tmp_path / 'embeddings.sqlite'))
+
+    assert cache.embed_documents(['alpha', 'beta', 'alpha']) == [[5.0, 0.5], [4.0, 0.5], [5.0, 0.5]]
+    assert provider.batches == [['alpha', 'beta']]
+
+    assert cache.embed_documents(['beta', 'gamma']) == [[4.0, 0.5], [5.0, 0.5]]
+    assert provider.batches[-1] == ['gamma']
+
+
+def test_the_cache_is_shared_across_instances_of_a_model(tmp_path):
+    from andes.services.embedding_cache import CachedEmbeddings
+
+    path = str(tmp_path / 'embeddings.sqlite')
+    CachedEmbeddings(RecordingEmbeddings(), 'model', path).embed_documents(['alpha'])
+
+    provider = RecordingEmbeddings()
+    CachedEmbeddings(provider, 'model', path).embed_documents(['alpha'])
+    assert provider.batches == []
+
+    # vectors of another model are not reused
+    CachedEmbeddings(provider, 'other-model', path).embed_documents(['alpha'])
+    assert provider.batches == [['alpha']]
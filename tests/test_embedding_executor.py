@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from conftest import WordEncoding
+
+
+@pytest.fixture
+def embeddings_server(fake_server):
+    """
+    fake OpenAI embeddings endpoint, embedding each text as
+    [number of words, request number]. The first request is rate limited.
+    """
+    calls = []
+
+    def handle(method, path, body):
+        assert path.endswith('/embeddings')
+        calls.append(json.loads(body))
+        if len(calls) == 1:
+            return 429, {'Retry-After': '0'}, {'error': {'message': 'Rate limit reached', 'type': 'requests'}}
+        texts = calls[-1]['input']
+        return 200, {}, {
+            'object': 'list',
+            'model': calls[-1]['model'],
+            # returned out of order, like the API may do
+            'data': [
+                {'object': 'embedding', 'index': i, 'embedding': [float(len(text.split())), float(len(calls))]}
+                for i, text in reversed(list(enumerate(texts)))
+            ],
+            'usage': {'prompt_tokens': 0, 'total_tokens': 0},
+        }
+
+    server = fake_server(handle)
+    server.calls = calls
+    return server
+
+
+@pytest.fixture
+def embeddings(embeddings_server, monkeypatch):
+    from andes.services import embedding_executor
+    monkeypatch.setattr(embedding_executor.tiktoken, 'encoding_for_model', lambda model: WordEncoding())
+    return embedding_executor.BatchedOpenAIEmbeddings(
+        model='text-embedding-ada-002',
+        rate_limiter=embedding_executor.RateLimiter(10000, 1000000),
+        parallelism=2,
+        max_batch_tokens=10,
+        api_base=embeddings_server.url
+    )
+
+
+def test_batches_are_token_bounded_and_results_ordered(embeddings, embeddings_server):
+    texts = [' '.join(['word'] * n) for n in (4, 4, 4, 9, 1, 3)]
+
+    vectors = embeddings.embed_documents(texts)
+
+    assert [vector[0] for vector in vectors] == [4, 4, 4, 9, 1, 3]
+    # consecutive texts up to 10 tokens per batch: [4, 4], [4], [9, 1], [3],
+    # plus the retry of the rate limited request
+    batches = [call['input'] for call in embeddings_server.calls]
+    assert len(batches) == 5
+    assert sorted(sum(len(text.split()) for text in batch) for batch in batches[1:]) == [3, 4, 8, 10]
+
+
+def test_rate_limited_requests_are_retried(embeddings, embeddings_server):
+    assert embeddings.embed_query('one two three')[0] == 3
+    assert len(embeddings_server.calls) == 2
+
+
+def test_errors_are_raised_after_max_retries(embeddings, embeddings_server):
+    import openai
+    embeddings.max_retries = 0
+    with pytest.raises(openai.error.RateLimitError):
+        embeddings.embed_query('one')
+
+
+def test_rate_limiter_waits_for_token_budget(monkeypatch):
+    from andes.services import embedding_executor
+
+    now = [0.0]
+    sleeps = []
+    monkeypatch.setattr(embedding_executor.time, 'monotonic', lambda: now[0])
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+    monkeypatch.setattr(embedding_executor.time, 'sleep', sleep)
+
+    limiter = embedding_executor.RateLimiter(requests_per_minute=60, tokens_per_minute=600)
+    limiter.acquire(600)
+    limiter.acquire(300)
+
+    # half the token budget refills in 30 seconds
+    assert sum(sleeps) == pytest.approx(30)
@@ -0,0 +1,87 @@
+import json
+import os
+
+import pytest
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text))]
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """
+    select the embedding backend of this deployment, with a fake local model
+    """
+    from andes.services import embeddings
+    monkeypatch.setitem(embeddings.EMBEDDING_BACKENDS, 'local', (FakeEmbeddings, 'all-MiniLM-L6-v2'))
+
+    def select(name):
+        monkeypatch.setattr(embeddings, 'EMBEDDING_BACKEND', name)
+    return select
+
+
+def test_backend_selection(backend, tmp_path, monkeypatch):
+    from andes.services import embeddings
+    monkeypatch.setattr(embeddings, 'EMBEDDING_CACHE_PATH', str(tmp_path / 'embeddings.sqlite'))
+
+    backend('local')
+    assert embeddings.embedding_backend() == 'local:all-MiniLM-L6-v2'
+    assert embeddings.get_embeddings().embed_query('revenue') == [7.0]
+
+    backend('cohere')
+    with pytest.raises(ValueError, match='Invalid embedding backend'):
+        embeddings.get_embeddings()
+
+
+def test_local_backend_needs_sentence_transformers():
+    try:
+        import sentence_transformers  # noqa: F401
+        pytest.skip('sentence-transformers is installed')
+    except ImportError:
+        pass
+
+    from andes.services.local_embeddings import LocalEmbeddings
+    with pytest.raises(ImportError, match='pip install sentence-transformers'):
+        LocalEmbeddings('all-MiniLM-L6-v2')
+
+
+def test_indexes_of_another_backend_are_rejected(backend, tmp_path):
+    from test_index_store import _index
+    from andes.services import index_store
+
+    backend('openai')
+    index, embeddings = _index(10)
+    index_store.save_index(index, str(tmp_path))
+    assert index_store.index_embedding_backend(str(tmp_path)) == 'openai:text-embedding-ada-002'
+    index_store.load_index(str(tmp_path), embeddings)
+
+    backend('local')
+    with pytest.raises(ValueError, match='built with openai:text-embedding-ada-002 embeddings'):
+        index_store.load_index(str(tmp_path), embeddings)
+
+
+def test_indexes_without_backend_are_openai(backend, tmp_path):
+    from test_index_store import _index
+    from andes.services import index_store
+
+    backend('openai')
+    index, _ = _index(10)
+    index_store.save_index(index, str(tmp_path))
+
+    # indexes saved before backends were recorded
+    params_path = os.path.join(str(tmp_path), index_store.PARAMS_FILENAME)
+    with open(params_path) as f:
+        params = json.load(f)
+    del params['embeddings']
+    with open(params_path, 'w') as f:
+        json.dump(params, f)
+
+    assert index_store.index_embedding_backend(str(tmp_path)) == 'openai:text-embedding-ada-002'
+    backend('local')
+    with pytest.raises(ValueError):
+        index_store.check_embedding_backend(str(tmp_path))
@@ -0,0 +1,45 @@
+import pytest
+
+ENTITIES = [{'name': 'revenue', 'label': 'revenue'}]
+
+
+@pytest.mark.parametrize('top_k', [0, -3, 'ten', 2.5, True])
+def test_invalid_prefilter_top_k_is_rejected(client, top_k):
+    response = client.post(
+        '/document/missing/extract',
+        json={'extraction_type': 'all', 'entities': ENTITIES, 'prefilter_top_k': top_k},
+        headers={'Authorization': 'Bearer key'}
+    )
+    assert response.status_code == 400
+    assert b'prefilter_top_k' in response.data
+
+
+def test_small_prefilter_top_k_is_raised_to_minimum(monkeypatch):
+    from andes.services import extraction
+
+    searches = []
+
+    class Index:
+        def similarity_search(self, query, k):
+            searches.append(k)
+            return []
+
+    monkeypatch.setattr(extraction, 'split_windows', lambda text: [text])
+    monkeypatch.setattr(extraction, '_extract_window', lambda window, functions: ({}, {}))
+
+    config = {'extraction_type': 'all', 'entities': ENTITIES}
+    extraction.extract('text', {**config, 'prefilter_top_k': 1}, index=Index())
+    extraction.extract('text', {**config, 'prefilter_top_k': 12}, index=Index())
+
+    assert searches == [extraction.PREFILTER_MIN_TOP_K, 12]
+
+
+@pytest.mark.parametrize('wait', ['later', '-5'])
+def test_invalid_job_wait_is_rejected(client, redis, document, wait):
+    response = client.get(f'/document/{document.id}/extract/job?wait={wait}', headers={'Authorization': 'Bearer key'})
+    assert response.status_code == 400
+
+
+def test_unknown_job_is_not_found(client, redis, document):
+    response = client.get(f'/document/{document.id}/extract/missing?wait=1', headers={'Authorization': 'Bearer key'})
+    assert response.status_code == 404
@@ -0,0 +1,26 @@
+import os
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _benchmark():
+    path = os.path.join(ROOT, 'benchmarks', 'import_time.py')
+    spec = importlib.util.spec_from_file_location('import_time', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_heavy_modules_are_not_imported_with_andes():
+    benchmark = _benchmark()
+    times = benchmark.import_times('andes')
+    assert 'andes' in times
+    assert sorted({name.split('.')[0] for name in times} & set(benchmark.LAZY_MODULES)) == []
+
+
+def test_queues_are_created_on_first_use(redis):
+    from andes.services.rq import QUEUES
+    assert QUEUES._queues == {}
+    assert QUEUES['crawler'] is QUEUES['crawler']
+    assert list(QUEUES._queues) == ['crawler']
@@ -0,0 +1,66 @@
+import os
+
+
+def _write(path, size, mtime):
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    os.utime(path, (mtime, mtime))
+
+
+def test_loaded_indexes_are_reused_until_the_file_changes(tmp_path):
+    from andes.services.index_cache import IndexCache
+
+    path = str(tmp_path / 'index.faiss')
+    _write(path, 10, 1000)
+    loads = []
+
+    def load(filepath):
+        loads.append(filepath)
+        return object()
+
+    cache = IndexCache(max_bytes=100)
+    first = cache.get('document:a', path, load)
+    assert cache.get('document:a', path, load) is first
+    assert len(loads) == 1
+
+    # a rebuilt index has a new mtime
+    _write(path, 10, 2000)
+    second = cache.get('document:a', path, load)
+    assert second is not first
+    assert len(loads) == 2
+    assert cache.stats()['bytes'] == 10
+
+    cache.invalidate('document:a')
+    cache.get('document:a', path, load)
+    assert len(loads) == 3
+    assert cache.stats()['hits'] == 1
+
+
+def test_least_recently_used_indexes_are_evicted(tmp_path):
+    from andes.services.index_cache import IndexCache
+
+    paths = {}
+    for name in 'abc':
+        paths[name] = str(tmp_path / f'{name}.faiss')
+        _write(paths[name], 40, 1000)
+
+    cache = IndexCache(max_bytes=100)
+    cache.get('a', paths['a'], lambda path: 'a')
+    cache.get('b', paths['b'], lambda path: 'b')
+    # a is used again, so b is the least recently used
+    cache.get('a', paths['a'], lambda path: 'reloaded')
+    cache.get('c', paths['c'], lambda path: 'c')
+
+    assert cache.get('a', paths['a'], lambda path: 'reloaded') == 'a'
+    assert cache.get('b', paths['b'], lambda path: 'reloaded') == 'reloaded'
+    assert cache.stats()['evictions'] == 2
+
+
+def test_indexes_larger_than_the_budget_are_not_cached(tmp_path):
+    from andes.services.index_cache import IndexCache
+
+    path = str(tmp_path / 'index.faiss')
+    _write(path, 200, 1000)
+    cache = IndexCache(max_bytes=100)
+    cache.get('a', path, lambda path: 'a')
+    assert cache.stats()['entries'] == 0
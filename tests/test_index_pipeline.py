@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+from andes.services.serialization import json_load
+
+
+class WordCountEmbeddings:
+    """
+    embeds a text as [number of words, length, occurrences of "page"]
+    """
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text.split())), float(len(text)), float(text.count('page'))]
+
+
+PAGES = [' '.join(f'page{page} word{i}' for i in range(500)) for page in range(12)]
+
+
+class Crash(Exception):
+    pass
+
+
+def _pages(crash_after=None, starts=None):
+    def pages(start_page):
+        if starts is not None:
+            starts.append(start_page)
+        for number, page in enumerate(PAGES[start_page:], start_page):
+            if number == crash_after:
+                raise Crash()
+            yield page
+    return pages
+
+
+def _builder(dirpath):
+    from andes.services.index_pipeline import IndexBuilder
+    return IndexBuilder(
+        str(dirpath),
+        WordCountEmbeddings(),
+        raw_text_path=os.path.join(dirpath, 'raw_document_text.txt'),
+        batch_size=4,
+        checkpoint_interval=1
+    )
+
+
+def _chunks(index):
+    from andes.services import index_store
+    return [(chunk.page_content, chunk.metadata) for _, chunk in index_store.iter_chunks(index)]
+
+
+def test_resumed_build_matches_uninterrupted_build(tmp_path):
+    from andes.services import index_pipeline
+
+    expected = _builder(tmp_path / 'once').build(_pages())
+    expected_chunks = _chunks(expected)
+
+    builder = _builder(tmp_path / 'resumed')
+    with pytest.raises(Crash):
+        builder.build(_pages(crash_after=7))
+
+    checkpoint = os.path.join(tmp_path / 'resumed', index_pipeline.CHECKPOINT_DIRECTORY)
+    state = json_load(os.path.join(checkpoint, index_pipeline.CHECKPOINT_STATE_FILENAME))
+    assert state['count'] > 0
+    # the checkpoint holds appended vectors and chunks, no index copies
+    assert sorted(os.listdir(checkpoint)) == ['chunks.sqlite', 'state.json', 'vectors.f32']
+
+    starts = []
+    index = _builder(tmp_path / 'resumed').build(_pages(starts=starts))
+    assert starts == [state['pages_done']]
+    assert _chunks(index) == expected_chunks
+    assert index.index.ntotal == expected.index.ntotal == len(expected_chunks)
+    assert (index.index.reconstruct_n(0, index.index.ntotal) == expected.index.reconstruct_n(0, expected.index.ntotal)).all()
+    with open(tmp_path / 'resumed' / 'raw_document_text.txt') as f:
+        assert f.read() == '\n\n'.join(PAGES)
+
+
+def test_built_index_is_saved_and_checkpoint_cleared(tmp_path):
+    from andes.services import index_pipeline, index_store
+
+    builder = _builder(tmp_path)
+    index = builder.build(_pages())
+    chunks = _chunks(index)
+    index_store.save_index(index, str(tmp_path))
+    builder.clear_checkpoint()
+
+    assert not os.path.exists(tmp_path / index_pipeline.CHECKPOINT_DIRECTORY)
+    loaded = index_store.load_index(str(tmp_path), WordCountEmbeddings())
+    assert _chunks(loaded) == chunks
+    assert chunks[0][1] == {'start_index': 0, 'page': 1}
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+
+class VectorEmbeddings:
+    """
+    embeds the text '<i>' as the i-th of a fixed set of random vectors
+    """
+
+    def __init__(self, count, dimension=8):
+        self.vectors = np.random.default_rng(0).random((count, dimension), dtype=np.float32)
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[int(text)].tolist()
+
+
+def _index(count):
+    from langchain.vectorstores import FAISS
+    embeddings = VectorEmbeddings(count)
+    texts = [str(i) for i in range(count)]
+    return FAISS.from_embeddings(list(zip(texts, embeddings.embed_documents(texts))), embeddings), embeddings
+
+
+@pytest.mark.parametrize('index_type', ['ivf', 'hnsw'])
+def test_approximate_indexes_are_saved_and_memory_mapped(tmp_path, monkeypatch, index_type):
+    from andes.services import index_store
+    monkeypatch.setattr(index_store, 'INDEX_FLAT_MAX_CHUNKS', 100)
+    monkeypatch.setattr(index_store, 'INDEX_APPROXIMATE_TYPE', index_type)
+
+    index, embeddings = _index(500)
+    params = index_store.optimize_index(index)
+    assert params['type'] == index_type
+    index_store.save_index(index, str(tmp_path))
+
+    loaded = index_store.load_index(str(tmp_path), embeddings)
+    assert loaded.params['type'] == index_type
+    assert loaded.index.ntotal == 500
+    assert loaded.similarity_search('42', k=1)[0].page_content == '42'
+
+
+def test_codes_are_mapped_only_for_flat_and_hnsw_indexes(monkeypatch):
+    import faiss
+    from andes.services import index_store
+    monkeypatch.setattr(faiss, 'IO_FLAG_MMAP_IFC', 1 << 9, raising=False)
+
+    assert index_store._mmap_flags({'type': 'flat'}) & faiss.IO_FLAG_MMAP_IFC
+    assert index_store._mmap_flags({'type': 'hnsw'}) & faiss.IO_FLAG_MMAP_IFC
+    assert not index_store._mmap_flags({'type': 'ivf'}) & faiss.IO_FLAG_MMAP_IFC
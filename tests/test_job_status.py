@@ -0,0 +1,35 @@
+import pytest
+
+HEADERS = {'Authorization': 'Bearer key'}
+
+
+@pytest.mark.parametrize('wait', ['soon', '-1', 'nan'])
+def test_invalid_wait_is_rejected(client, redis, document, wait):
+    response = client.get(f'/document/{document.id}?wait={wait}', headers=HEADERS)
+    assert response.status_code == 400
+    assert b'Invalid wait' in response.data
+
+
+def test_document_without_status_is_returned(client, redis, document):
+    response = client.get(f'/document/{document.id}', headers=HEADERS)
+    assert response.status_code == 200
+    assert response.json['id'] == document.id
+    assert response.json['status'] is None
+
+
+def test_unknown_document_is_not_found(client, redis):
+    response = client.get('/document/missing', headers=HEADERS)
+    assert response.status_code == 404
+
+
+def test_status_is_returned_with_etag(client, redis, document):
+    from andes.services.job_status import JobProgress
+    JobProgress(f'document:{document.id}', reset=True).set_status('queued')
+
+    response = client.get(f'/document/{document.id}?wait=0', headers=HEADERS)
+    assert response.status_code == 200
+    assert response.json['status']['status'] == 'queued'
+
+    # the client already has this version and nothing changes while it waits
+    response = client.get(f'/document/{document.id}?wait=0.1', headers={**HEADERS, 'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
@@ -0,0 +1,57 @@
+import pytest
+
+
+def _pdf(path, pages):
+    """
+    write a minimal PDF with one line of Helvetica text per page
+    """
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for text in pages:
+        stream = f'BT /F1 12 Tf 72 720 Td ({text}) Tj ET'
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+        objects.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>'
+        )
+        kids.append(f'{len(objects)} 0 R')
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(pages)} >>'
+
+    content = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(content))
+        content += f'{number} 0 obj\n{body}\nendobj\n'.encode('latin-1')
+    xref = len(content)
+    content += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+    content += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode('latin-1')
+    content += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1')
+    path.write_bytes(content)
+    return str(path)
+
+
+PAGES = [f'Page {number} reports revenue, margins and the outlook.' for number in range(1, 6)]
+
+
+def test_pages_are_extracted_in_order(tmp_path, monkeypatch):
+    from andes.services import pdf_extraction
+    monkeypatch.setattr(pdf_extraction, 'PDF_EXTRACTION_WORKERS', 2)
+    path = _pdf(tmp_path / 'report.pdf', PAGES)
+
+    assert pdf_extraction.pdf_page_count(path) == 5
+    assert [text.strip() for text in pdf_extraction.iter_pdf_pages(path)] == PAGES
+    # resumed extraction starts at the given page
+    assert [text.strip() for text in pdf_extraction.iter_pdf_pages(path, start_page=3)] == PAGES[3:]
+
+
+def test_pages_without_text_are_ocrd(tmp_path, monkeypatch):
+    from andes.services import pdf_extraction
+    path = _pdf(tmp_path / 'scanned.pdf', [PAGES[0], 'x'])
+
+    ocr = []
+    monkeypatch.setattr(pdf_extraction, 'convert_from_path', lambda fpath, dpi, first_page, last_page: [f'image {first_page}'])
+    monkeypatch.setattr(pdf_extraction.pytesseract, 'image_to_string', lambda image: ocr.append(image) or 'ocr text')
+
+    assert pdf_extraction._extract_page(path, 0).strip() == PAGES[0]
+    assert pdf_extraction._extract_page(path, 1) == 'ocr text'
+    assert ocr == ['image 2']
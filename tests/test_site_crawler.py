@@ -0,0 +1,84 @@
+import pytest
+
+PAGES = {
+    '/': b'<html><head><title>Home</title></head><body><a href="/about">About</a> <a href="/private/report">Report</a></body></html>',
+    '/about': b'<html><body><p>About us</p><a href="/">Home</a></body></html>',
+    '/private/report': b'<html><body><p>Private</p></body></html>',
+}
+
+
+@pytest.fixture
+def site(fake_server):
+    """
+    fake site with the given robots.txt response, serving PAGES
+    """
+    def start(robots_status=404, robots=b'', pages=PAGES):
+        def handle(method, path, body):
+            if path == '/robots.txt':
+                return robots_status, {'Content-Type': 'text/plain'}, robots
+            if path in pages:
+                return 200, {'Content-Type': 'text/html'}, pages[path]
+            return 404, {}, b''
+        return fake_server(handle)
+    return start
+
+
+def _crawl(server, **kwargs):
+    from andes.services.site_crawler import SiteCrawler
+    crawler = SiteCrawler(server.url + '/', max_depth=2, max_pages=10, **kwargs)
+    return crawler, sorted(url[len(server.url):] for url, _, _ in crawler.crawl())
+
+
+def test_missing_robots_txt_allows_everything(site):
+    _, crawled = _crawl(site(robots_status=404))
+    assert crawled == ['/', '/about', '/private/report']
+
+
+@pytest.mark.parametrize('status', [401, 403, 500])
+def test_unreadable_robots_txt_disallows_everything(site, status):
+    server = site(robots_status=status)
+    _, crawled = _crawl(server)
+    assert crawled == []
+    # only robots.txt was requested
+    assert [path for _, path, _ in server.requests] == ['/robots.txt']
+
+
+def test_robots_txt_rules_are_followed(site):
+    _, crawled = _crawl(site(robots_status=200, robots=b'User-agent: *\nDisallow: /private/\n'))
+    assert crawled == ['/', '/about']
+
+
+def test_unparseable_pages_are_skipped(site):
+    pages = {
+        **PAGES,
+        '/about': b'<!-- nothing here -->',
+    }
+    crawler, crawled = _crawl(site(pages=pages))
+    assert crawled == ['/', '/private/report']
+    assert [(page['url'].rsplit('/', 1)[-1], page['reason'].split(':')[0]) for page in crawler.skipped] == [
+        ('about', 'unparseable HTML')
+    ]
+
+
+def test_host_slots_are_shared_by_threads(site):
+    from concurrent.futures import ThreadPoolExecutor
+    from andes.services.site_crawler import SiteCrawler
+
+    crawler = SiteCrawler(site().url, max_depth=0, max_pages=1)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        slots = list(executor.map(crawler._host_slot, ['example.com'] * 64))
+    assert all(slot is slots[0] for slot in slots)
+
+
+def test_unparseable_single_page_fails_with_a_clear_error(app, site):
+    from andes.models import WebPage
+    from andes.services import webpage_service
+
+    server = site(pages={'/': b'<!-- nothing here -->'})
+    page = WebPage(url=server.url + '/')
+    page.save()
+    try:
+        with pytest.raises(ValueError, match='Could not parse the HTML'):
+            webpage_service._fetch(page)
+    finally:
+        page.delete()
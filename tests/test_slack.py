@@ -0,0 +1,43 @@
+import queue
+
+import pytest
+
+from andes.utils import slack
+
+
+@pytest.fixture
+def posted(monkeypatch):
+    # a small buffer drained by calling flush, instead of the sender thread
+    posted = []
+    monkeypatch.setattr(slack, '_buffer', queue.Queue(maxsize=3))
+    monkeypatch.setattr(slack, '_dropped', 0)
+    monkeypatch.setattr(slack, '_ensure_sender', lambda: None)
+    monkeypatch.setattr(slack, '_post', lambda channel, text: posted.append((channel, text)))
+    return posted
+
+
+def test_messages_are_coalesced_per_channel(posted):
+    slack.send_message('indexed report.pdf', channel='#api-notifs')
+    slack.send_message({'action': 'chat'}, channel='#api-notifs')
+    slack.send_message('crawl failed', channel='#errors')
+    slack.flush()
+
+    assert posted == [
+        ('#api-notifs', "indexed report.pdf\n```{'action': 'chat'}```"),
+        ('#errors', 'crawl failed'),
+    ]
+    slack.flush()
+    assert len(posted) == 2
+
+
+def test_full_buffer_drops_and_reports(posted):
+    for number in range(5):
+        slack.send_message(f'message {number}', channel='#api-notifs')
+    slack.flush()
+
+    assert posted == [('#api-notifs', 'message 0\nmessage 1\nmessage 2\n_2 notifications dropped, buffer was full_')]
+
+
+def test_pack_respects_length_limit(monkeypatch):
+    monkeypatch.setattr(slack, 'MAX_MESSAGE_LENGTH', 10)
+    assert slack._pack(['abcd', 'efgh', 'ijklmnopqrstuvwxyz']) == ['abcd\nefgh', 'ijklmnopqr']
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+
+class TokenChain:
+    """
+    a chain whose LLM streams the given tokens to the callbacks
+    """
+
+    def __init__(self, tokens, error=None):
+        self.tokens = tokens
+        self.error = error
+
+    def run(self, message, callbacks):
+        for token in self.tokens:
+            for callback in callbacks:
+                callback.on_llm_new_token(token)
+        if self.error:
+            raise self.error
+        return ''.join(self.tokens)
+
+
+def _drain(generator):
+    tokens = []
+    try:
+        while True:
+            tokens.append(next(generator))
+    except StopIteration as stop:
+        return tokens, stop.value
+
+
+def _events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines.get('event'), json.loads(lines['data'])))
+    return events
+
+
+def test_stream_chain_yields_tokens_and_returns_answer():
+    from andes.services.streaming import stream_chain
+    tokens, answer = _drain(stream_chain(TokenChain(['Revenue', ' grew', '.']), 'what was revenue'))
+    assert tokens == ['Revenue', ' grew', '.']
+    assert answer == 'Revenue grew.'
+
+
+def test_stream_chain_raises_chain_errors():
+    from andes.services.streaming import stream_chain
+    stream = stream_chain(TokenChain(['Revenue'], error=RuntimeError('rate limited')), 'what was revenue')
+    assert next(stream) == 'Revenue'
+    with pytest.raises(RuntimeError, match='rate limited'):
+        next(stream)
+
+
+def test_chat_streams_sse_events(client, document, monkeypatch):
+    from andes.routes import document as document_routes
+    notified = []
+    monkeypatch.setattr(document_routes.document_service, 'chat_stream', lambda doc, message: iter(['Revenue', ' grew']))
+    monkeypatch.setattr(document_routes, 'send_message', lambda message, channel: notified.append(message))
+
+    response = client.post(f'/document/{document.id}/chat', json={'message': 'what was revenue', 'stream': True})
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert _events(response.get_data(as_text=True)) == [
+        ('token', {'token': 'Revenue'}),
+        ('token', {'token': ' grew'}),
+        ('done', {'answer': 'Revenue grew'}),
+    ]
+    assert notified[0]['answer'] == 'Revenue grew'
+
+
+def test_stream_errors_are_sent_as_events(app):
+    from andes.utils.sse import sse_response
+
+    def tokens():
+        yield 'Revenue'
+        raise RuntimeError('rate limited')
+
+    notified = []
+    with app.test_request_context():
+        response = sse_response(tokens(), on_complete=notified.append)
+        body = response.get_data(as_text=True)
+
+    assert _events(body) == [('token', {'token': 'Revenue'}), ('error', {'error': 'rate limited'})]
+    assert notified == []
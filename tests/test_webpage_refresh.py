@@ -0,0 +1,67 @@
+import pytest
+
+PAGE = b'<html><head><title>Results</title></head><body><p>Revenue grew 12 percent.</p></body></html>'
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """
+    headers of the requests made by the crawler
+    """
+    import requests
+    sent = []
+    get = requests.get
+
+    def spy(url, headers=None, **kwargs):
+        sent.append(dict(headers or {}))
+        return get(url, headers=headers, **kwargs)
+
+    monkeypatch.setattr(requests, 'get', spy)
+    return sent
+
+
+@pytest.fixture
+def page(app, fake_server, sent):
+    """
+    webpage served with an ETag, answering 304 once it is sent back
+    """
+    from andes.models import WebPage
+
+    def handle(method, path, body):
+        if sent and sent[-1].get('If-None-Match') == '"v1"':
+            return 304, {}, b''
+        return 200, {'Content-Type': 'text/html', 'ETag': '"v1"', 'Last-Modified': 'Mon, 05 Oct 2026 10:00:00 GMT'}, PAGE
+
+    server = fake_server(handle)
+    page = WebPage(url=server.url + '/results')
+    page.save()
+    yield page
+    page.delete()
+
+
+def test_fetch_stores_validators_and_skips_unmodified_pages(page, sent):
+    from andes.services import webpage_service
+
+    assert webpage_service._fetch(page, conditional=True) is True
+    assert sent == [{}]
+    assert page.title == 'Results'
+    assert page.info['http'] == {'etag': '"v1"', 'last_modified': 'Mon, 05 Oct 2026 10:00:00 GMT'}
+
+    assert webpage_service._fetch(page, conditional=True) is False
+    assert sent[-1] == {'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon, 05 Oct 2026 10:00:00 GMT'}
+
+    # unconditional fetches always download the page
+    assert webpage_service._fetch(page) is True
+    assert sent[-1] == {}
+
+
+def test_refresh_skips_index_update_when_not_modified(page, monkeypatch):
+    from andes.services import webpage_service
+    enqueued = []
+    monkeypatch.setattr(webpage_service, '_enqueue', lambda queue, job, *args: enqueued.append(job))
+
+    assert webpage_service.refresh(page) is True
+    assert enqueued == [webpage_service.update_index_job]
+
+    assert webpage_service.refresh(page) is False
+    assert len(enqueued) == 1
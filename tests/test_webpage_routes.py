@@ -0,0 +1,56 @@
+import pytest
+
+HEADERS = {'Authorization': 'Bearer key'}
+
+
+def _post(client, **payload):
+    return client.post('/webpage', json={'url': 'https://example.com/', **payload}, headers=HEADERS)
+
+
+@pytest.mark.parametrize('limits', [
+    {'max_depth': 'deep'},
+    {'max_depth': 0},
+    {'max_pages': -5},
+    {'max_pages': 2.5},
+    {'max_pages': True},
+    {'max_pages': None},
+])
+def test_invalid_crawl_limits_are_rejected(client, redis, limits):
+    response = _post(client, mode='site', **limits)
+    assert response.status_code == 400
+    assert b'must be a positive integer' in response.data
+
+
+def test_crawl_limits_are_capped(client, redis):
+    from andes.services import webpage_service
+    from andes.utils.config import SITE_CRAWL_MAX_DEPTH, SITE_CRAWL_MAX_PAGES
+
+    response = _post(client, mode='site', max_depth='1', max_pages=10 ** 6)
+    assert response.status_code == 200
+
+    page = webpage_service.get_webpage(response.json['id'])
+    assert page.info['crawl'] == {'mode': 'site', 'max_depth': min(1, SITE_CRAWL_MAX_DEPTH), 'max_pages': SITE_CRAWL_MAX_PAGES}
+    page.delete()
+
+
+@pytest.mark.parametrize('tags', ['finance', ['10-K', ''], ['10-K', 3]])
+def test_invalid_tags_are_rejected(client, redis, tags):
+    from andes.models import WebPage
+    count = WebPage.query.count()
+    response = _post(client, tags=tags)
+    assert response.status_code == 400
+    assert b'tags must be a list of non-empty strings' in response.data
+    # no webpage is created
+    assert WebPage.query.count() == count
+
+
+def test_tags_are_set(client, redis):
+    from andes.services import webpage_service
+    response = _post(client, tags=['10-K', '2023'])
+    assert response.status_code == 200
+
+    page = webpage_service.get_webpage(response.json['id'])
+    assert sorted(tag.name for tag in page.tags) == ['10-K', '2023']
+    for tag in page.tags:
+        tag.delete()
+    page.delete()
@@ -0,0 +1,37 @@
+import pytest
+
+
+def test_parse_worker_processes():
+    from andes.services.workers import parse_worker_processes
+    assert parse_worker_processes('index_gen=2, crawler,') == {'index_gen': 2, 'crawler': 1}
+    with pytest.raises(ValueError, match='Unknown queue'):
+        parse_worker_processes('index_gen=1,thumbnails=2')
+
+
+@pytest.mark.parametrize('max_memory, done', [(0, 1), (2 ** 62, 3)])
+def test_worker_recycles_above_max_memory(redis, max_memory, done):
+    from andes.services.rq import QUEUES
+    from andes.services.workers import RecyclingWorker
+
+    queue = QUEUES['crawler']
+    jobs = [queue.enqueue('math.sqrt', number) for number in (1, 4, 9)]
+
+    worker = RecyclingWorker([queue], connection=queue.connection, max_memory=max_memory)
+    worker.work(burst=True)
+
+    finished = [job.id for job in jobs if job.get_status(refresh=True) == 'finished']
+    assert finished == [job.id for job in jobs[:done]]
+    assert queue.count == 3 - done
+
+
+def test_queue_collector(redis):
+    from andes.services.rq import QUEUES
+    from andes.services.workers import QueueCollector
+
+    QUEUES['crawler'].enqueue('math.sqrt', 4)
+    QUEUES['crawler'].enqueue('math.sqrt', 9)
+
+    metrics = {metric.name: metric for metric in QueueCollector().collect()}
+    depth = {sample.labels['queue']: sample.value for sample in metrics['rq_queue_depth'].samples}
+    assert depth == {'index_gen': 0, 'crawler': 2, 'webpage_index_gen': 0, 'extraction': 0}
+    assert all(sample.value == 0 for sample in metrics['rq_worker_utilization'].samples)